@@ -0,0 +1,44 @@
+import numpy as np
+from nufebmgr.DumpTools import DumpFile
+
+
+def test_open(benchmark, scaled_dump):
+    def open_dump():
+        with DumpFile(scaled_dump) as dump:
+            return dump.num_timesteps()
+    benchmark(open_dump)
+
+
+def test_population_abs(benchmark, scaled_dump):
+    with DumpFile(scaled_dump) as dump:
+        benchmark(dump.population_abs)
+
+
+def test_births(benchmark, scaled_dump):
+    with DumpFile(scaled_dump) as dump:
+        benchmark(dump.births, {'a': [1], 'bc': [2, 3]})
+
+
+def test_deaths(benchmark, scaled_dump):
+    with DumpFile(scaled_dump) as dump:
+        benchmark(dump.deaths, {'a': [1], 'bc': [2, 3]})
+
+
+def test_biomass(benchmark, scaled_dump):
+    with DumpFile(scaled_dump) as dump:
+        benchmark(dump.biomass, {1: 150, 2: 150, 3: 150})
+
+
+def test_arrays_at_time_all_timesteps(benchmark, scaled_dump):
+    with DumpFile(scaled_dump) as dump:
+        timesteps = dump.timesteps()
+        buffers = {}
+
+        def read_all():
+            for t in timesteps:
+                n = dump.rows_at_time(t)
+                for field in ('type', 'x', 'y', 'z'):
+                    if field not in buffers or len(buffers[field]) < n:
+                        buffers[field] = np.empty(2 * n, dtype=dump.dumpfile[f'{field}/{t}'].dtype)
+                dump.arrays_at_time(['type', 'x', 'y', 'z'], t, out=buffers)
+        benchmark(read_all)
@@ -0,0 +1,26 @@
+import pytest
+from nufebmgr.NufebProject import NufebProject
+
+
+@pytest.mark.parametrize('nbugs', [100, 1000, 10000])
+def test_generate_case(benchmark, nbugs):
+    prj = NufebProject(seed=1701)
+    prj.set_box(x=200, y=200, z=100)
+    prj.add_taxon_by_template(name="fast", template="basic_heterotroph")
+    prj.add_taxon_by_template(name="slow", template="slow_heterotroph")
+    prj.layout_uniform(nbugs=nbugs)
+    prj.set_composition({'fast': 1, 'slow': 1})
+    prj.distribute_spatially_even()
+    benchmark(prj.generate_case)
+
+
+@pytest.mark.parametrize('nbugs', [1000, 10000])
+def test_generate_case_strips(benchmark, nbugs):
+    prj = NufebProject(seed=1701)
+    prj.set_box(x=200, y=200, z=100)
+    prj.add_taxon_by_template(name="fast", template="basic_heterotroph")
+    prj.add_taxon_by_template(name="slow", template="slow_heterotroph")
+    prj.layout_uniform(nbugs=nbugs)
+    prj.set_composition({'fast': 1, 'slow': 1})
+    prj.distribute_even_strips('vertical', noise=0.1)
+    benchmark(prj.generate_case)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from nufebmgr.NufebProject import NufebProject
+from nufebmgr.poisson import PoissonDisc
+from nufebmgr import pointprocess
+from nufebmgr.LayoutCache import LayoutCache
+from nufebmgr.LayoutComposer import LayoutComposer, circle
+from nufebmgr.TaxaAssigmentManager import TaxaAssignmentManager
+
+
+def _project(nbugs=None):
+    prj = NufebProject(seed=1701)
+    prj.set_box(x=200, y=200, z=100)
+    prj.add_taxon_by_template(name="fast", template="basic_heterotroph")
+    prj.add_taxon_by_template(name="slow", template="slow_heterotroph")
+    if nbugs is not None:
+        prj.layout_uniform(nbugs=nbugs)
+    return prj
+
+
+@pytest.mark.parametrize('radius', [10e-6, 5e-6])
+def test_poisson_disc_sample(benchmark, radius):
+    def sample():
+        return PoissonDisc(200e-6, 200e-6, radius).sample()
+    benchmark(sample)
+
+
+@pytest.mark.parametrize('nbugs', [1000, 100000])
+def test_layout_uniform(benchmark, nbugs):
+    prj = _project()
+    benchmark(prj.layout_uniform, nbugs)
+
+
+@pytest.mark.parametrize('nbugs', [1000, 10000])
+def test_strips_with_noise(benchmark, nbugs):
+    prj = _project(nbugs)
+    tam = TaxaAssignmentManager(prj.bug_locs)
+    benchmark(tam.even_strips, ['fast', 'slow'], 'x', 0.2)
+
+
+@pytest.mark.parametrize('nbugs', [1000, 10000])
+def test_proportional_strips_with_noise(benchmark, nbugs):
+    prj = _project(nbugs)
+    tam = TaxaAssignmentManager(prj.bug_locs)
+    benchmark(tam.proportional_strips, ['fast', 'slow'], {'fast': 1, 'slow': 3}, 200e-6, 'y', 0.2)
+
+
+def test_simple_image_layout(benchmark, layout_image):
+    imagefile, mappings = layout_image
+
+    def layout():
+        prj = NufebProject()
+        prj.add_taxon_by_template(name="red", template="basic_heterotroph")
+        prj.add_taxon_by_template(name="blue", template="slow_heterotroph")
+        prj.simple_image_layout(imagefile, mappings)
+        return prj
+    benchmark(layout)
+
+
+def test_layout_poisson_cached(benchmark):
+    cache = LayoutCache()
+
+    def layout():
+        prj = NufebProject(seed=1701)
+        prj.set_box(x=200, y=200, z=100)
+        prj.use_layout_cache(cache)
+        prj.layout_poisson(radius=5)
+        return prj
+    layout()
+    benchmark(layout)
+
+
+@pytest.mark.parametrize('ncells', [100000, 1000000])
+def test_compose_layers(benchmark, ncells):
+    np.random.seed(1701)
+    composer = LayoutComposer(box=(2000, 2000), min_distance=1.0)
+    composer.add_uniform(ncells // 2, region=circle(1000, 1000, 600)).add_uniform(ncells // 2)
+    benchmark(composer.compose)
+
+
+@pytest.mark.parametrize('side', [400, 1000])
+def test_compose_dense_image_layer(benchmark, side):
+    # every pixel of a side x side image is a cell, so with within_layers every cell conflicts with its neighbors
+    pixels = np.stack(np.meshgrid(np.arange(side), np.arange(side), indexing='ij'), axis=-1).reshape(-1, 2)
+    composer = LayoutComposer(box=(side, side), min_distance=1.2, within_layers=True)
+    composer.add_points(pixels * 1e-6, taxa='image')
+    benchmark(composer.compose)
+
+
+@pytest.mark.parametrize('process,scale', [('thomas', 3e-6), ('matern', 5e-6)])
+def test_cluster_process_million(benchmark, process, scale):
+    box = np.array([2000e-6, 2000e-6])
+    benchmark(getattr(pointprocess, process), box, 10000, 100, scale)
+
+
+def test_density_thinning_million(benchmark):
+    density = np.random.default_rng(0).random((500, 500))
+    benchmark(pointprocess.inhomogeneous, np.array([2000e-6, 2000e-6]), density, 1000000)
@@ -0,0 +1,25 @@
+import cv2
+import numpy as np
+import pytest
+from nufebmgr.SyntheticDump import SyntheticDump
+
+@pytest.fixture(scope='session', params=[(500, 25), (5000, 50)], ids=['small_dump', 'large_dump'])
+def scaled_dump(request, tmp_path_factory):
+    n_initial, n_timesteps = request.param
+    path = tmp_path_factory.mktemp('dumps') / f'dump_{n_initial}_{n_timesteps}.h5'
+    SyntheticDump(n_initial=n_initial, n_timesteps=n_timesteps, n_types=3, growth_rate=0.08,
+                  death_rate=0.02).write(str(path))
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def layout_image(tmp_path_factory):
+    """A 200x200 px image with 2000 cells in two colors, and the color to taxon mappings it needs."""
+    rng = np.random.default_rng(1701)
+    image = np.full((200, 200, 3), 255, dtype=np.uint8)
+    pixels = rng.choice(200 * 200, 2000, replace=False)
+    colors = np.array([[0, 0, 255], [255, 0, 0]], dtype=np.uint8)  # BGR red and blue
+    image.reshape(-1, 3)[pixels] = colors[rng.integers(0, 2, 2000)]
+    path = tmp_path_factory.mktemp('images') / 'layout.png'
+    cv2.imwrite(str(path), image)
+    return str(path), {'FFFF0000': 'red', 'FF0000FF': 'blue'}
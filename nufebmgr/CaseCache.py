@@ -0,0 +1,138 @@
+'''
+
+A content-addressed store of generated cases, and optionally of their completed runs, shared between sweeps.
+
+Entries are keyed by NufebProject.config_hash(), so two projects that would generate the same case map to the same
+entry however they were set up. Looking an entry up is a single directory check. The case inputs NUFEB only reads
+(atom.in, the input script and manifest.json) are hard-linked between the cache and case directories (falling back to
+copying across filesystems), everything else, i.e. run outputs, is copied: outputs can be rewritten in place by a rerun
+or appended to by a continuation, which must not change what the cache holds.
+
+'''
+
+import os
+import shutil
+import uuid
+from typing import Optional
+from .Manifest import CaseManifest, MANIFEST_FILE, ATOM_IN, INPUT_SCRIPT
+
+CASES = 'cases'
+RUNS = 'runs'
+# files of a case directory that are never modified once written, safe to share by hard-linking
+SHARED_FILES = frozenset({ATOM_IN, INPUT_SCRIPT, MANIFEST_FILE})
+
+
+def _link_file(src: str, dst: str):
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _copy_file(src: str, dst: str):
+    if os.path.lexists(dst):
+        os.remove(dst)
+    shutil.copy2(src, dst)
+
+
+def link_tree(src: str, dst: str, skip_existing: bool = False, shared: Optional[frozenset] = None) -> int:
+    """
+    Hard-link every file below src into the same place below dst, creating directories as needed.
+
+    :param skip_existing: Leave files already in dst alone instead of replacing them
+    :param shared: If given, only these paths (relative to src) are hard-linked, every other file is copied
+    :return: The number of files linked or copied
+    """
+    n = 0
+    for directory, _, files in os.walk(src):
+        relative = os.path.relpath(directory, src)
+        target = os.path.join(dst, relative)
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            destination = os.path.join(target, name)
+            if skip_existing and os.path.lexists(destination):
+                continue
+            path = os.path.normpath(os.path.join(relative, name))
+            place = _link_file if shared is None or path in shared else _copy_file
+            place(os.path.join(directory, name), destination)
+            n += 1
+    return n
+
+
+class CaseCache:
+    """
+    Generated cases under <root>/cases/<key[:2]>/<key> and completed runs under <root>/runs/<key[:2]>/<key>.
+
+    Entries are written to a temporary directory and renamed into place, so concurrent sweeps sharing a cache never
+    see half-written entries; when two store the same key, the first one wins.
+
+    Attributes:
+        root (str): The cache directory
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, CASES), exist_ok=True)
+        os.makedirs(os.path.join(root, RUNS), exist_ok=True)
+
+    def _entry(self, kind: str, key: str) -> str:
+        if len(key) < 3 or os.sep in key:
+            raise ValueError(f'Invalid cache key: {key}')
+        return os.path.join(self.root, kind, key[:2], key)
+
+    def case_path(self, key: str) -> str:
+        return self._entry(CASES, key)
+
+    def run_path(self, key: str) -> str:
+        return self._entry(RUNS, key)
+
+    def has_case(self, key: str) -> bool:
+        return os.path.isdir(self.case_path(key))
+
+    def has_run(self, key: str) -> bool:
+        return os.path.isdir(self.run_path(key))
+
+    def _store(self, kind: str, key: str, directory: str) -> str:
+        entry = self._entry(kind, key)
+        if os.path.isdir(entry):
+            return entry
+        staging = os.path.join(self.root, f'.staging-{uuid.uuid4().hex}')
+        link_tree(directory, staging, shared=SHARED_FILES)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # stored concurrently by someone else
+            shutil.rmtree(staging, ignore_errors=True)
+        return entry
+
+    def store_case(self, key: str, directory: str) -> str:
+        """Add the files of a generated case directory under key, returns the entry's path."""
+        return self._store(CASES, key, directory)
+
+    def store_run(self, key: str, directory: str) -> str:
+        """Add everything in a completed case directory under key, the outputs as copies."""
+        return self._store(RUNS, key, directory)
+
+    def fetch_case(self, key: str, directory: str) -> bool:
+        """Link the cached case into directory. Returns False, leaving directory untouched, if key is not cached."""
+        if not self.has_case(key):
+            return False
+        link_tree(self.case_path(key), directory, shared=SHARED_FILES)
+        return True
+
+    def fetch_run(self, key: str, directory: str) -> bool:
+        """Copy the cached run outputs into directory, keeping files already there. False if key has no run."""
+        if not self.has_run(key):
+            return False
+        link_tree(self.run_path(key), directory, skip_existing=True, shared=SHARED_FILES)
+        return True
+
+    def key_of(self, case_dir: str) -> Optional[str]:
+        """The config hash recorded in a case directory's manifest, if it has one."""
+        manifest_path = os.path.join(case_dir, MANIFEST_FILE)
+        if not os.path.isfile(manifest_path):
+            return None
+        return CaseManifest.load(manifest_path).config_hash
@@ -0,0 +1,115 @@
+'''
+
+Rough, closed-form projections of how large a generated case will get before it is run.
+
+Everything here is an upper bound in spirit: taxa are assumed to grow at ``mu_max`` with no substrate limitation until
+the simulation volume (or the biomass stop condition) caps the population.
+
+'''
+
+import math
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+# Random close packing of spheres, the most biomass the box can hold in practice
+MAX_PACKING_FRACTION = 0.64
+
+# Approximate on-disk sizes of the outputs enabled by InputScriptBuilder
+HDF5_BYTES_PER_CELL = 44       # id (int64), type (int32), x y z radius (float64)
+HDF5_BYTES_PER_DUMP = 4096     # per-timestep dataset headers and chunk index
+VTU_BYTES_PER_CELL = 80        # id type diameter, point coordinates and cell connectivity
+VTU_BYTES_PER_DUMP = 2048      # XML boilerplate of each dump*.vtu
+VTI_BYTES_PER_VALUE = 8        # one float64 per grid cell and field
+VTI_INTERVAL = 10              # grid/vtk dumps are written every 10 steps
+TEXT_BYTES_PER_COLUMN = 14     # a formatted number plus separator in thermo/csv output
+
+
+@dataclass
+class CaseEstimate:
+    initial_cells: int
+    peak_cells: int
+    steps: int
+    cell_steps: float
+    halted: bool
+    grid_size: Optional[float]
+    grid_cells: int
+    n_substrates: int
+    diffusion_cost: int
+    hdf5_bytes: int
+    vtk_bytes: int
+    csv_bytes: int
+    thermo_bytes: int
+
+    @property
+    def total_bytes(self) -> int:
+        return self.hdf5_bytes + self.vtk_bytes + self.csv_bytes + self.thermo_bytes
+
+    def exceeds(self, quota_bytes: int) -> bool:
+        return self.total_bytes > quota_bytes
+
+    def as_dict(self) -> dict:
+        d = asdict(self)
+        d['total_bytes'] = self.total_bytes
+        return d
+
+
+def mean_cell_volume(division_diameter: float) -> float:
+    """
+    Average volume of a dividing coccus, halfway between a newborn (half the division volume) and a dividing cell.
+
+    :param division_diameter (float): Diameter (m) at which the taxon divides
+    :return: Mean cell volume in m^3
+    """
+    return 0.75 * math.pi / 6 * division_diameter ** 3
+
+
+class PopulationProjection:
+    """
+    Exponential growth of several taxa from initial counts, capped at a total population.
+
+    The population at step k is min(sum_i n0_i * exp(mu_i * k * dt), cap). All sums over steps are geometric series so
+    projections are O(number of taxa) regardless of how many steps are run.
+    """
+
+    def __init__(self, initial_counts: list, growth_rates: list, biostep: float, cap: float):
+        self.n0 = [float(n) for n in initial_counts]
+        self.rates = [float(mu) * biostep for mu in growth_rates]
+        self.cap = cap
+
+    def uncapped(self, step: float) -> float:
+        return sum(n * math.exp(min(a * step, 700)) for n, a in zip(self.n0, self.rates))
+
+    def at(self, step: float) -> float:
+        return min(self.uncapped(step), self.cap)
+
+    def step_reaching_cap(self, max_steps: int) -> Optional[int]:
+        """First step at which the population reaches the cap, or None if it does not within max_steps."""
+        if self.uncapped(0) >= self.cap:
+            return 0
+        if self.uncapped(max_steps) < self.cap:
+            return None
+        lo, hi = 0, max_steps
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.uncapped(mid) >= self.cap:
+                hi = mid
+            else:
+                lo = mid
+        return hi
+
+    def cumulative(self, n_steps: int) -> float:
+        """Sum of the uncapped population over steps 0..n_steps-1."""
+        total = 0.0
+        for n, a in zip(self.n0, self.rates):
+            if a == 0:
+                total += n * n_steps
+            else:
+                total += n * math.expm1(min(a * n_steps, 700)) / math.expm1(a)
+        return total
+
+    def cumulative_capped(self, n_steps: int) -> float:
+        """Sum of the capped population over steps 0..n_steps-1."""
+        k_cap = self.step_reaching_cap(n_steps)
+        if k_cap is None:
+            return self.cumulative(n_steps)
+        return self.cumulative(k_cap) + self.cap * (n_steps - k_cap)
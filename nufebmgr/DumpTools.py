@@ -1,8 +1,16 @@
 import h5py
+import math
 import polars
 import polars as pl
 import numpy as np
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from nufebmgr.VtkTools import particle_files, read_vtu
+from nufebmgr.Manifest import CaseManifest
+
+RowRange = Union[slice, Tuple[int, int]]
+BIOMASS_SCHEMA = {'timestep': pl.Int64, 'type': pl.Int64, 'count': pl.Int64, 'volume': pl.Float64,
+                  'mass': pl.Float64}
 
 
 class DumpFile:
@@ -20,16 +28,21 @@ class DumpFile:
     Attributes:
         dumpfile_name (str): The path to the hdf5 file
         dumpfile (Optional[IO]): The the actual HDF5 file
+        manifest (Optional[CaseManifest]): The case's type to taxon mapping and settings, if a manifest.json was found
     """
 
-    def __init__(self,dumpfile_name: str):
+    def __init__(self,dumpfile_name: str, manifest: Union[str, CaseManifest, None] = None):
         """
         Initialize the DumpFile with the given filename
 
         :param dumpfile_name (str): Path to the dump file
+        :param manifest: A CaseManifest or the path to one. By default manifest.json is looked for next to the dump
+            and in the case directory above it
         """
         self.dumpfile_name = dumpfile_name
         self.dumpfile = None
+        self._manifest_source = manifest
+        self.manifest = None
 
     def __enter__(self) -> "Dumpfile":
         """
@@ -38,6 +51,7 @@ class DumpFile:
         :return: Instance of itself with an open dump file
         """
         self.dumpfile = h5py.File(self.dumpfile_name, 'r')
+        self._load_manifest()
 
         self.df = pl.DataFrame()
         timesteps = np.array(self.dumpfile['/id'])
@@ -58,6 +72,136 @@ class DumpFile:
         if self.dumpfile:
             self.dumpfile.close()
 
+    def _load_manifest(self):
+        if isinstance(self._manifest_source, CaseManifest):
+            self.manifest = self._manifest_source
+        elif self._manifest_source is not None:
+            self.manifest = CaseManifest.load(self._manifest_source)
+        else:
+            self.manifest = CaseManifest.find(self.dumpfile_name)
+
+    def with_taxa(self, frame: pl.DataFrame) -> pl.DataFrame:
+        """
+        Add a taxon column to any frame with a type column, using the manifest's mapping.
+
+        Types without a name in the manifest get a null taxon. Raises ValueError if there is no manifest.
+        """
+        if self.manifest is None:
+            raise ValueError(f'No manifest found for {self.dumpfile_name}, cannot map types to taxa')
+        # a lookup rather than a join, which keeps the frame's row order on every polars version
+        return frame.with_columns(pl.col('type').cast(pl.Int64)).with_columns(
+            taxon=pl.col('type').replace_strict(self.manifest.type_names(), default=None, return_dtype=pl.String))
+
+    def population_by_taxon(self) -> pl.DataFrame:
+        """Number of atoms of every taxon at every timestep, as timestep, taxon and count columns."""
+        counts = self.df.group_by('timestep', 'type').agg(pl.len().alias('count'))
+        return self.with_taxa(counts).select('timestep', 'taxon', 'count').sort('timestep', 'taxon')
+
+    def _densities(self, densities: Optional[dict] = None) -> Dict[int, float]:
+        """Density (kg/m3) by type, from the manifest's taxa properties overridden by the given densities."""
+        from nufebmgr.NufebProject import NufebProject
+        by_type = {}
+        if self.manifest is not None:
+            for name, properties in self.manifest.properties.items():
+                if 'density' in properties and name in self.manifest.types:
+                    by_type[self.manifest.types[name]] = float(properties['density'])
+        for key, density in (densities or {}).items():
+            if isinstance(density, str):
+                if density not in NufebProject.taxa_templates:
+                    raise ValueError(f'Unknown taxa template {density}')
+                density = NufebProject.taxa_templates[density]['density']
+            if isinstance(key, str):
+                if self.manifest is None or key not in self.manifest.types:
+                    raise ValueError(f'Unknown taxon {key}, without a manifest densities are given by type')
+                key = self.manifest.types[key]
+            by_type[int(key)] = float(density)
+        return by_type
+
+    @staticmethod
+    def _step_groups(timesteps: Sequence[int], counts: Sequence[int], chunk_rows: int) -> Iterator[Tuple[list, list]]:
+        """Consecutive groups of timesteps holding about chunk_rows rows, with their row counts."""
+        steps, sizes, total = [], [], 0
+        for t, n in zip(timesteps, counts):
+            if steps and total + n > chunk_rows:
+                yield steps, sizes
+                steps, sizes, total = [], [], 0
+            steps.append(t)
+            sizes.append(n)
+            total += n
+        if steps:
+            yield steps, sizes
+
+    def _stacked(self, fields: Sequence[str], timesteps: Sequence[int],
+                 chunk_rows: int) -> Iterator[Tuple[list, list, Dict[str, np.ndarray]]]:
+        """
+        Fields of groups of timesteps, each field's rows for the whole group stacked in one array.
+
+        Every group is read into the same buffers, so only about chunk_rows rows per field are held at a time.
+        :return: Iterator of (timesteps, rows per timestep, arrays by field)
+        """
+        buffers = {}
+        counts = [self.rows_at_time(t) for t in timesteps]
+        for steps, sizes in self._step_groups(timesteps, counts, chunk_rows):
+            total = sum(sizes)
+            for field in fields:
+                if field not in buffers or len(buffers[field]) < total:
+                    buffers[field] = np.empty(max(total, chunk_rows), dtype=self._dataset(field, steps[0]).dtype)
+            offset = 0
+            for t, n in zip(steps, sizes):
+                for field in fields:
+                    self.array_at_time(field, t, out=buffers[field][offset:offset + n])
+                offset += n
+            yield steps, sizes, {field: buffers[field][:total] for field in fields}
+
+    def biomass(self, densities: Optional[dict] = None, timesteps: Optional[Sequence[int]] = None,
+                stream: bool = False, chunk_rows: int = 1_000_000):
+        """
+        Number, total volume (m3) and mass (kg) of the cells of every type at every timestep, from the dumped radii.
+
+        Cells are spheres of their dumped radius. Masses use the density (kg/m3) of each type, from the manifest's taxa
+        properties or the densities given; types with neither, such as lysis groups, get a null mass. Timesteps are read
+        in groups of about chunk_rows cells and each group is reduced with one bincount.
+
+        :param densities: Density by type, or by taxon name when there is a manifest, as a number or the name of the
+            taxa template to take it from. These take precedence over the manifest
+        :param timesteps: Timesteps to include, all by default
+        :param stream: Return an iterator of frames, one per group of timesteps, rather than one frame
+        :param chunk_rows: Cells read at once
+        :return: timestep, type, count, volume and mass columns, plus taxon when there is a manifest
+        """
+        by_type = self._densities(densities)
+        timesteps = self.timesteps() if timesteps is None else list(timesteps)
+        frames = self._biomass_frames(by_type, timesteps, chunk_rows)
+        if stream:
+            return frames
+        frames = list(frames)
+        if not frames:
+            empty = pl.DataFrame(schema=BIOMASS_SCHEMA)
+            return self.with_taxa(empty) if self.manifest is not None else empty
+        return pl.concat(frames)
+
+    def _biomass_frames(self, by_type: Dict[int, float], timesteps: Sequence[int],
+                        chunk_rows: int) -> Iterator[pl.DataFrame]:
+        for steps, sizes, arrays in self._stacked(('type', 'radius'), timesteps, chunk_rows):
+            types = arrays['type'].astype(np.int64, copy=False)
+            slots = max(int(types.max()) + 1 if len(types) else 1, max(by_type, default=0) + 1)
+            # one segment per (timestep, type) of the group
+            segment = np.repeat(np.arange(len(steps)), sizes) * slots + types
+            volumes = 4 / 3 * math.pi * arrays['radius'].astype(np.float64, copy=False) ** 3
+            count = np.bincount(segment, minlength=len(steps) * slots)
+            volume = np.bincount(segment, weights=volumes, minlength=len(steps) * slots)
+            present = np.flatnonzero(count)
+            step_index, type_index = np.divmod(present, slots)
+            density = np.full(slots, np.nan)
+            density[list(by_type)] = list(by_type.values())
+            frame = pl.DataFrame({'timestep': np.asarray(steps, dtype=np.int64)[step_index],
+                                  'type': type_index,
+                                  'count': count[present],
+                                  'volume': volume[present],
+                                  'mass': volume[present] * density[type_index]},
+                                 schema=BIOMASS_SCHEMA).with_columns(pl.col('mass').fill_nan(None))
+            yield self.with_taxa(frame) if self.manifest is not None else frame
+
     def num_timesteps(self) -> int:
         return max(self._id_list())+1
 
@@ -75,8 +219,63 @@ class DumpFile:
         except KeyError:
             print(f"Received a key error trying to read field: {field} at time {t} from {self.dumpfile_name}")
 
-    def types_at_time(self,t:int) -> list:
-        return self.fields_at_time("type", t)
+    def rows_at_time(self, t: int) -> int:
+        """Number of atoms dumped at timestep t."""
+        return self._dataset('id', t).shape[0]
+
+    def _dataset(self, field: str, t: int) -> h5py.Dataset:
+        try:
+            return self.dumpfile[f'{field}/{t}']
+        except KeyError:
+            raise KeyError(f'No field {field} at time {t} in {self.dumpfile_name}') from None
+
+    @staticmethod
+    def _row_slice(rows: Optional[RowRange], n: int) -> slice:
+        if rows is None:
+            return slice(0, n)
+        if not isinstance(rows, slice):
+            rows = slice(*rows)
+        start, stop, step = rows.indices(n)
+        if step != 1:
+            raise ValueError('Only contiguous row ranges can be read')
+        return slice(start, max(start, stop))
+
+    def array_at_time(self, field: str, t: int, out: Optional[np.ndarray] = None,
+                      rows: Optional[RowRange] = None) -> np.ndarray:
+        """
+        A field at one timestep as a NumPy array, read straight from the file without intermediate Python objects.
+
+        :param field (str): Dataset name, e.g. 'id', 'type', 'x' or 'radius'
+        :param t (int): Timestep
+        :param out (np.ndarray): Optional buffer to read into, reused across calls to avoid allocations. It must be
+            one-dimensional and at least as long as the rows read; the returned array is a view of its start
+        :param rows: Optional slice or (start, stop) of the rows to read, e.g. to look at part of a large snapshot
+        :return: The values, raises KeyError if the field or timestep is not in the dump
+        """
+        dataset = self._dataset(field, t)
+        selection = self._row_slice(rows, dataset.shape[0])
+        n = selection.stop - selection.start
+        if out is None:
+            out = np.empty(n, dtype=dataset.dtype)
+        elif out.ndim != 1 or out.shape[0] < n:
+            raise ValueError(f'Buffer of shape {out.shape} cannot hold {n} rows of {field} at time {t}')
+        if n > 0:
+            dataset.read_direct(out, source_sel=np.s_[selection], dest_sel=np.s_[0:n])
+        return out[:n]
+
+    def arrays_at_time(self, fields: Sequence[str], t: int, out: Optional[Dict[str, np.ndarray]] = None,
+                       rows: Optional[RowRange] = None) -> Dict[str, np.ndarray]:
+        """
+        Several fields of one timestep, e.g. arrays_at_time(['x', 'y', 'z'], 10).
+
+        :param out: Optional buffers by field name, as for array_at_time
+        :return: Arrays by field name
+        """
+        out = {} if out is None else out
+        return {field: self.array_at_time(field, t, out.get(field), rows) for field in fields}
+
+    def types_at_time(self,t:int) -> np.ndarray:
+        return self.array_at_time("type", t)
     def _count_uniques(self,x:list) ->dict:
         uniques, counts = np.unique(x, return_counts=True)
         unique_str = [str(unique) for unique in uniques]
@@ -88,30 +287,47 @@ class DumpFile:
     # TODO could DRY between births() and deaths()
     # TODO also, look into just ingesting the h5 into polars on construction and doing all this with dataframe operations
     #      main argument against that is that the straightforward way would be memory inefficient
-    def births_at_time(self, timestep:int) -> List[int]:
-        id_now = self.fields_at_time('id', timestep)
+    def _ids_now_and_past(self, timestep: int):
+        id_now = self.array_at_time('id', timestep)
         try:
-            id_past = self.fields_at_time('id', timestep-1)
-            return np.setdiff1d(id_now, id_past)
+            id_past = self.array_at_time('id', timestep-1)
         except KeyError:
-            print(f'Trying to infer births at time {timestep}. It appears data for the immediate previous {timestep-1} does not exist.')
+            raise KeyError(f'Cannot infer births or deaths at time {timestep}, '
+                           f'the dump has no data for the previous timestep {timestep-1}') from None
+        return id_now, id_past
 
+    def births_at_time(self, timestep:int) -> np.ndarray:
+        """
+        Ids present at a timestep but not at the one before.
 
-    def deaths_at_time(self, timestep:int) -> List[int]:
-        id_now = self.fields_at_time('id', timestep)
-        try:
-            id_past = self.fields_at_time('id', timestep-1)
-            return np.setdiff1d(id_past, id_now)
-        except KeyError:
-            print(f'Trying to infer births at time {timestep}. It appears data for the immediate previous {timestep-1} does not exist.')
+        :return: The new ids, raises KeyError if the timestep or the one before it is not in the dump
+        """
+        id_now, id_past = self._ids_now_and_past(timestep)
+        return np.setdiff1d(id_now, id_past)
+
+    def deaths_at_time(self, timestep:int) -> np.ndarray:
+        """
+        Ids present at the timestep before but not at this one.
 
-    def births(self, groups:dict=None, as_df=False) -> dict:
+        :return: The ids gone, raises KeyError if the timestep or the one before it is not in the dump
+        """
+        id_now, id_past = self._ids_now_and_past(timestep)
+        return np.setdiff1d(id_past, id_now)
+
+    def births(self, groups:dict=None, as_df=False, by_taxon=False) -> dict:
+        """
+        New ids at every timestep, by group of types, or as one frame.
+
+        :param by_taxon: Return one frame with a taxon column from the manifest, rather than filtering per group
+        """
         # TODO raise error if dump doesn't consist of consecutive timessteps a la
         # (df['time'].unique().sort().diff().drop_null() == 1).all()
         new_ids_per_timestep = self.df.join(self.df,
                                              left_on=[pl.col("timestep") - 1, "id"],
                                              right_on=["timestep", "id"],
                                              how="anti").filter(pl.col("timestep") > self.df['timestep'].min())
+        if by_taxon:
+            return self.with_taxa(new_ids_per_timestep)
         births = {}
         if groups is None:
             if as_df:
@@ -124,7 +340,12 @@ class DumpFile:
            births[group_name] = new_ids_per_timestep.filter(pl.col("type").is_in(group_types))
         return births
 
-    def deaths(self, groups:dict=None, as_df=False) -> dict:
+    def deaths(self, groups:dict=None, as_df=False, by_taxon=False) -> dict:
+        """
+        Ids gone at every timestep, by group of types, or as one frame.
+
+        :param by_taxon: Return one frame with a taxon column from the manifest, rather than filtering per group
+        """
         # TODO raise error if dump doesn't consist of consecutive timessteps a la
         # (df['time'].unique().sort().diff().drop_null() == 1).all()
 
@@ -135,6 +356,8 @@ class DumpFile:
                                             .with_columns((pl.col("timestep") + 1).alias("timestep"))
                                             .filter(pl.col("timestep") < self.df['timestep'].max() + 1))
 
+        if by_taxon:
+            return self.with_taxa(deaths_per_timestep)
         deaths = {}
         if groups is None:
             if as_df:
@@ -183,4 +406,126 @@ class DumpFile:
     #     return
 
 
+def _read_particle_step(job: Tuple[int, str]) -> Dict[str, np.ndarray]:
+    """One .vtu particle dump as columns, at module level so that worker processes can run it."""
+    step, path = job
+    arrays = read_vtu(path)
+    n = len(arrays['id'])
+    columns = {'timestep': np.full(n, step, dtype=np.int64),
+               'id': arrays['id'].astype(np.int64),
+               'type': arrays['type'].astype(np.int64)}
+    for field in ('x', 'y', 'z', 'diameter', 'radius'):
+        if field in arrays:
+            columns[field] = arrays[field].astype(np.float64)
+    if 'radius' not in columns and 'diameter' in columns:
+        columns['radius'] = columns['diameter'] / 2
+    return columns
+
+
+class VtuDumpFile(DumpFile):
+    """
+    The DumpFile API over the per-step vtk/dump*.vtu particle files, for runs with HDF5 output disabled.
+
+    Files are parsed in parallel by a process pool and held as one table of timestep, id, type, x, y, z, diameter and
+    radius (whichever were dumped). Parsing thousands of XML files is slow compared to reading HDF5, so the table can be
+    written once with consolidate() and that parquet file opened instead of the directory for repeated analysis.
+
+    Attributes:
+        dumpfile_name (str): The directory of .vtu files, or a parquet file written by consolidate()
+        workers (Optional[int]): Processes used to parse the files, 1 parses them in this process
+        table (polars.DataFrame): Every dumped atom at every step, sorted by timestep
+    """
+
+    def __init__(self, source: str = 'vtk', workers: Optional[int] = None,
+                 manifest: Union[str, CaseManifest, None] = None):
+        """
+        :param source (str): Directory holding the .vtu files, or a consolidated .parquet file
+        :param workers (int): Processes to parse the files with, defaults to the ProcessPoolExecutor default
+        :param manifest: As for DumpFile
+        """
+        super().__init__(source, manifest)
+        self.workers = workers
+        self.table = None
+
+    def __enter__(self) -> "VtuDumpFile":
+        if self.dumpfile_name.endswith('.parquet'):
+            self.table = pl.read_parquet(self.dumpfile_name)
+        else:
+            self.table = self._read_directory()
+        self._load_manifest()
+        self._columns = {name: self.table[name].to_numpy() for name in self.table.columns}
+        steps, starts, counts = np.unique(self._columns['timestep'], return_index=True, return_counts=True)
+        self._bounds = {int(step): (int(start), int(start + count))
+                        for step, start, count in zip(steps, starts, counts)}
+        self.df = self.table.select('timestep', 'id', 'type')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._columns = {}
+
+    def _read_directory(self) -> pl.DataFrame:
+        jobs = list(particle_files(self.dumpfile_name).items())
+        if not jobs:
+            raise FileNotFoundError(f'No .vtu particle dumps found in {self.dumpfile_name}')
+        if self.workers == 1 or len(jobs) == 1:
+            steps = [_read_particle_step(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                steps = list(pool.map(_read_particle_step, jobs, chunksize=max(len(jobs) // 64, 1)))
+        names = [name for name in steps[0] if all(name in step for step in steps)]
+        return pl.DataFrame({name: np.concatenate([step[name] for step in steps]) for name in names})
+
+    def consolidate(self, path: str) -> str:
+        """
+        Write the whole table to a single parquet file, which VtuDumpFile(path) opens without parsing any XML.
+
+        :return: The path written
+        """
+        self.table.write_parquet(path)
+        return path
+
+    def _id_list(self) -> List[int]:
+        return list(self._bounds)
+
+    def _column(self, field: str, t: int) -> np.ndarray:
+        if field not in self._columns or t not in self._bounds:
+            raise KeyError(f'No field {field} at time {t} in {self.dumpfile_name}')
+        start, stop = self._bounds[t]
+        return self._columns[field][start:stop]
+
+    def _stacked(self, fields: Sequence[str], timesteps: Sequence[int],
+                 chunk_rows: int) -> Iterator[Tuple[list, list, Dict[str, np.ndarray]]]:
+        """As DumpFile._stacked, but views of the table, which is already stacked by timestep, where possible."""
+        for field in fields:
+            if field not in self._columns:
+                raise KeyError(f'No field {field} in {self.dumpfile_name}')
+        counts = [self.rows_at_time(t) for t in timesteps]
+        for steps, sizes in self._step_groups(timesteps, counts, chunk_rows):
+            start, stop = self._bounds[steps[0]][0], self._bounds[steps[-1]][1]
+            if stop - start == sum(sizes):
+                yield steps, sizes, {field: self._columns[field][start:stop] for field in fields}
+            else:
+                yield steps, sizes, {field: np.concatenate([self._column(field, t) for t in steps])
+                                     for field in fields}
+
+    def fields_at_time(self, field: str, t: int):
+        try:
+            return list(self._column(field, t))
+        except KeyError:
+            print(f"Received a key error trying to read field: {field} at time {t} from {self.dumpfile_name}")
 
+    def rows_at_time(self, t: int) -> int:
+        return len(self._column('id', t))
+
+    def array_at_time(self, field: str, t: int, out: Optional[np.ndarray] = None,
+                      rows: Optional[RowRange] = None) -> np.ndarray:
+        """As DumpFile.array_at_time. Without a buffer the result is a read-only view of the table."""
+        values = self._column(field, t)
+        values = values[self._row_slice(rows, len(values))]
+        if out is None:
+            return values
+        n = len(values)
+        if out.ndim != 1 or out.shape[0] < n:
+            raise ValueError(f'Buffer of shape {out.shape} cannot hold {n} rows of {field} at time {t}')
+        out[:n] = values
+        return out[:n]
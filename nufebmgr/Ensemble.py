@@ -0,0 +1,251 @@
+'''
+
+Statistics over replicate runs, gathered one run at a time so that no more than one run's data is in memory.
+
+EnsembleAggregator takes long frames from each run (key columns such as timestep and taxon, plus value columns such as
+population) and keeps, for every key and value, a Welford running mean and variance and quantile estimates. Quantiles
+are exact until a key has seen `compression` values, after which older values are summarized in a t-digest.
+
+'''
+
+import math
+import multiprocessing
+import numpy as np
+import polars as pl
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Sequence
+
+SERIES_VALUES = ('population', 'births', 'deaths')
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl) with the k1 scale function, for quantiles of a stream in bounded memory.
+
+    Attributes:
+        compression (int): Roughly the number of centroids kept, higher is more accurate
+        count (float): Total weight added
+    """
+
+    def __init__(self, compression: int = 100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _k(self, q):
+        return self.compression / np.pi * np.arcsin(2 * np.clip(q, 0.0, 1.0) - 1)
+
+    def update(self, values, weights=None):
+        values = np.asarray(values, dtype=float).ravel()
+        values_weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=float).ravel()
+        keep = ~np.isnan(values)
+        values, values_weights = values[keep], values_weights[keep]
+        if not len(values):
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, values_weights])
+        order = np.argsort(means, kind='stable')
+        self._merge(means[order], weights[order])
+
+    def _merge(self, means, weights):
+        # sorted centroids go to the unit-wide bin of the scale function holding their middle, each bin becomes one
+        # centroid, so no merged centroid spans much more than one unit of k
+        total = weights.sum()
+        middle = (np.cumsum(weights) - weights / 2) / total
+        bins = np.floor(self._k(middle) - self._k(0.0)).astype(np.int64)
+        starts = np.flatnonzero(np.diff(bins, prepend=-1))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+        self.count = total
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return math.nan
+        # centroids sit at the middle of their weight, the extremes pin the ends
+        positions = np.concatenate([[0.0], np.cumsum(self.weights) - self.weights / 2, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * self.count, positions, values))
+
+
+class EnsembleAggregator:
+    """
+    Streaming mean, variance and quantiles of value columns per key across runs.
+
+    Every run must contain each key at most once. Keys missing from a run (e.g. timesteps after it halted) simply get
+    fewer observations, the n column of the summary says how many.
+
+    Attributes:
+        values (tuple): Value columns, every other column of the first frame added is a key column
+        quantiles (tuple): Quantiles reported, as fractions
+        compression (int): Values per key kept exactly before falling back to a t-digest
+        runs (int): Frames added so far
+    """
+
+    def __init__(self, values: Sequence[str] = SERIES_VALUES, quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+                 compression: int = 100):
+        self.values = tuple(values)
+        self.quantiles = tuple(quantiles)
+        self.compression = compression
+        self.keys: Optional[List[str]] = None
+        self.runs = 0
+        self._index: Dict[tuple, int] = {}
+        self._key_schema = None
+        self._n = np.empty((0, len(self.values)))
+        self._mean = np.empty((0, len(self.values)))
+        self._m2 = np.empty((0, len(self.values)))
+        self._buffer = np.empty((0, len(self.values), compression))
+        self._buffered = np.zeros((0, len(self.values)), dtype=int)
+        self._digests: Dict[tuple, TDigest] = {}
+
+    def _grow(self, n_keys: int):
+        extra = n_keys - len(self._n)
+        if extra <= 0:
+            return
+        n_values = len(self.values)
+        self._n = np.concatenate([self._n, np.zeros((extra, n_values))])
+        self._mean = np.concatenate([self._mean, np.zeros((extra, n_values))])
+        self._m2 = np.concatenate([self._m2, np.zeros((extra, n_values))])
+        self._buffer = np.concatenate([self._buffer, np.full((extra, n_values, self.compression), np.nan)])
+        self._buffered = np.concatenate([self._buffered, np.zeros((extra, n_values), dtype=int)])
+
+    def _rows(self, frame: pl.DataFrame) -> np.ndarray:
+        """Index of each row's key, adding keys not seen before."""
+        # a dict over key tuples rather than a join, so null keys (e.g. a type without a taxon) match each other
+        index = self._index
+        rows = np.fromiter((index.setdefault(key, len(index)) for key in frame.select(self.keys).iter_rows()),
+                           dtype=np.int64, count=frame.height)
+        self._grow(len(index))
+        return rows
+
+    def add(self, frame: pl.DataFrame):
+        """Add one run's values, a long frame of key columns and the value columns."""
+        missing = [value for value in self.values if value not in frame.columns]
+        if missing:
+            raise ValueError(f'Run is missing value columns {missing}')
+        if self.keys is None:
+            self.keys = [column for column in frame.columns if column not in self.values]
+            self._key_schema = frame.select(self.keys).schema
+        elif set(frame.columns) - set(self.values) != set(self.keys):
+            raise ValueError(f'Run has key columns {sorted(set(frame.columns) - set(self.values))}, '
+                             f'expected {sorted(self.keys)}')
+        if frame.select(self.keys).is_duplicated().any():
+            raise ValueError('A run may contain each key only once')
+        rows = self._rows(frame)
+        for column, value in enumerate(self.values):
+            x = frame[value].cast(pl.Float64).to_numpy()
+            present = ~np.isnan(x)
+            r, x = rows[present], x[present]
+            # Welford, for all keys of the run at once
+            self._n[r, column] += 1
+            delta = x - self._mean[r, column]
+            self._mean[r, column] += delta / self._n[r, column]
+            self._m2[r, column] += delta * (x - self._mean[r, column])
+
+            slot = self._buffered[r, column]
+            self._buffer[r, column, slot] = x
+            self._buffered[r, column] += 1
+            for row in r[self._buffered[r, column] == self.compression].tolist():
+                self._flush(row, column)
+        self.runs += 1
+
+    def _flush(self, row: int, column: int):
+        digest = self._digests.setdefault((row, column), TDigest(self.compression))
+        digest.update(self._buffer[row, column, :self._buffered[row, column]])
+        self._buffer[row, column, :] = np.nan
+        self._buffered[row, column] = 0
+
+    def add_runs(self, frames: Iterable[pl.DataFrame]):
+        for frame in frames:
+            self.add(frame)
+
+    def add_dumps(self, paths: Sequence[str], workers: Optional[int] = None):
+        """
+        Add the population, births and deaths of each run's dump, read in parallel processes and added as each
+        finishes. Paths may be HDF5 dumps or anything VtuDumpFile opens.
+        """
+        if workers == 1:
+            for path in paths:
+                self.add(_series_from_path(path))
+            return
+        # polars is not fork safe once its thread pool is running, so workers are spawned
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for future in as_completed([pool.submit(_series_from_path, path) for path in paths]):
+                self.add(future.result())
+
+    def _quantiles(self) -> np.ndarray:
+        """(keys, values, quantiles) estimates."""
+        result = np.full(self._n.shape + (len(self.quantiles),), np.nan)
+        observed = self._buffered > 0
+        if observed.any():
+            # keys never flushed are exact, straight from their buffers
+            with np.errstate(all='ignore'):
+                exact = np.nanquantile(self._buffer[observed], self.quantiles, axis=-1)
+            result[observed] = exact.T
+        for (row, column), digest in self._digests.items():
+            if not self._buffered[row, column]:
+                result[row, column] = [digest.quantile(q) for q in self.quantiles]
+                continue
+            combined = TDigest(self.compression)
+            combined.min, combined.max = digest.min, digest.max
+            combined.update(np.concatenate([digest.means, self._buffer[row, column, :self._buffered[row, column]]]),
+                            np.concatenate([digest.weights, np.ones(self._buffered[row, column])]))
+            result[row, column] = [combined.quantile(q) for q in self.quantiles]
+        return result
+
+    def summary(self) -> pl.DataFrame:
+        """
+        One row per key and value: n, mean, var (sample variance), std and the quantiles as p5, p50, p95 etc.
+        """
+        if self.keys is None:
+            raise ValueError('No runs have been added')
+        quantiles = self._quantiles()
+        with np.errstate(all='ignore'):
+            variance = np.where(self._n > 1, self._m2 / (self._n - 1), np.nan)
+        index = pl.DataFrame(list(self._index), schema=self._key_schema, orient='row')
+        frames = []
+        for column, value in enumerate(self.values):
+            stats = {'value': pl.Series([value] * index.height, dtype=pl.String),
+                     'n': self._n[:, column].astype(np.int64),
+                     'mean': np.where(self._n[:, column] > 0, self._mean[:, column], np.nan),
+                     'var': variance[:, column],
+                     'std': np.sqrt(variance[:, column])}
+            for k, q in enumerate(self.quantiles):
+                stats[f'p{q * 100:g}'] = quantiles[:, column, k]
+            frames.append(index.with_columns(**stats))
+        return (pl.concat(frames).with_columns(pl.col('mean', 'var', 'std').fill_nan(None))
+                .sort(self.keys + ['value']))
+
+
+def run_series(dump) -> pl.DataFrame:
+    """
+    Population, births and deaths per timestep and taxon (or type, without a manifest) of one opened DumpFile, with
+    zeros where a taxon had none.
+    """
+    df = dump.df.with_columns(pl.col('timestep', 'type').cast(pl.Int64))
+    counts = [df.group_by('timestep', 'type').agg(pl.len().alias('population'))]
+    for name, events in (('births', dump.births(as_df=True)), ('deaths', dump.deaths(as_df=True))):
+        events = events.with_columns(pl.col('timestep', 'type').cast(pl.Int64))
+        counts.append(events.group_by('timestep', 'type').agg(pl.len().alias(name)))
+    if dump.manifest is not None:
+        types = pl.DataFrame({'type': sorted(dump.manifest.types.values())}, schema={'type': pl.Int64})
+    else:
+        types = df.select('type').unique().sort('type')
+    grid = df.select('timestep').unique().sort('timestep').join(types, how='cross')
+    for frame in counts:
+        grid = grid.join(frame, on=['timestep', 'type'], how='left')
+    grid = grid.with_columns(pl.col(SERIES_VALUES).fill_null(0))
+    if dump.manifest is not None:
+        return dump.with_taxa(grid).drop('type').select('timestep', 'taxon', *SERIES_VALUES)
+    return grid
+
+
+def _series_from_path(path: str) -> pl.DataFrame:
+    from .DumpTools import DumpFile, VtuDumpFile
+    dump = DumpFile(path) if path.endswith('.h5') else VtuDumpFile(path, workers=1)
+    with dump:
+        return run_series(dump)
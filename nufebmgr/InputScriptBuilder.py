@@ -1,8 +1,10 @@
 from jinja2 import Template
 from datetime import datetime
+import copy
 import math
 from functools import reduce
 from .SimulationBox import SimulationBox
+from .SubstrateGrid import SubstrateGridPicker
 
 class InputScriptBuilder:
     # Default configuration data
@@ -308,8 +310,10 @@ class InputScriptBuilder:
 """
 
     def __init__(self):
-        self.config_vals = self.DEFAULT_INPUTSCRIPT
+        # copied so that builders don't leak modifications into each other through the class-level defaults
+        self.config_vals = copy.deepcopy(self.DEFAULT_INPUTSCRIPT)
         self.group_assignments = {}
+        self.grid_choice = None
 
     def clear_bug_groups(self, keep_dead=True):
         if(keep_dead):
@@ -327,14 +331,16 @@ class InputScriptBuilder:
                 entry['comment'] = f'# {all_groups[k]["description"]}'
             self.config_vals['microbes_and_groups'][0]['bug_groups'].append(entry)
 
-    def build_substrate_grid(self, substrates,simbox,forced_size=None):
+    def build_substrate_grid(self, substrates,simbox,forced_size=None,cell_diameter=1e-6):
+        picker = self._grid_picker(simbox, len(substrates), cell_diameter)
         if forced_size is not None:
-            if simbox.xlen % forced_size == simbox.ylen % forced_size == simbox.zlen % forced_size == 0:
-                grid_size = f'{forced_size}e-6'
-            else:
+            try:
+                self.grid_choice = picker.choice_for(forced_size)
+            except ValueError:
                 raise ValueError(f'Grid size was explicity set to {forced_size}, this does not fit a simulation of dimensions {simbox.dim_string()}')
         else:
-            grid_size = f'{self._pick_grid_size(simbox)}e-6'
+            self.grid_choice = picker.pick()
+        grid_size = f'{self.grid_choice.spacing:g}e-6'
         contents = self.config_vals['mesh_grid_and_substrates'][0]['content']
         new_contents = []
         for content in contents:
@@ -355,6 +361,117 @@ class InputScriptBuilder:
 
 
 
+    def _system_setting_index(self, name):
+        for i, entry in enumerate(self.config_vals['system_settings'][0]['content']):
+            if entry['name'] == name:
+                return i
+        raise KeyError(f'No system setting named {name}')
+
+    def _atoms_setting_index(self):
+        # atoms come from read_data in a new run and from read_restart in a continuation
+        for i, entry in enumerate(self.config_vals['system_settings'][0]['content']):
+            if entry['name'] in ('read_data', 'read_restart'):
+                return i
+        raise KeyError('No read_data or read_restart system setting')
+
+    def _pick_processor_grid(self, s: SimulationBox, nranks: int, zranks: int = 1):
+        if nranks < 1 or zranks < 1:
+            raise ValueError(f'Rank counts must be positive, got {nranks} total and {zranks} in z')
+        if nranks % zranks != 0:
+            raise ValueError(f'{nranks} ranks cannot be split into {zranks} layers in z')
+        plane_ranks = nranks // zranks
+        best = None
+        for px in range(1, plane_ranks + 1):
+            if plane_ranks % px != 0:
+                continue
+            py = plane_ranks // px
+            # minimize the surface (and so ghost atom communication) of each rank's subdomain
+            a, b, c = s.xlen / px, s.ylen / py, s.zlen / zranks
+            area = a * b + b * c + a * c
+            if best is None or area < best[0]:
+                best = (area, px, py)
+        return best[1], best[2], zranks
+
+    def build_processors(self, s: SimulationBox, nranks=None, zranks=1):
+        index = self._system_setting_index('processors')
+        if nranks is None:
+            entry = {"name": "processors", "x": "*", "y": "*", "z": f"{zranks}", 'comment': 'Processor grid'}
+        else:
+            px, py, pz = self._pick_processor_grid(s, nranks, zranks)
+            entry = {"name": "processors", "x": f"{px}", "y": f"{py}", "z": f"{pz}",
+                     'comment': f'Processor grid for {nranks} ranks, run with exactly this many'}
+        self.config_vals['system_settings'][0]['content'][index] = entry
+
+    def add_load_balancing(self, threshold=1.1, every=None, dynamic_threshold=None, style='shift',
+                           dims='xy', iterations=10, stop_threshold=1.05):
+        allowed_styles = {'shift', 'rcb'}
+        if style not in allowed_styles:
+            raise ValueError(f'Invalid load balancing style: {style}. Must be one of {allowed_styles}.')
+        if style == 'shift':
+            style_args = f'shift {dims} {iterations} {stop_threshold}'
+        else:
+            style_args = 'rcb'
+
+        content = self.config_vals['system_settings'][0]['content']
+        if style == 'rcb':
+            # recursive coordinate bisection produces non-brick subdomains
+            content.insert(self._atoms_setting_index(),
+                           {'name': 'comm_style', 'style': 'tiled', 'comment': 'Allow non-brick subdomains for rcb'})
+        balance_entries = [{'name': 'balance', 'thresh': f'{threshold}', 'args': style_args,
+                            'comment': 'Balance initial atoms across processors'}]
+        if every is not None:
+            if dynamic_threshold is None:
+                dynamic_threshold = threshold
+            balance_entries.append({'name': 'fix', 'fix_name': 'balance', 'group': 'all', 'fix_loc': 'balance',
+                                    'every': f'{every}', 'thresh': f'{dynamic_threshold}', 'args': style_args,
+                                    'comment': f'Rebalance every {every} steps as the biofilm grows'})
+        index = self._atoms_setting_index() + 1
+        content[index:index] = balance_entries
+
+    def _max_displacement(self):
+        for entry in self.config_vals['physical_processes'][0]['content']:
+            if entry.get('fix_loc') == 'nve/limit':
+                return float(entry['p1'])
+        raise KeyError('No nve/limit fix defined in physical processes')
+
+    def build_neighbor(self, active_taxa, skin=None, every=1, delay=0, check='no', sort_every=10,
+                       sort_binsize=None):
+        # lists are rebuilt every `every` steps, in between cells grow from their initial diameter up to at most their
+        # division diameter and each moves at most the nve/limit distance per step, so the skin only has to cover
+        # that rather than a fixed 2 microns. With check yes, rebuilds wait until an atom has moved half the skin, so
+        # two approaching cells can use up the whole skin by moving alone and no derived skin also covers growth
+        if check == 'yes' and skin is None and active_taxa:
+            raise ValueError('A neighbor skin derived from the taxa assumes rebuilds every `every` steps (check no), '
+                             'give the skin explicitly to use check yes')
+        if active_taxa:
+            diameters = [float(taxon['diameter']) for taxon in active_taxa.values()]
+            div_diameters = [float(taxon.get('division_strategy', {}).get('diameter', taxon['diameter']))
+                             for taxon in active_taxa.values()]
+            max_diameter = max(diameters + div_diameters)
+            if skin is None:
+                skin = max_diameter - min(diameters) + 2 * self._max_displacement() * every
+        else:
+            max_diameter = 1e-6
+            if skin is None:
+                skin = 2e-6
+        if sort_binsize is None:
+            # half the neighbor cutoff, as LAMMPS would do, but from the largest cell that can occur
+            sort_binsize = (max_diameter + skin) / 2
+
+        self.config_vals['microbes_and_groups'][0]['neighbors'] = [
+            {'name': '#Controlling nearest neighbor recalculation'},
+            {"name": "neighbor", "distance": f'{skin:.3g}', "method": "bin",
+             'comment': '# neighbor skin distance and style'},
+            {"name": "neigh_modify", "every_kw": "every", "every": f'{every}', "delay_kw": "delay", "delay": f'{delay}',
+             "check_kw": "check", "check": check,
+             'comment': f'# Rebuild neighbor list every {every} steps' if check == 'no'
+             else '# Rebuild neighbor list once atoms have moved half the skin'}]
+
+        index = self._system_setting_index('atom_modify')
+        self.config_vals['system_settings'][0]['content'][index] = {
+            "name": "atom_modify", "method": "map", "struct": "array", 'method2': 'sort', "time": f'{sort_every}',
+            "param": f'{sort_binsize:.3g}', 'comment': f'find atoms using indices, sort every {sort_every} steps'}
+
     def limit_biofilm_height(self, max_height):
          self.config_vals['system_settings'][0]['content'].append({
                                                                  'name': 'region',
@@ -390,11 +507,46 @@ class InputScriptBuilder:
 
     def end_on_biomass(self,percent):
         float_percent = percent/100
-        halt_dict = {'name':'fix', 'id': 'halt_vol', 'group':'all', 'cmd':'halt',
-                     'N-check': '1', 'comparison': f'v_biomass_pct > {float_percent}',
-                     'action':'error', 'error-type':'soft', 'comment':'# end at percent biomass vol'}
+        self.add_halt('halt_vol', f'v_biomass_pct > {float_percent}', comment='# end at percent biomass vol')
+
+    def add_halt(self, halt_id, comparison, check_every=1, comment=''):
+        """
+        Softly end the run once an equal-style variable satisfies the comparison, e.g. 'v_n_all > 10000'.
+
+        Output written so far is kept and the done token is still created, since soft halts continue with the rest of
+        the script.
+        """
+        halt_dict = {'name':'fix', 'id': halt_id, 'group':'all', 'cmd':'halt',
+                     'N-check': f'{check_every}', 'comparison': comparison,
+                     'action':'error', 'error-type':'soft', 'comment': comment}
         self.config_vals['run'][0]['content'].insert(1,halt_dict)
-        pass
+
+    def end_on_relative_abundance(self, taxon, threshold, above=True):
+        # relies on the v_ra_ variables from add_abs_vars
+        operator = '>' if above else '<'
+        self.add_halt(f'halt_ra_{taxon}', f'v_ra_{taxon} {operator} {threshold}',
+                      comment=f'# end when relative abundance of {taxon} {operator} {threshold}')
+
+    def end_on_cell_count(self, max_cells):
+        # relies on v_n_all from add_abs_vars
+        self.add_halt('halt_cells', f'v_n_all > {max_cells}', comment=f'# end at more than {max_cells} cells')
+
+    def end_on_growth_plateau(self, epsilon, window):
+        """
+        End the run once total biomass grows by less than epsilon (relative) over window steps.
+
+        fix ave/time holds the biomass sampled every window steps. The halt is defined first, so on those steps it
+        compares the current biomass against the previous sample before fix ave/time replaces it.
+        """
+        self.config_vals['computation_output'][0]['plateau'] = [
+            {'name': f'Relative biomass growth over the last {window} steps'},
+            {'name': 'variable', 'varname': 'mass_growth', 'op': 'equal',
+             'expression': '"(v_mass-f_mass_window)/(f_mass_window+1e-30)"'}]
+        self.add_halt('halt_plateau', f'v_mass_growth < {epsilon}', check_every=window,
+                      comment=f'# end when biomass grows less than {epsilon} in {window} steps')
+        self.config_vals['run'][0]['content'].insert(2, {
+            'name': 'fix', 'id': 'mass_window', 'group': 'all', 'cmd': 'ave/time', 'every': '1', 'repeat': '1',
+            'freq': f'{window}', 'value': 'v_mass', 'comment': '# biomass at the start of the current window'})
 
         # "run": [
         #     {"title": "#----Run----#",
@@ -411,17 +563,24 @@ class InputScriptBuilder:
         #                  ]
         #      }
         # ]
-    def _pick_grid_size(self,s:SimulationBox):
-        possible_sizes = [2.5,2.0,1.5]
-        for size in possible_sizes:
-            if s.xlen%size==s.ylen%size==s.zlen%size==0:
-                return size
-
-        # we'd prefer slightly larger, but return a grid size of 1 if needed
-        size = 1.0
-        if s.xlen % size == s.ylen % size == s.zlen % size == 0:
-            return size
-        raise ValueError(f'No valid grid size between 5 and 15 microns for a simulation of dimensions {s.dim_string()}')
+    def _run_style_value(self, key):
+        for entry in self.config_vals['run'][0]['content']:
+            if entry['name'] == 'run_style':
+                for k, v in entry.items():
+                    if v == key:
+                        return float(entry[f'v{k[1:]}'])
+        raise KeyError(f'No run_style parameter named {key}')
+
+    def _grid_picker(self, s: SimulationBox, n_substrates=1, cell_diameter=1e-6):
+        diffusion_coeffs = [float(entry['coeff1']) for entry in self.config_vals['chemical_processes'][0]['content']
+                            if entry.get('fix_loc') == 'nufeb/diffusion_reaction']
+        return SubstrateGridPicker(s, n_substrates=n_substrates, cell_diameter=cell_diameter,
+                                   diffusion_coeff=max(diffusion_coeffs, default=1.6e-9),
+                                   diffusion_dt=self._run_style_value('diffdt'),
+                                   diffusion_iterations=int(self._run_style_value('diffmax')))
+
+    def _pick_grid_size(self, s: SimulationBox, n_substrates=1, cell_diameter=1e-6):
+        return self._grid_picker(s, n_substrates, cell_diameter).pick().spacing
 
 
     def clear_growth_strategy(self):
@@ -491,13 +650,13 @@ class InputScriptBuilder:
             else:
                 raise KeyError(f"Taxon {k} has unrecognized division strategy: {active_taxa[k]['division_strategy']['name'] }")
 
-    def add_hdf5_output(self):
+    def add_hdf5_output(self, filename='hdf5/dump.h5'):
         self.config_vals['computation_output'][0]['hdf5_output'] = [
             {'name': 'HDF5 output, efficient binary format for storing many atom properties'},
             {'name': 'requires NUFEB built with HDF5 option'},
             {'name': 'shell', 'command': 'mkdir hdf5', 'comment': '#Create directory for dump'},
             {'name': 'dump', 'dumpname': 'du3', 'group': 'all', 'format': 'nufeb/hdf5', 'p1': '1',
-                'loc': 'hdf5/dump.h5',
+                'loc': filename,
                 'dumpvars': 'id type x y z radius', 'comment': ''},
          ]
 
@@ -529,7 +688,7 @@ class InputScriptBuilder:
         self.config_vals['computation_output'][0]['thermo_output'].append(thermo_style)
         self.config_vals['computation_output'][0]['thermo_output'].append({'name':'thermo', 'step':timestep})
 
-    def enable_csv_output(self,tracking_abs,tracking_biomass_pct):
+    def enable_csv_output(self,tracking_abs,tracking_biomass_pct,append=False):
         csv_vars = ['current_step']
         csv_header=['step']
         if tracking_abs:
@@ -555,6 +714,9 @@ class InputScriptBuilder:
                         'time':'1', 'vars':f'"{var_string}"', 'screen': 'screen no',
                         'v1':'file', 'file': 'output.csv', 't':'title', 'header':f'"{header_string}"'}
                        ]
+        if append:
+            # keep the rows from before the restart
+            csv_dict[-1]['v1'] = 'append'
 
         self.config_vals['computation_output'][0]['csv_output']=csv_dict
 
@@ -613,15 +775,41 @@ class InputScriptBuilder:
                         entry[kj] = vj
                 self.config_vals['biological_processes'][0]['lysis'].append(entry)
 
-    def build_run(self, runtime):
+    def build_run(self, runtime, upto=False):
         content = self.config_vals['run'][0]['content']
         bio_timestep=900
         for i,item in enumerate(content):
             if item['name']=='run':
                 run_hours = runtime/60/60/bio_timestep
                 new_item = {"name": "run", "val": f'{runtime}', 'comment': f'# run duration ({run_hours} H)'}
+                if upto:
+                    # a continued run finishes at the original final step rather than running the full duration again
+                    new_item = {"name": "run", "val": f'{runtime}', 'upto': 'upto',
+                                'comment': f'# run up to step {runtime}'}
                 content[i]=new_item
 
+    def add_restart_output(self, every, keep_all=False):
+        if keep_all:
+            files = {'file': 'restart/restart.*'}
+            comment = f'# write a restart file every {every} steps'
+        else:
+            # alternate between two files so only the latest checkpoints are kept
+            files = {'file1': 'restart/restart.a', 'file2': 'restart/restart.b'}
+            comment = f'# write a restart file every {every} steps, alternating between two files'
+        self.config_vals['computation_output'][0]['restart_output'] = [
+            {'name': 'Checkpoints to continue from if the run is interrupted'},
+            {'name': 'shell', 'command': 'mkdir restart', 'comment': '#Create directory for restart files'},
+            {'name': 'restart', 'every': f'{every}', **files, 'comment': comment},
+        ]
+
+    def read_restart(self, restart_file):
+        content = self.config_vals['system_settings'][0]['content']
+        # the atom style, boundaries, atoms and group membership are all restored from the restart file
+        content[:] = [entry for entry in content if entry['name'] not in ('atom_style', 'boundary')]
+        index = self._system_setting_index('read_data')
+        content[index] = {"name": "read_restart", "filename": restart_file,
+                          'comment': 'Continue from restart file, restores atoms, types and groups'}
+
     def build_t6ss(self, t6ss_attackers,t6ss_vulns,seed):
         if not t6ss_attackers:
             return
@@ -0,0 +1,114 @@
+'''
+
+Memoization of initial cell positions, so replicate studies that vary only the taxa, composition or strip noise over
+one layout sample it once.
+
+A layout is keyed by the box, the layout method and its parameters, and the state of NumPy's global random numbers
+before sampling, which is all the layouts depend on. Alongside the positions the state after sampling is kept and
+restored on a hit, so that everything drawn afterwards (taxa assignment, strip noise) is the same as without the cache.
+
+'''
+
+import hashlib
+import os
+import uuid
+import numpy as np
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+RandomState = tuple
+
+
+def layout_key(box: Tuple[float, float, float], method: str, params: dict, state: RandomState) -> str:
+    """
+    sha256 identifying a layout.
+
+    :param box: x, y and z lengths of the simulation box (microns)
+    :param method: Name of the layout method, e.g. 'poisson'
+    :param params: The method's parameters, must have a stable repr
+    :param state: np.random.get_state() before sampling
+    """
+    name, keys, position, has_gauss, cached_gaussian = state
+    digest = hashlib.sha256(repr((tuple(float(v) for v in box), method, sorted(params.items()))).encode())
+    digest.update(np.asarray(keys).tobytes())
+    digest.update(repr((name, position, has_gauss, cached_gaussian)).encode())
+    return digest.hexdigest()
+
+
+class LayoutCache:
+    """
+    Least recently used layouts in memory, optionally backed by .npz files in a directory shared between processes.
+
+    Attributes:
+        max_entries (int): Layouts kept in memory, the least recently used is evicted beyond this
+        directory (Optional[str]): Where layouts are also written, and looked for on a memory miss
+        hits (int): Lookups answered from memory or disk
+        misses (int): Lookups that required sampling
+    """
+
+    def __init__(self, max_entries: int = 16, directory: Optional[str] = None):
+        if max_entries < 1:
+            raise ValueError(f'A layout cache needs room for at least one layout, got {max_entries}')
+        self.max_entries = max_entries
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, RandomState]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (self.directory is not None and os.path.exists(self._path(key)))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, RandomState]]:
+        """The (n, 2) positions and random state after sampling stored under key, or None."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        elif self.directory is not None and os.path.exists(self._path(key)):
+            entry = self._load(key)
+            self._remember(key, entry)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, xy: np.ndarray, state: RandomState):
+        xy = np.array(xy, dtype=float).reshape(-1, 2)
+        xy.setflags(write=False)
+        self._remember(key, (xy, state))
+        if self.directory is not None and not os.path.exists(self._path(key)):
+            self._save(key, xy, state)
+
+    def clear(self):
+        """Forget the layouts held in memory, files on disk are kept."""
+        self._entries.clear()
+
+    def _remember(self, key: str, entry: Tuple[np.ndarray, RandomState]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self, key: str, xy: np.ndarray, state: RandomState):
+        name, keys, position, has_gauss, cached_gaussian = state
+        staging = os.path.join(self.directory, f'.{key}.{uuid.uuid4().hex}.npz')
+        with open(staging, 'wb') as f:
+            np.savez(f, xy=xy, name=np.array(name), keys=keys, position=position, has_gauss=has_gauss,
+                     cached_gaussian=cached_gaussian)
+        os.replace(staging, self._path(key))
+
+    def _load(self, key: str) -> Tuple[np.ndarray, RandomState]:
+        with np.load(self._path(key)) as data:
+            xy = data['xy']
+            xy.setflags(write=False)
+            state = (str(data['name']), data['keys'], int(data['position']), int(data['has_gauss']),
+                     float(data['cached_gaussian']))
+        return xy, state
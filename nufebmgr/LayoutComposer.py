@@ -0,0 +1,194 @@
+'''
+
+Initial layouts built from several sources, e.g. colonies drawn in an image over a sparse random background.
+
+Layers are stacked in the order they are added and may each be restricted to a region. Where cells of different layers
+come closer than a minimum distance, the cell of the earlier layer is kept, using the spatial hash of spatialhash.py so
+that composing scales linearly with the number of cells. Cells of a layer either come with a taxon (images, or a taxon
+given for the layer) or are left "Unassigned" for the project's spatial distribution to assign.
+
+Like the rest of NufebProject's layout methods, lengths are given in microns and stored in meters.
+
+'''
+
+import cv2
+import numpy as np
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple, Union
+from .poisson import PoissonDisc
+from .spatialhash import thin
+
+UNASSIGNED = "Unassigned"
+
+# a region takes (n, 2) positions in meters and returns which of them it contains
+Region = Callable[[np.ndarray], np.ndarray]
+
+
+def rectangle(xmin, ymin, xmax, ymax) -> Region:
+    """Region of positions with xmin <= x < xmax and ymin <= y < ymax (microns)."""
+    lo = np.array([xmin, ymin]) * 1e-6
+    hi = np.array([xmax, ymax]) * 1e-6
+
+    def contains(xy):
+        return np.all((xy >= lo) & (xy < hi), axis=1)
+    contains.bounds = (lo, hi)
+    return contains
+
+
+def circle(x, y, radius) -> Region:
+    """Region of positions within radius of (x, y) (microns)."""
+    centre = np.array([x, y]) * 1e-6
+    r = radius * 1e-6
+
+    def contains(xy):
+        return ((xy - centre) ** 2).sum(axis=1) <= r ** 2
+    contains.bounds = (centre - r, centre + r)
+    return contains
+
+
+def from_mask(mask, pixel_size=1.0) -> Region:
+    """
+    Region of the True pixels of a 2D boolean array. Row 0 is the top of the box, as in image layouts.
+
+    :param pixel_size: Pixel edge length in microns
+    """
+    mask = np.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    pixel = pixel_size * 1e-6
+
+    def contains(xy):
+        col = np.floor(xy[:, 0] / pixel).astype(int)
+        row = height - 1 - np.floor(xy[:, 1] / pixel).astype(int)
+        inside = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+        result = np.zeros(len(xy), dtype=bool)
+        result[inside] = mask[row[inside], col[inside]]
+        return result
+    return contains
+
+
+def image_points(imagefile, mappings) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Positions (meters) and taxa of the coloured pixels of an image, one cell per pixel of 1 micron.
+
+    Every pixel that is not white is a cell. Cells are ordered column by column from the left, and from the top of the
+    image within each column.
+
+    :param mappings: Taxon name by colour code, 'FF' followed by the RGB hex code, e.g. {'FFFF0000': 'red_taxon'}
+    """
+    image = cv2.imread(imagefile)
+    if image is None:
+        raise ValueError(f'Could not read image {imagefile}')
+    height = image.shape[0]
+    coloured = np.any(image != 255, axis=2)
+    xs, ys = np.nonzero(coloured.T)
+    bgr = image[ys, xs].astype(np.uint32)
+    packed = (bgr[:, 2] << 16) | (bgr[:, 1] << 8) | bgr[:, 0]
+    codes, inverse = np.unique(packed, return_inverse=True)
+    names = []
+    for code in codes:
+        color_code = f'FF{int(code):06X}'
+        if color_code not in mappings:
+            raise ValueError(f'Colour {color_code} in {imagefile} has no taxon mapping')
+        names.append(mappings[color_code])
+    xy = np.column_stack([xs * 1e-6, (height - ys - 1) * 1e-6])
+    return xy, np.array(names, dtype=object)[inverse.reshape(-1)]
+
+
+@dataclass
+class LayerSummary:
+    name: str
+    added: int
+    kept: int = 0
+
+
+class LayoutComposer:
+    """
+    Layers of cells combined into one population.
+
+    Attributes:
+        box (tuple): x and y lengths of the simulation box (microns)
+        periodic (bool): Whether conflicts are checked across the periodic x and y boundaries
+        min_distance (float): Cells of different layers closer than this (microns) are in conflict
+        within_layers (bool): Also remove conflicts between cells of the same layer, e.g. overlapping uniform cells
+        summary (list): LayerSummary per layer, cells kept are filled in by compose()
+    """
+
+    def __init__(self, box=(100, 100), periodic=True, min_distance=1.0, within_layers=False):
+        self.box = tuple(box)
+        self.periodic = periodic
+        self.min_distance = min_distance
+        self.within_layers = within_layers
+        self._layers: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.summary: List[LayerSummary] = []
+
+    def _box_m(self) -> np.ndarray:
+        return np.array(self.box[:2], dtype=float) * 1e-6
+
+    def add_points(self, xy, taxa: Union[str, List[str], None] = None, region: Optional[Region] = None,
+                   name: str = 'points') -> "LayoutComposer":
+        """
+        Add cells at given positions (meters), e.g. from another layout.
+
+        :param taxa: One taxon for all, one per cell, or None to leave them unassigned
+        :param region: Only the cells within it are added
+        """
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        if taxa is None or isinstance(taxa, str):
+            labels = np.full(len(xy), taxa or UNASSIGNED, dtype=object)
+        else:
+            labels = np.asarray(taxa, dtype=object)
+            if len(labels) != len(xy):
+                raise ValueError(f'Got {len(labels)} taxa for {len(xy)} cells')
+        if region is not None:
+            inside = region(xy)
+            xy, labels = xy[inside], labels[inside]
+        self._layers.append((xy, labels))
+        self.summary.append(LayerSummary(name=name, added=len(xy)))
+        return self
+
+    def add_image(self, imagefile, mappings, region: Optional[Region] = None) -> "LayoutComposer":
+        """Add the non-white pixels of an image as cells of the mapped taxa, see image_points."""
+        xy, taxa = image_points(imagefile, mappings)
+        return self.add_points(xy, taxa, region, name='image')
+
+    def add_uniform(self, nbugs, region: Optional[Region] = None, taxon: Optional[str] = None) -> "LayoutComposer":
+        """Add nbugs cells uniformly at random within the region, or the whole box."""
+        lo, hi = getattr(region, 'bounds', (np.zeros(2), self._box_m()))
+        lo, hi = np.maximum(lo, 0), np.minimum(hi, self._box_m())
+        batches = []
+        found = 0
+        attempts = 0
+        while found < nbugs:
+            # rejection sampling from the region's bounding box, all at once when it is a rectangle
+            batch = lo + np.random.rand(max(nbugs - found, 16), 2) * (hi - lo)
+            if region is not None:
+                batch = batch[region(batch)]
+            batches.append(batch)
+            found += len(batch)
+            attempts += 1
+            if attempts == 1000 and found == 0:
+                raise ValueError('Region does not overlap the simulation box')
+        xy = np.concatenate(batches)[:nbugs] if batches else np.empty((0, 2))
+        return self.add_points(np.round(xy, decimals=8), taxon, name='uniform')
+
+    def add_poisson(self, radius, region: Optional[Region] = None, taxon: Optional[str] = None) -> "LayoutComposer":
+        """Add a Poisson disc sample with the given minimum spacing (microns) over the region, or the whole box."""
+        box = self._box_m()
+        xy = np.array(PoissonDisc(box[0], box[1], radius * 1e-6).sample(), dtype=float).reshape(-1, 2)
+        return self.add_points(xy, taxon, region, name='poisson')
+
+    def compose(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Positions (meters) and taxa of all cells kept, in layer order.
+        """
+        if not self._layers:
+            return np.empty((0, 2)), np.empty(0, dtype=object)
+        xy = np.concatenate([layer[0] for layer in self._layers])
+        taxa = np.concatenate([layer[1] for layer in self._layers])
+        layer_of = np.repeat(np.arange(len(self._layers)), [len(layer[0]) for layer in self._layers])
+        keep = thin(xy, self.min_distance * 1e-6, self._box_m(), self.periodic,
+                    groups=None if self.within_layers else layer_of)
+        counts = np.bincount(layer_of[keep], minlength=len(self._layers))
+        for summary, kept in zip(self.summary, counts):
+            summary.kept = int(kept)
+        return xy[keep], taxa[keep]
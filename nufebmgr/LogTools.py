@@ -0,0 +1,189 @@
+'''
+
+Reading the text outputs of a NUFEB run: the thermo output in the LAMMPS log and the optional output.csv.
+
+The generated input scripts print ``step cpu atoms`` and, when abundances are tracked, ``v_n_<taxon>`` and
+``v_ra_<taxon>`` every thermo step. Together with the cumulative CPU time this is enough to see how the cost of each
+step grows with the population.
+
+'''
+
+import numpy as np
+import polars as pl
+from typing import Iterable, List, Optional
+
+INT_COLUMNS = {'step', 'atoms'}
+
+
+def _column_name(token: str) -> str:
+    # LAMMPS capitalizes thermo keywords (Step, CPU, Atoms) but prints variables, computes and fixes as given
+    if token[:2] in ('v_', 'c_', 'f_'):
+        return token
+    return token.lower()
+
+
+class ThermoParser:
+    """
+    Streaming parser for thermo blocks in a LAMMPS/NUFEB log.
+
+    Lines can be fed one at a time, so a log can be parsed as it is read (or as it grows). Each thermo block starts with
+    a header line beginning with 'Step' and ends with a 'Loop time' line; anything else in between (warnings, NUFEB
+    messages) is skipped. Blocks from several runs, e.g. a run continued from a restart, are numbered in a 'run' column.
+
+    Attributes:
+        columns (list): Column names of the current (or most recent) thermo block
+        run (int): Index of the current run block, -1 before the first header
+    """
+
+    def __init__(self):
+        self.columns: List[str] = []
+        self.run = -1
+        self.in_block = False
+        self._rows = []
+        self._schema: Optional[List[str]] = None
+
+    def feed(self, line: str):
+        tokens = line.split()
+        if not tokens:
+            return
+        if tokens[0] == 'Step':
+            self.columns = [_column_name(token) for token in tokens]
+            self.run += 1
+            self.in_block = True
+            if self._schema is None:
+                self._schema = list(self.columns)
+            return
+        if not self.in_block:
+            return
+        if tokens[0] == 'Loop':
+            self.in_block = False
+            return
+        if len(tokens) != len(self.columns):
+            return
+        try:
+            values = [float(token) for token in tokens]
+        except ValueError:
+            return
+        if self.columns == self._schema:
+            self._rows.append([self.run] + values)
+        else:
+            self._rows.append([self.run] + [values[self.columns.index(c)] if c in self.columns else None
+                                            for c in self._schema])
+
+    def feed_lines(self, lines: Iterable[str]):
+        for line in lines:
+            self.feed(line)
+        return self
+
+    def take_rows(self) -> pl.DataFrame:
+        """Rows parsed since the last call, leaving the parser ready for more."""
+        frame = self._frame(self._rows)
+        self._rows = []
+        return frame
+
+    def frame(self) -> pl.DataFrame:
+        return self._frame(self._rows)
+
+    def _frame(self, rows) -> pl.DataFrame:
+        schema = ['run'] + (self._schema or ['step', 'cpu', 'atoms'])
+        if not rows:
+            return pl.DataFrame(schema={c: (pl.Int64 if c in INT_COLUMNS or c == 'run' else pl.Float64)
+                                        for c in schema})
+        array = np.array(rows, dtype=float)
+        return pl.DataFrame({c: (array[:, i].astype(np.int64) if c in INT_COLUMNS or c == 'run' else array[:, i])
+                             for i, c in enumerate(schema)})
+
+
+def read_thermo(log_path: str) -> pl.DataFrame:
+    """
+    Thermo output of a NUFEB log file (e.g. log.lammps) as a table, one row per thermo step.
+
+    :param log_path (str): Path to the log
+    :return: polars DataFrame with a 'run' column and one column per thermo keyword (step, cpu, atoms, v_n_...)
+    """
+    parser = ThermoParser()
+    with open(log_path) as log:
+        parser.feed_lines(log)
+    return parser.frame()
+
+
+def read_output_csv(csv_path: str) -> pl.DataFrame:
+    """
+    The output.csv written by the fix print of enable_csv() as a table.
+
+    Continued runs append to the same file, repeating the title line, so repeated header rows are dropped.
+    """
+    raw = pl.read_csv(csv_path, infer_schema_length=0, comment_prefix='#')
+    if raw.is_empty():
+        return raw
+    first = raw.columns[0]
+    raw = raw.filter(pl.col(first) != first)
+    return raw.with_columns([pl.col(first).cast(pl.Int64)] +
+                            [pl.col(c).cast(pl.Float64) for c in raw.columns[1:]])
+
+
+def abundances(table: pl.DataFrame) -> pl.DataFrame:
+    """
+    Absolute and relative abundance per taxon and step in long form, from thermo or output.csv tables.
+
+    :return: polars DataFrame with columns step, taxon, abundance, relative_abundance
+    """
+    step = 'step'
+    taxa = {}
+    for column in table.columns:
+        if column.startswith('v_n_') and column != 'v_n_all':
+            taxa.setdefault(column[4:], {})['abs'] = column
+        elif column.startswith('v_ra_'):
+            taxa.setdefault(column[5:], {})['rel'] = column
+        elif column.endswith('_relative_abundance'):
+            taxa.setdefault(column[:-len('_relative_abundance')], {})['rel'] = column
+        elif column.endswith('_abundance'):
+            taxa.setdefault(column[:-len('_abundance')], {})['abs'] = column
+
+    frames = []
+    for taxon, cols in taxa.items():
+        frames.append(table.select(
+            pl.col(step),
+            pl.lit(taxon).alias('taxon'),
+            (pl.col(cols['abs']) if 'abs' in cols else pl.lit(None)).cast(pl.Float64).alias('abundance'),
+            (pl.col(cols['rel']) if 'rel' in cols else pl.lit(None)).cast(pl.Float64).alias('relative_abundance')))
+    if not frames:
+        return pl.DataFrame(schema={'step': pl.Int64, 'taxon': pl.String, 'abundance': pl.Float64,
+                                    'relative_abundance': pl.Float64})
+    return pl.concat(frames)
+
+
+def performance(thermo: pl.DataFrame, window: int = 10) -> pl.DataFrame:
+    """
+    Per-step cost metrics derived from the thermo cpu and atoms columns.
+
+    Adds:
+        step_cpu: CPU seconds per step since the previous thermo output (cpu restarts from zero each run)
+        sec_per_atom_step: step_cpu divided by the number of atoms
+        scaling_exponent: slope of log(step_cpu) against log(atoms) over a rolling window of thermo rows. Values
+            near 1 mean cost grows linearly with the population, clearly above 1 marks superlinear growth
+    """
+    frame = thermo.sort(['run', 'step']).with_columns(
+        (pl.col('cpu').diff().over('run') / pl.col('step').diff().over('run')).alias('step_cpu'))
+    frame = frame.with_columns((pl.col('step_cpu') / pl.col('atoms')).alias('sec_per_atom_step'))
+
+    valid = (pl.col('step_cpu') > 0) & (pl.col('atoms') > 0)
+    log_cost = pl.when(valid).then(pl.col('step_cpu').log()).otherwise(None)
+    log_atoms = pl.when(valid).then(pl.col('atoms').cast(pl.Float64).log()).otherwise(None)
+    frame = frame.with_columns(log_cost.alias('_lc'), log_atoms.alias('_la'))
+    mean_c = pl.col('_lc').rolling_mean(window, min_samples=2)
+    mean_a = pl.col('_la').rolling_mean(window, min_samples=2)
+    cov = (pl.col('_lc') * pl.col('_la')).rolling_mean(window, min_samples=2) - mean_c * mean_a
+    var = (pl.col('_la') * pl.col('_la')).rolling_mean(window, min_samples=2) - mean_a * mean_a
+    frame = frame.with_columns(
+        pl.when(var > 1e-12).then(cov / var).otherwise(None).alias('scaling_exponent'))
+    return frame.drop(['_lc', '_la'])
+
+
+def scaling_exponent(thermo: pl.DataFrame) -> Optional[float]:
+    """Least squares slope of log(CPU per step) against log(atoms) over a whole log, None if it can't be fit."""
+    frame = performance(thermo).filter((pl.col('step_cpu') > 0) & (pl.col('atoms') > 0))
+    if frame.height < 2 or frame['atoms'].n_unique() < 2:
+        return None
+    slope, _ = np.polyfit(np.log(frame['atoms'].to_numpy().astype(float)), np.log(frame['step_cpu'].to_numpy()), 1)
+    return float(slope)
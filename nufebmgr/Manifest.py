@@ -0,0 +1,102 @@
+'''
+
+The manifest.json written next to atom.in and the input script of a generated case.
+
+It records what analysis otherwise has to rebuild by hand: which atom type each taxon or lysis group got, the taxa
+properties, seed, box, substrate grid, which outputs were written where and when the run stops, plus a hash of the case
+files. DumpFile picks it up automatically when it sits in the case directory (or the dump's own directory).
+
+'''
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+MANIFEST_FILE = 'manifest.json'
+ATOM_IN = 'atom.in'
+INPUT_SCRIPT = 'inputscript.nufeb'
+MANIFEST_VERSION = 1
+
+
+def content_hash(*texts: str) -> str:
+    """sha256 of the given texts in order, e.g. of atom.in and the input script."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+@dataclass
+class CaseManifest:
+    """
+    Attributes:
+        types (dict): Atom type of every taxon and lysis group, by name
+        taxa (list): Names of the active taxa, the remaining types are lysis groups
+        properties (dict): Per taxon template values needed in analysis, e.g. diameter and density
+        seed (int): Project seed, also used for division and T6SS fixes
+        box (dict): Box lengths in microns and periodicity
+        grid (dict): Substrate grid spacing (microns) and dimensions
+        outputs (dict): Paths of the outputs written, None for those that are not
+        stop (dict): Stop condition and its parameters
+        hash (str): content_hash() of atom.in and the input script
+        config_hash (str): NufebProject.config_hash() of the project the case was generated from, the CaseCache key
+    """
+    types: Dict[str, int]
+    taxa: List[str]
+    properties: Dict[str, dict] = field(default_factory=dict)
+    seed: Optional[int] = None
+    box: dict = field(default_factory=dict)
+    grid: dict = field(default_factory=dict)
+    outputs: dict = field(default_factory=dict)
+    stop: dict = field(default_factory=dict)
+    hash: Optional[str] = None
+    config_hash: Optional[str] = None
+    version: int = MANIFEST_VERSION
+
+    def type_names(self) -> Dict[int, str]:
+        return {number: name for name, number in self.types.items()}
+
+    def type_table(self) -> "pl.DataFrame":
+        """type and taxon columns, for joining onto any frame with a type column."""
+        import polars as pl
+        return pl.DataFrame({'type': list(self.types.values()), 'taxon': list(self.types.keys())},
+                            schema={'type': pl.Int64, 'taxon': pl.String})
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), indent=2)
+
+    def write(self, path: str) -> str:
+        if os.path.isdir(path):
+            path = os.path.join(path, MANIFEST_FILE)
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+        return path
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "CaseManifest":
+        known = {name: value for name, value in values.items() if name in cls.__dataclass_fields__}
+        return cls(**known)
+
+    @classmethod
+    def load(cls, path: str) -> "CaseManifest":
+        if os.path.isdir(path):
+            path = os.path.join(path, MANIFEST_FILE)
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def find(cls, output_path: str) -> Optional["CaseManifest"]:
+        """
+        The manifest of the case an output belongs to, looked for in the output's directory and the one above it
+        (so both case/hdf5/dump.h5 and case/vtk find case/manifest.json). None if there is none.
+        """
+        directory = output_path if os.path.isdir(output_path) else os.path.dirname(output_path)
+        directory = os.path.abspath(directory)
+        for candidate in (directory, os.path.dirname(directory)):
+            path = os.path.join(candidate, MANIFEST_FILE)
+            if os.path.isfile(path):
+                return cls.load(path)
+        return None
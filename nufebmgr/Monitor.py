@@ -0,0 +1,252 @@
+'''
+
+Following NUFEB runs while they are still going.
+
+DumpFile reads a whole dump when it is opened, which is fine once a run has finished but far too slow to repeat every
+minute over a sweep of multi-day runs. A RunMonitor remembers what it has already seen: the timesteps read from the
+HDF5 dump and how far it has read output.csv and the log. Each refresh only reads what was added since the previous
+one, and files whose size and modification time have not changed are not opened at all.
+
+'''
+
+import math
+import os
+import h5py
+import numpy as np
+import polars as pl
+from typing import Dict, List, Optional
+from .LogTools import ThermoParser
+from .RunManager import DONE_TOKEN
+
+DUMP_FILE = 'hdf5/dump.h5'
+CSV_FILE = 'output.csv'
+LOG_FILE = 'log.lammps'
+
+POPULATION_SCHEMA = {'timestep': pl.Int64, 'type': pl.Int64, 'count': pl.Int64, 'volume': pl.Float64}
+
+
+def _open_for_polling(path: str) -> h5py.File:
+    """
+    Open an HDF5 file that another process may be writing.
+
+    SWMR read mode is used when the writer created the file for it, otherwise the file is opened read-only without
+    file locking so the reader never blocks (or is blocked by) the simulation.
+    """
+    try:
+        return h5py.File(path, 'r', swmr=True)
+    except (OSError, ValueError):
+        return h5py.File(path, 'r', locking=False)
+
+
+class _Tail:
+    """Complete lines appended to a text file since the last read."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.stamp = None
+
+    def read_lines(self) -> Optional[List[str]]:
+        """New complete lines, or None when the file was truncated (e.g. by a relaunched run) and is read from the start."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        if stamp == self.stamp:
+            return []
+        self.stamp = stamp
+        if stat.st_size < self.offset:
+            self.offset = 0
+            self.stamp = None
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        end = chunk.rfind(b'\n') + 1
+        # a partially written last line is left for the next read
+        self.offset += end
+        return chunk[:end].decode(errors='replace').splitlines()
+
+
+class RunMonitor:
+    """
+    Incrementally updated summaries of a single, possibly still running, case directory.
+
+    Attributes:
+        case_dir (str): The case directory, as written by NufebProject
+        population (pl.DataFrame): Cell count and total cell volume (m^3) per timestep and type, from the HDF5 dump
+        csv (pl.DataFrame): Rows of output.csv read so far
+        thermo (pl.DataFrame): Thermo rows of the log read so far
+    """
+
+    def __init__(self, case_dir: str, dump_file: str = DUMP_FILE, csv_file: str = CSV_FILE, log_file: str = LOG_FILE):
+        self.case_dir = case_dir
+        self.dump_path = os.path.join(case_dir, dump_file)
+        self._dump_stamp = None
+        self._seen_timesteps = set()
+        self._csv_tail = _Tail(os.path.join(case_dir, csv_file))
+        self._csv_header: Optional[List[str]] = None
+        self._log_tail = _Tail(os.path.join(case_dir, log_file))
+        self._thermo_parser = ThermoParser()
+        self.population = pl.DataFrame(schema=POPULATION_SCHEMA)
+        self.csv = pl.DataFrame()
+        self.thermo = self._thermo_parser.frame()
+
+    def refresh(self) -> bool:
+        """Read whatever was added since the last refresh. Returns True if anything new was found."""
+        new_dump = self._refresh_dump()
+        new_csv = self._refresh_csv()
+        new_log = self._refresh_log()
+        return new_dump or new_csv or new_log
+
+    def _refresh_dump(self) -> bool:
+        try:
+            stat = os.stat(self.dump_path)
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        if stamp == self._dump_stamp:
+            return False
+        if self._dump_stamp is not None and stat.st_size < self._dump_stamp[0]:
+            # a smaller file means the run was relaunched and rewrote its dump
+            self._seen_timesteps = set()
+            self.population = pl.DataFrame(schema=POPULATION_SCHEMA)
+
+        rows = []
+        complete = True
+        try:
+            with _open_for_polling(self.dump_path) as dump:
+                if 'id' not in dump:
+                    return False
+                new = sorted(int(t) for t in dump['id'] if int(t) not in self._seen_timesteps)
+                for timestep in new:
+                    try:
+                        types = dump[f'type/{timestep}'][()]
+                        radii = dump[f'radius/{timestep}'][()]
+                    except (KeyError, OSError):
+                        # the writer has not finished this timestep yet, pick it up on the next refresh
+                        complete = False
+                        break
+                    rows.append(self._summarize_timestep(timestep, types, radii))
+                    self._seen_timesteps.add(timestep)
+        except OSError:
+            return False
+        if complete:
+            self._dump_stamp = stamp
+        if not rows:
+            return False
+        self.population = pl.concat([self.population] + rows)
+        return True
+
+    @staticmethod
+    def _summarize_timestep(timestep: int, types: np.ndarray, radii: np.ndarray) -> pl.DataFrame:
+        uniques, inverse, counts = np.unique(types, return_inverse=True, return_counts=True)
+        volumes = np.bincount(inverse.ravel(), weights=4 / 3 * math.pi * radii.astype(float) ** 3,
+                              minlength=len(uniques))
+        return pl.DataFrame({'timestep': np.full(len(uniques), timestep, dtype=np.int64),
+                             'type': uniques.astype(np.int64),
+                             'count': counts.astype(np.int64),
+                             'volume': volumes}, schema=POPULATION_SCHEMA)
+
+    def _refresh_csv(self) -> bool:
+        lines = self._csv_tail.read_lines()
+        if lines is None:
+            self._csv_header = None
+            self.csv = pl.DataFrame()
+            lines = self._csv_tail.read_lines() or []
+        rows = []
+        for line in lines:
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split(',')
+            if self._csv_header is None:
+                self._csv_header = fields
+                continue
+            if fields == self._csv_header or len(fields) != len(self._csv_header):
+                continue
+            try:
+                rows.append([float(field) for field in fields])
+            except ValueError:
+                continue
+        if not rows:
+            return False
+        array = np.array(rows)
+        chunk = pl.DataFrame({name: (array[:, i].astype(np.int64) if i == 0 else array[:, i])
+                              for i, name in enumerate(self._csv_header)})
+        self.csv = chunk if self.csv.is_empty() else pl.concat([self.csv, chunk])
+        return True
+
+    def _refresh_log(self) -> bool:
+        lines = self._log_tail.read_lines()
+        if lines is None:
+            self._thermo_parser = ThermoParser()
+            self.thermo = self._thermo_parser.frame()
+            lines = self._log_tail.read_lines() or []
+        self._thermo_parser.feed_lines(lines)
+        chunk = self._thermo_parser.take_rows()
+        if chunk.is_empty():
+            return False
+        self.thermo = chunk if self.thermo.is_empty() else pl.concat([self.thermo, chunk], how='diagonal')
+        return True
+
+    def is_done(self) -> bool:
+        return os.path.exists(os.path.join(self.case_dir, DONE_TOKEN))
+
+    def latest(self) -> dict:
+        """The most recent state of the run as a flat record."""
+        record = {'case_dir': self.case_dir, 'done': self.is_done(), 'timestep': None, 'cells': None,
+                  'volume': None, 'step': None, 'cpu': None, 'atoms': None}
+        if not self.population.is_empty():
+            last = self.population['timestep'].max()
+            current = self.population.filter(pl.col('timestep') == last)
+            record.update(timestep=last, cells=current['count'].sum(), volume=current['volume'].sum())
+        if not self.thermo.is_empty():
+            row = self.thermo.row(-1, named=True)
+            record.update(step=row['step'], cpu=row.get('cpu'), atoms=row.get('atoms'))
+        return record
+
+
+class MonitorPool:
+    """
+    RunMonitors over many case directories, refreshed together.
+
+    Attributes:
+        monitors (dict): RunMonitor by case directory
+    """
+
+    def __init__(self, case_dirs: Optional[List[str]] = None, **monitor_kwargs):
+        self.monitor_kwargs = monitor_kwargs
+        self.monitors: Dict[str, RunMonitor] = {}
+        self._finished = set()
+        for case_dir in case_dirs or []:
+            self.add(case_dir)
+
+    def add(self, case_dir: str) -> RunMonitor:
+        if case_dir not in self.monitors:
+            self.monitors[case_dir] = RunMonitor(case_dir, **self.monitor_kwargs)
+        return self.monitors[case_dir]
+
+    def refresh(self, skip_done: bool = True) -> List[str]:
+        """
+        Refresh every monitor, returning the case directories that had new data.
+
+        :param skip_done: Don't poll runs that had already finished at their previous refresh
+        """
+        updated = []
+        for case_dir, monitor in self.monitors.items():
+            if skip_done and case_dir in self._finished:
+                continue
+            # the refresh after the done token appears picks up the last outputs, later ones can be skipped
+            if monitor.is_done():
+                self._finished.add(case_dir)
+            if monitor.refresh():
+                updated.append(case_dir)
+        return updated
+
+    def summary(self) -> pl.DataFrame:
+        """One row per run with its latest state."""
+        return pl.DataFrame([monitor.latest() for monitor in self.monitors.values()],
+                            schema={'case_dir': pl.String, 'done': pl.Boolean, 'timestep': pl.Int64,
+                                    'cells': pl.Int64, 'volume': pl.Float64, 'step': pl.Int64, 'cpu': pl.Float64,
+                                    'atoms': pl.Int64})
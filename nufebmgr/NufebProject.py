@@ -4,14 +4,56 @@ from jinja2 import Template
 import cv2
 import csv
 import json
+import hashlib
+import os
+import glob
 from typing import Literal, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict, is_dataclass
 from .SimulationBox import SimulationBox
 from .InputScriptBuilder import InputScriptBuilder
 from datetime import datetime
 from .poisson import PoissonDisc
+from . import pointprocess
+from .spatialhash import relax, RelaxationReport
+from .Profiling import StageProfiler, NULL_PROFILER
+from .Manifest import CaseManifest, content_hash, MANIFEST_FILE, ATOM_IN
+from .RunManager import INPUT_SCRIPT
+from .CaseCache import CaseCache
+from .LayoutCache import LayoutCache, layout_key
+from .LayoutComposer import LayoutComposer, UNASSIGNED
 from .TaxaAssigmentManager import TaxaAssignmentManager
 from .BugPos import BugPos
+from .SubstrateGrid import GridChoice
+from .CaseEstimate import (CaseEstimate, PopulationProjection, mean_cell_volume, MAX_PACKING_FRACTION,
+                           HDF5_BYTES_PER_CELL, HDF5_BYTES_PER_DUMP, VTU_BYTES_PER_CELL, VTU_BYTES_PER_DUMP,
+                           VTI_BYTES_PER_VALUE, VTI_INTERVAL, TEXT_BYTES_PER_COLUMN)
+
+# stop conditions other than runtime are implemented as halts within a (very long) year of simulated steps
+MAX_RUNTIME = 365*24*60*60
+
+# state that is derived from generating a case, or doesn't affect what is generated, and so is left out of config_hash
+UNHASHED_ATTRIBUTES = {'profiler', 'manifest', 'relaxation_report', 'group_assignments', 'grid_choice', '_bug_locs',
+                       '_population', 'layout_cache'}
+
+# files written by NufebProject.save
+PROJECT_FILE = 'project.json'
+POSITIONS_FILE = 'positions.npy'
+TAXA_FILE = 'taxa.npy'
+SAVE_FORMAT_VERSION = 1
+
+
+def _canonical(value):
+    if is_dataclass(value):
+        return asdict(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if hasattr(value, '__dict__'):
+        return vars(value)
+    return repr(value)
 
 @dataclass
 class Substrate:
@@ -182,6 +224,7 @@ class NufebProject:
         self.t6ss_attackers ={}
         self.t6ss_vulns = {}
         self.taxa_pre_assigned = False
+        self.n_pre_assigned = 0
         self.biostep = 900
         self.runtime = int(24*60*60/self.biostep) # default 24 hours assuming 900 s biological timestep
         self.spatial_distribution_params = {}
@@ -194,6 +237,20 @@ class NufebProject:
         self.write_hdf5 = True
         self.write_vtk = True
         self.forced_substrate_grid_size=None
+        self.mpi_ranks = None
+        self.mpi_zranks = 1
+        self.load_balancing = None
+        self.neighbor_settings = {}
+        self.restart_every = None
+        self.restart_keep_all = False
+        self.stop_relative_abundance = {}
+        self.max_cells = None
+        self.growth_plateau = None
+        self.relaxation = None
+        self.relaxation_report = None
+        self.profiler = NULL_PROFILER
+        self.manifest = None
+        self.layout_cache = None
 
 
     # __enter__ and __exit__ for handling using project as context
@@ -208,6 +265,67 @@ class NufebProject:
 
     def force_substrate_grid_size(self,size):
         self.forced_substrate_grid_size=size
+    def use_processors(self, nranks, zranks=1):
+        """
+        Fix the processor grid for a run on nranks MPI ranks, split to match the box aspect ratio.
+
+        Biofilms start on the substratum, so by default the domain is only decomposed in x and y.
+        """
+        self.mpi_ranks = nranks
+        self.mpi_zranks = zranks
+
+    def enable_load_balancing(self, threshold=1.1, every=None, dynamic_threshold=None,
+                              style: Literal["shift", "rcb"] = "shift"):
+        """
+        Balance atoms across ranks once after reading atoms and, if every is given, periodically as the biofilm grows.
+
+        Balancing happens whenever the max/average atoms per rank exceeds the threshold.
+        """
+        allowed_styles = {"shift", "rcb"}
+        if style not in allowed_styles:
+            raise ValueError(f"Invalid load balancing style: {style}. Must be one of {allowed_styles}.")
+        self.load_balancing = {'threshold': threshold, 'every': every, 'dynamic_threshold': dynamic_threshold,
+                               'style': style}
+
+    def tune_neighbor_list(self, skin=None, every=None, delay=None, check=None, sort_every=None, sort_binsize=None):
+        """
+        Override the neighbor list and atom sorting settings otherwise derived from the taxa diameters.
+
+        Distances are in meters, intervals in steps. Settings left as None keep their derived/default values. The
+        derived skin assumes lists are rebuilt every `every` steps (check 'no'), check 'yes' needs an explicit skin.
+        """
+        overrides = {'skin': skin, 'every': every, 'delay': delay, 'check': check,
+                     'sort_every': sort_every, 'sort_binsize': sort_binsize}
+        self.neighbor_settings.update({k: v for k, v in overrides.items() if v is not None})
+
+    def enable_restart(self, every, keep_all=False):
+        """
+        Write restart files every given number of steps so an interrupted run can be continued.
+
+        By default two files (restart/restart.a and restart/restart.b) are alternated, keeping only recent checkpoints.
+        With keep_all, every checkpoint is kept as restart/restart.<step>.
+        """
+        self.restart_every = every
+        self.restart_keep_all = keep_all
+
+    @staticmethod
+    def latest_restart(case_dir):
+        """The most recently written restart file of a case, or None if there are none."""
+        restarts = glob.glob(os.path.join(case_dir, 'restart', 'restart.*'))
+        if not restarts:
+            return None
+        return os.path.relpath(max(restarts, key=os.path.getmtime), case_dir)
+
+    def generate_continuation(self, restart_file, tag='continued'):
+        """
+        Generate an input script continuing this case from a restart file, to be run in the original case directory.
+
+        Fixes, lysis/T6SS definitions and outputs are redefined as for generate_case, atoms and groups come from the
+        restart file and the run stops at the originally planned final step. The HDF5 dump is written to a new
+        hdf5/dump_<tag>.h5 so that earlier output is not overwritten, CSV output is appended.
+        """
+        return self._generate_inputscript(restart_file=restart_file, continuation_tag=tag)
+
     def disable_hdf5_output(self):
         self.write_hdf5 = False
 
@@ -256,10 +374,45 @@ class NufebProject:
         self.stop_condition ="percent biomass"
         self.biomass_percent = percent
 
+    def stop_at_relative_abundance(self, taxon: str, threshold: float, above: bool = True):
+        """
+        End the run early once a taxon's relative abundance rises above (or, with above=False, falls below) threshold.
+
+        Useful to stop at competitive exclusion. Turns on abundance tracking. Can be combined with other stop conditions.
+        """
+        if taxon not in self.active_taxa:
+            raise ValueError(f'Unknown taxon: {taxon}')
+        if not 0 <= threshold <= 1:
+            raise ValueError(f'Relative abundance threshold must be between 0 and 1, got {threshold}')
+        self.track_abs = True
+        self.stop_relative_abundance[taxon] = (threshold, above)
+
+    def stop_at_cell_count(self, max_cells: int):
+        """End the run early once the total number of cells exceeds max_cells. Turns on abundance tracking."""
+        if max_cells < 1:
+            raise ValueError(f'Cell count cap must be positive, got {max_cells}')
+        self.track_abs = True
+        self.max_cells = int(max_cells)
+
+    def stop_on_growth_plateau(self, epsilon: float = 0.01, window: int = 20):
+        """
+        End the run early once total biomass grows by less than a fraction epsilon over window steps.
+
+        Shrinking biomass also counts as a plateau.
+        """
+        if window < 1:
+            raise ValueError(f'Plateau window must be at least one step, got {window}')
+        self.growth_plateau = (epsilon, int(window))
+
     def set_boundary_scenario(self,scenario):
         self.boundary_scenario = scenario
 
     def _infer_substrates(self):
+        for sub_name in self._inferred_substrate_names():
+            if sub_name not in self.substrates:
+                self.set_substrate(sub_name,1e-4,1e-4)
+
+    def _inferred_substrate_names(self):
         subs_names = []
         # get a list of all substrates associated with growth strategies of taxa
         for taxon_name in self.active_taxa:
@@ -271,10 +424,7 @@ class NufebProject:
                 subs_names.append(self.active_taxa[taxon_name]['growth_strategy']['no2-ID'])
                 subs_names.append(self.active_taxa[taxon_name]['growth_strategy']['no3-ID'])
 
-        subs_names = set(subs_names)
-        for sub_name in subs_names:
-            if sub_name not in self.substrates:
-                self.set_substrate(sub_name,1e-4,1e-4)
+        return set(subs_names)
 
 
     def use_seed(self,seed=1701):
@@ -305,17 +455,132 @@ class NufebProject:
         self.spatial_distribution_params["strip_proportion"] = "proportional"
         self.spatial_distribution_params["noise"] = noise
 
+    def use_layout_cache(self, cache=None):
+        """
+        Reuse the positions of earlier random layouts with the same box, method, parameters and random state.
+
+        :param cache: A LayoutCache, typically shared by the projects of a sweep, or a directory for a disk-backed one.
+            None creates a new in-memory cache
+        :return: The cache in use
+        """
+        if not isinstance(cache, LayoutCache):
+            cache = LayoutCache(directory=cache)
+        self.layout_cache = cache
+        return cache
+
+    def _layout(self, method, params, sample):
+        if self.layout_cache is None:
+            xy = sample()
+        else:
+            box = (self.sim_box.xlen, self.sim_box.ylen, self.sim_box.zlen)
+            key = layout_key(box, method, params, np.random.get_state())
+            cached = self.layout_cache.get(key)
+            if cached is None:
+                xy = sample()
+                self.layout_cache.put(key, xy, np.random.get_state())
+            else:
+                xy, state = cached
+                # as if sampled, so later draws don't depend on whether the cache was hit
+                np.random.set_state(state)
+        self.bug_locs = [BugPos(x, y, taxon_name="Unassigned") for x, y in np.asarray(xy).reshape(-1, 2).tolist()]
+        self.n_pre_assigned = 0
+
     def layout_poisson(self, radius):
-        poisson_disc = PoissonDisc(self.sim_box.xlen*1e-6, self.sim_box.ylen*1e-6, radius*1e-6)
-        s = poisson_disc.sample()
-        self.bug_locs = [BugPos(x,y,taxon_name="Unassigned") for x,y in s]
+        with self.profiler.stage('layout_poisson') as stage:
+            def sample():
+                poisson_disc = PoissonDisc(self.sim_box.xlen*1e-6, self.sim_box.ylen*1e-6, radius*1e-6)
+                return poisson_disc.sample()
+            self._layout('poisson', {'radius': radius}, sample)
+            stage.items = len(self.bug_locs)
 
     def layout_uniform(self, nbugs):
-        base = np.random.rand(nbugs, 2)
-        bugs_xy = base * np.array([self.sim_box.xlen, self.sim_box.ylen]).tolist() * 1e-6
-        bugs_xy = np.round(bugs_xy, decimals=8)
-        self.bug_locs = [BugPos(*row, taxon_name="Unassigned") for row in bugs_xy]
-
+        with self.profiler.stage('layout_uniform', nbugs):
+            def sample():
+                base = np.random.rand(nbugs, 2)
+                bugs_xy = base * np.array([self.sim_box.xlen, self.sim_box.ylen]).tolist() * 1e-6
+                return np.round(bugs_xy, decimals=8)
+            self._layout('uniform', {'nbugs': nbugs}, sample)
+
+
+    def _box_xy_m(self):
+        return np.array([self.sim_box.xlen, self.sim_box.ylen]) * 1e-6
+
+    def layout_thomas(self, n_clusters, cells_per_cluster, sigma):
+        """
+        Clumpy layout from a Thomas cluster process: cluster centres uniformly at random, cells normally distributed
+        around them.
+
+        :param n_clusters: Expected number of clusters
+        :param cells_per_cluster: Expected cells per cluster (Poisson distributed)
+        :param sigma: Spread of each cluster along x and y (microns)
+        """
+        with self.profiler.stage('layout_thomas') as stage:
+            periodic = self.sim_box.periodic == "plane"
+            params = {'n_clusters': n_clusters, 'cells_per_cluster': cells_per_cluster, 'sigma': sigma}
+            self._layout('thomas', params, lambda: np.round(pointprocess.thomas(
+                self._box_xy_m(), n_clusters, cells_per_cluster, sigma * 1e-6, periodic), decimals=8))
+            stage.items = len(self.bug_locs)
+
+    def layout_matern(self, n_clusters, cells_per_cluster, radius):
+        """
+        Clumpy layout from a Matérn cluster process: cluster centres uniformly at random, cells uniformly within a
+        radius (microns) of them.
+        """
+        with self.profiler.stage('layout_matern') as stage:
+            periodic = self.sim_box.periodic == "plane"
+            params = {'n_clusters': n_clusters, 'cells_per_cluster': cells_per_cluster, 'radius': radius}
+            self._layout('matern', params, lambda: np.round(pointprocess.matern(
+                self._box_xy_m(), n_clusters, cells_per_cluster, radius * 1e-6, periodic), decimals=8))
+            stage.items = len(self.bug_locs)
+
+    def layout_density(self, density, nbugs):
+        """
+        Random layout following a density map, about nbugs cells in total.
+
+        :param density: 2D array of relative densities stretched over the box (row 0 at the top, as in images), or the
+            path of a greyscale image in which darker means denser
+        """
+        with self.profiler.stage('layout_density') as stage:
+            if isinstance(density, str):
+                grey = cv2.imread(density, cv2.IMREAD_GRAYSCALE)
+                if grey is None:
+                    raise ValueError(f'Could not read density image {density}')
+                density = 255 - grey.astype(float)
+            density = np.asarray(density, dtype=float)
+            params = {'density': hashlib.sha256(density.tobytes()).hexdigest(), 'shape': density.shape,
+                      'nbugs': nbugs}
+            self._layout('density', params, lambda: np.round(pointprocess.inhomogeneous(
+                self._box_xy_m(), density, nbugs), decimals=8))
+            stage.items = len(self.bug_locs)
+
+    def layout_composer(self, min_distance=None, within_layers=False) -> LayoutComposer:
+        """
+        A LayoutComposer for this project's box, to stack image, uniform, Poisson and explicit layouts, then apply it
+        with compose_layout().
+
+        :param min_distance: Cells of different layers closer than this (microns) are in conflict, the later one is
+            dropped. Defaults to the largest diameter among the taxa added so far
+        """
+        if min_distance is None:
+            min_distance = self._reference_cell_diameter() * 1e6
+        return LayoutComposer(box=(self.sim_box.xlen, self.sim_box.ylen), periodic=self.sim_box.periodic == "plane",
+                              min_distance=min_distance, within_layers=within_layers)
+
+    def compose_layout(self, composer: LayoutComposer):
+        """
+        Replace the cells with the composed layers. Cells without a taxon are assigned by the spatial distribution
+        when the case is generated, those with one keep it.
+        """
+        with self.profiler.stage('compose_layout') as stage:
+            xy, taxa = composer.compose()
+            # cells with a taxon go first, _assign_taxa leaves the first n_pre_assigned alone
+            fixed = taxa != UNASSIGNED
+            order = np.concatenate([np.nonzero(fixed)[0], np.nonzero(~fixed)[0]])
+            self.bug_locs = [BugPos(x, y, taxon_name=taxon)
+                             for (x, y), taxon in zip(xy[order].tolist(), taxa[order].tolist())]
+            self.n_pre_assigned = int(fixed.sum())
+            self.taxa_pre_assigned = False
+            stage.items = len(self.bug_locs)
 
     def add_taxon_by_template(self, name, template):
         self.active_taxa[name] = NufebProject.taxa_templates[template]
@@ -333,7 +598,33 @@ class NufebProject:
     def set_composition(self, composition):
         self.composition = composition
 
+    @property
+    def bug_locs(self):
+        # a loaded project keeps its population as arrays until something needs the individual cells
+        if self._bug_locs is None:
+            positions, codes, names = self._population
+            self._bug_locs = [BugPos(x, y, names[code]) for (x, y), code in zip(positions.tolist(), codes.tolist())]
+            self._population = None
+        return self._bug_locs
+
+    @bug_locs.setter
+    def bug_locs(self, bug_locs):
+        self._bug_locs = bug_locs
+        self._population = None
+
+    def _population_arrays(self):
+        """(n, 2) positions, (n,) taxon codes and the taxon names the codes index."""
+        if self._bug_locs is None:
+            return self._population
+        positions = np.array([(bug.x, bug.y) for bug in self._bug_locs], dtype=float).reshape(-1, 2)
+        names = list(dict.fromkeys(bug.taxon_name for bug in self._bug_locs))
+        index = {name: code for code, name in enumerate(names)}
+        codes = np.array([index[bug.taxon_name] for bug in self._bug_locs], dtype=np.int32)
+        return positions, codes, names
+
     def _n_members(self):
+        if self._bug_locs is None:
+            return len(self._population[1])
         return len(self.bug_locs)
 
     def _n_taxa(self):
@@ -345,19 +636,23 @@ class NufebProject:
     def _assign_taxa(self):
         if self.taxa_pre_assigned:
             return
+        fixed = self.bug_locs[:self.n_pre_assigned]
+        to_assign = self.bug_locs[self.n_pre_assigned:]
+        if not to_assign and fixed:
+            return
 
         if self.spatial_distribution == "even":
             # TODO error check that all taxa have entries
             a1 =list(self.active_taxa.keys())
-            s1 =self._n_members()
+            s1 =len(to_assign)
             all_compositions = [float(value) for value in self.composition.values()]
             total = sum(all_compositions)
             p1 = [value / total for value in all_compositions]
             assignments = np.random.choice(a1, size=s1, p= p1, replace=True)
-            for bug, taxon in zip(self.bug_locs, assignments):
+            for bug, taxon in zip(to_assign, assignments):
                 bug.taxon_name = taxon
         elif self.spatial_distribution == "strips":
-            tam = TaxaAssignmentManager(self.bug_locs)
+            tam = TaxaAssignmentManager(to_assign)
             if self.spatial_distribution_params["direction"] == "horizontal":
                 cutdir = "y"
                 cutdim = self.sim_box.ylen*1e-6
@@ -367,10 +662,10 @@ class NufebProject:
             else:
                 raise ValueError(f'Invalid spatial distribution direction parameter for strip layout')
             if self.spatial_distribution_params["strip_proportion"] == "even":
-                self.bug_locs = tam.even_strips(list(self.active_taxa.keys()), cutdir,
-                                                self.spatial_distribution_params['noise'])
+                self.bug_locs = fixed + tam.even_strips(list(self.active_taxa.keys()), cutdir,
+                                                        self.spatial_distribution_params['noise'])
             elif self.spatial_distribution_params["strip_proportion"] == "proportional":
-                self.bug_locs = tam.proportional_strips(list(self.active_taxa.keys()),self.composition, cutdim, cutdir, self.spatial_distribution_params['noise'] )
+                self.bug_locs = fixed + tam.proportional_strips(list(self.active_taxa.keys()),self.composition, cutdim, cutdir, self.spatial_distribution_params['noise'] )
             else:
                 raise ValueError(f'Invalid spatial distribution "strip_proportion" parameter for strip layout')
         else:
@@ -379,15 +674,215 @@ class NufebProject:
     def limit_biofilm_height(self,max_height):
         self.max_biofilm_height = max_height
 
-    def generate_case(self):
+    def relax_layout(self, method: Literal["push", "resample"] = "push", tolerance=0.01, max_iterations=200):
+        """
+        Remove overlaps between initial cells before the atoms are written.
+
+        Random and image layouts place cells without regard to their size, and NUFEB would otherwise spend its first
+        steps resolving the resulting repulsive forces. 'push' nudges overlapping cells apart, 'resample' moves one cell
+        of each overlapping pair to a new random position. Overlaps up to tolerance times the smallest diameter are
+        left alone. The outcome is stored in relaxation_report when the case is generated.
+        """
+        if method not in ("push", "resample"):
+            raise ValueError(f"Invalid relaxation method: {method}. Must be `push` or `resample`.")
+        self.relaxation = {'method': method, 'tolerance': tolerance, 'max_iterations': max_iterations}
+
+    def _relax_layout(self) -> RelaxationReport:
+        xy = np.array([[bug.x, bug.y] for bug in self.bug_locs], dtype=float).reshape(-1, 2)
+        diameters = np.array([float(self.active_taxa[bug.taxon_name]['diameter']) for bug in self.bug_locs])
+        box = np.array([self.sim_box.xlen, self.sim_box.ylen]) * 1e-6
+        relaxed, report = relax(xy, diameters, box, periodic=self.sim_box.periodic == "plane", **self.relaxation)
+        relaxed = np.round(relaxed, decimals=9)
+        for bug, (x, y) in zip(self.bug_locs, relaxed):
+            bug.x = float(x)
+            bug.y = float(y)
+        return report
+
+    def enable_profiling(self, track_memory=False, hooks=None) -> StageProfiler:
+        """
+        Record how long each stage of layout and case generation takes, see Profiling.StageProfiler.
+
+        :return: The profiler, whose report() or to_json() gives the recorded stages
+        """
+        self.profiler = StageProfiler(track_memory=track_memory, hooks=hooks)
+        return self.profiler
+
+    def disable_profiling(self):
+        self.profiler = NULL_PROFILER
+
+    def config_hash(self) -> str:
+        """
+        sha256 of everything that determines the generated case: taxa, layout, composition, substrates, outputs, stop
+        conditions, seed and the current state of the random numbers still to be drawn (taxa assignment and strip noise
+        use them). Projects with equal hashes generate identical cases, which CaseCache relies on.
+        """
+        config = {name: value for name, value in vars(self).items() if name not in UNHASHED_ATTRIBUTES}
+        digest = hashlib.sha256(json.dumps(config, sort_keys=True, default=_canonical).encode())
+        positions, codes, names = self._population_arrays()
+        digest.update(np.ascontiguousarray(positions, dtype=float).tobytes())
+        digest.update('\0'.join(str(names[code]) for code in codes.tolist()).encode())
+        _, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+        digest.update(keys.tobytes())
+        digest.update(repr((position, has_gauss, cached_gaussian)).encode())
+        return digest.hexdigest()
+
+    def generate_case(self, manifest=False):
+        """
+        The text of atom.in and the input script. With manifest=True a CaseManifest describing the case is returned
+        as well, it is also kept as self.manifest either way.
+        """
         # because bits of these depend on each other, we enforce order of calling
-        inputscript = self._generate_inputscript()
-        atom_in = self._generate_atom_in()
+        with self.profiler.stage('generate_case', self._n_members()):
+            # before anything is generated, which changes the random state
+            key = self.config_hash()
+            with self.profiler.stage('inputscript', self._n_taxa()):
+                inputscript = self._generate_inputscript()
+            atom_in = self._generate_atom_in()
+            self.manifest = self._build_manifest(atom_in, inputscript, key)
+        if manifest:
+            return atom_in, inputscript, self.manifest
         return atom_in, inputscript
 
+    def write_case(self, directory, cache=None, reuse_runs=False):
+        """
+        Generate the case and write atom.in, inputscript.nufeb and manifest.json into directory, creating it if needed.
+
+        :param cache: A CaseCache, or the path of one. A case already in the cache is hard-linked into directory
+            without generating it (the project's taxa assignments and random state are then left as they were),
+            otherwise the newly written case is added to the cache
+        :param reuse_runs: Also copy in the outputs of a completed run of the case, if the cache holds one
+        :return: The CaseManifest written
+        """
+        if cache is not None:
+            if not isinstance(cache, CaseCache):
+                cache = CaseCache(cache)
+            key = self.config_hash()
+            if cache.fetch_case(key, directory):
+                if reuse_runs:
+                    cache.fetch_run(key, directory)
+                self.manifest = CaseManifest.load(directory)
+                return self.manifest
+
+        atom_in, inputscript, manifest = self.generate_case(manifest=True)
+        os.makedirs(directory, exist_ok=True)
+        for name in (ATOM_IN, INPUT_SCRIPT, MANIFEST_FILE):
+            # a case fetched from a cache shares these files with it, replace rather than overwrite them
+            if os.path.lexists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+        with open(os.path.join(directory, ATOM_IN), 'w') as f:
+            f.write(atom_in)
+        with open(os.path.join(directory, INPUT_SCRIPT), 'w') as f:
+            f.write(inputscript)
+        manifest.write(os.path.join(directory, MANIFEST_FILE))
+        if cache is not None:
+            cache.store_case(manifest.config_hash, directory)
+        return manifest
+
+    def save(self, path):
+        """
+        Save the project to the directory path: settings and random state as project.json, cell positions and taxa as
+        .npy arrays. load() gives back a project that generates the same case.
+
+        Profiling, caches and the results of a previous generate_case are not saved.
+        """
+        os.makedirs(path, exist_ok=True)
+        positions, codes, names = self._population_arrays()
+        np.save(os.path.join(path, POSITIONS_FILE), np.ascontiguousarray(positions, dtype=float))
+        np.save(os.path.join(path, TAXA_FILE), np.asarray(codes, dtype=np.int32))
+
+        config = {name: value for name, value in vars(self).items() if name not in UNHASHED_ATTRIBUTES}
+        config['sim_box'] = vars(self.sim_box)
+        config['substrates'] = {name: asdict(substrate) for name, substrate in self.substrates.items()}
+        name, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+        document = {'version': SAVE_FORMAT_VERSION,
+                    'config': config,
+                    'taxon_names': names,
+                    'random_state': {'name': name, 'keys': keys.tolist(), 'position': position,
+                                     'has_gauss': has_gauss, 'cached_gaussian': cached_gaussian}}
+        with open(os.path.join(path, PROJECT_FILE), 'w') as f:
+            json.dump(document, f, indent=1)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        A project saved with save(). The global random state is restored as it was when saving.
+
+        :param mmap: Memory-map the population arrays, cells are only materialized when first needed
+        """
+        with open(os.path.join(path, PROJECT_FILE)) as f:
+            document = json.load(f)
+        if document.get('version') != SAVE_FORMAT_VERSION:
+            raise ValueError(f'Unsupported project format version {document.get("version")} in {path}')
+        config = document['config']
+        prj = cls(seed=config['seed'])
+        for name, value in config.items():
+            setattr(prj, name, value)
+        prj.sim_box = SimulationBox(**config['sim_box'])
+        prj.substrates = {name: Substrate(**values) for name, values in config['substrates'].items()}
+        # JSON has no tuples
+        prj.stop_relative_abundance = {taxon: tuple(value) for taxon, value in prj.stop_relative_abundance.items()}
+        if prj.growth_plateau is not None:
+            prj.growth_plateau = tuple(prj.growth_plateau)
+
+        mode = 'r' if mmap else None
+        positions = np.load(os.path.join(path, POSITIONS_FILE), mmap_mode=mode)
+        codes = np.load(os.path.join(path, TAXA_FILE), mmap_mode=mode)
+        prj._bug_locs = None
+        prj._population = (positions, codes, document['taxon_names'])
+
+        state = document['random_state']
+        np.random.set_state((state['name'], np.array(state['keys'], dtype=np.uint32), state['position'],
+                             state['has_gauss'], state['cached_gaussian']))
+        return prj
+
+    def _stop_description(self):
+        stop = {'condition': self.stop_condition}
+        if self.stop_condition == "runtime":
+            stop['runtime'] = self.runtime
+        else:
+            stop['biomass_percent'] = self.biomass_percent
+        if self.stop_relative_abundance:
+            stop['relative_abundance'] = {taxon: {'threshold': threshold, 'above': above}
+                                          for taxon, (threshold, above) in self.stop_relative_abundance.items()}
+        if self.max_cells is not None:
+            stop['max_cells'] = self.max_cells
+        if self.growth_plateau is not None:
+            stop['growth_plateau'] = dict(zip(('epsilon', 'window'), self.growth_plateau))
+        return stop
+
+    def _build_manifest(self, atom_in, inputscript, config_hash=None) -> CaseManifest:
+        properties = {}
+        for name, taxon in self.active_taxa.items():
+            properties[name] = {key: float(taxon[key]) for key in ('diameter', 'outer_diameter', 'density')
+                                if key in taxon}
+        grid = self.grid_choice
+        return CaseManifest(types=dict(self.group_assignments),
+                            taxa=list(self.active_taxa),
+                            properties=properties,
+                            seed=self.seed,
+                            box={'x': self.sim_box.xlen, 'y': self.sim_box.ylen, 'z': self.sim_box.zlen,
+                                 'periodic': self.sim_box.periodic},
+                            grid={'spacing': grid.spacing, 'nx': grid.nx, 'ny': grid.ny, 'nz': grid.nz},
+                            outputs={'hdf5': 'hdf5/dump.h5' if self.write_hdf5 else None,
+                                     'vtk': 'vtk' if self.write_vtk else None,
+                                     'csv': 'output.csv' if self.write_csv else None,
+                                     'thermo': self.thermo_timestep if self.thermo_output else None},
+                            stop=self._stop_description(),
+                            hash=content_hash(atom_in, inputscript),
+                            config_hash=config_hash)
+
     def _generate_atom_in(self):
-         self._assign_taxa()
+         with self.profiler.stage('assign_taxa', self._n_members()):
+             self._assign_taxa()
+         if self.relaxation is not None:
+             # needs the taxa (and so the diameters) of each cell
+             with self.profiler.stage('relax_layout', self._n_members()):
+                 self.relaxation_report = self._relax_layout()
+
+         with self.profiler.stage('atom_in', self._n_members()):
+             return self._render_atom_in()
 
+    def _render_atom_in(self):
          df = pd.DataFrame([dc.__dict__ for dc in self.bug_locs])
          df["taxon_id"] = df["taxon_name"].map(self.group_assignments)
 
@@ -419,7 +914,7 @@ class NufebProject:
 \tAtoms
 
  {% for row in atoms -%}
-  {{'\t'}}{{ row.index +1}} {{ row.taxon_id }} {{ "%.2e" | format(row.diameter) }} {{row.density}}  {{ row.x }}  {{ "%.2e" | format(row.y )}} {{"%2e" | format(row.diameter)}} {{"%.2e" | format(row.outer_diameter)}}
+  {{'\t'}}{{ row.index +1}} {{ row.taxon_id }} {{ "%.2e" | format(row.diameter) }} {{row.density}}  {{ row.x }}  {{ row.y }} {{"%2e" | format(row.diameter)}} {{"%.2e" | format(row.outer_diameter)}}
  {% endfor %}
  """
 
@@ -431,12 +926,148 @@ class NufebProject:
     def set_runtime(self,time):
         self.runtime = time
 
-    def _generate_inputscript(self):
+    def _reference_cell_diameter(self):
+        return max((float(taxon['diameter']) for taxon in self.active_taxa.values()), default=1e-6)
+
+    def substrate_grid(self) -> GridChoice:
+        """
+        The substrate grid the case will use, either forced or the cheapest spacing suited to the taxa diameters.
+
+        The returned GridChoice reports the grid dimensions and the estimated diffusion cost per solver iteration and per
+        biological step.
+        """
+        n_substrates = len(set(self.substrates) | self._inferred_substrate_names())
+        picker = InputScriptBuilder()._grid_picker(self.sim_box, n_substrates, self._reference_cell_diameter())
+        if self.forced_substrate_grid_size is not None:
+            return picker.choice_for(self.forced_substrate_grid_size)
+        return picker.pick()
+
+    def _initial_taxa_counts(self):
+        counts = {taxon: 0 for taxon in self.active_taxa}
+        unassigned = 0
+        for bug in self.bug_locs:
+            if bug.taxon_name in counts:
+                counts[bug.taxon_name] += 1
+            else:
+                unassigned += 1
+
+        if unassigned and counts:
+            # not yet assigned, so split by the composition that _assign_taxa will use
+            composition = getattr(self, 'composition', None)
+            even_strips = self.spatial_distribution_params.get('strip_proportion') == 'even'
+            if composition is None or even_strips:
+                composition = {taxon: 1 for taxon in counts}
+            total = sum(float(value) for value in composition.values())
+            for taxon, value in composition.items():
+                if taxon in counts:
+                    counts[taxon] += unassigned * float(value) / total
+        return counts
+
+    def estimate(self) -> CaseEstimate:
+        """
+        Project the peak population, number of steps and output volume of the case without generating or running it.
+
+        Taxa grow exponentially at mu_max (no substrate limitation) until the box is packed or a stop condition halts
+        the run, so figures are best read as upper bounds. Safe to call at any point, the project is not modified.
+        """
+        counts = self._initial_taxa_counts()
+        taxa = [taxon for taxon in counts if counts[taxon] > 0]
+        n0 = [counts[taxon] for taxon in taxa]
+        rates = [float(self.active_taxa[taxon]['growth_strategy'].get('mu_max', 0)) for taxon in taxa]
+        div_diams = [float(self.active_taxa[taxon]['division_strategy'].get('diameter',
+                                                                            self.active_taxa[taxon]['diameter']))
+                     for taxon in taxa]
+
+        initial_cells = sum(n0)
+        if initial_cells > 0:
+            cell_vol = sum(n * mean_cell_volume(d) for n, d in zip(n0, div_diams)) / initial_cells
+        else:
+            cell_vol = mean_cell_volume(1e-6)
+        box_vol = self.sim_box.volume()
+        cap = box_vol * MAX_PACKING_FRACTION / cell_vol
+
+        halt_cap = None
+        if self.stop_condition == "percent biomass":
+            halt_cap = box_vol * self.biomass_percent / 100 / cell_vol
+            max_steps = MAX_RUNTIME
+        else:
+            max_steps = int(self.runtime)
+        if self.max_cells is not None:
+            halt_cap = self.max_cells if halt_cap is None else min(halt_cap, self.max_cells)
+        halting = halt_cap is not None and halt_cap <= cap
+        if halting:
+            cap = halt_cap
+
+        # relative abundance conditions depend on competition, which the projection does not model
+        projection = PopulationProjection(n0, rates, self.biostep, cap)
+        halt_step = projection.step_reaching_cap(max_steps) if halting else None
+        if self.growth_plateau is not None:
+            # growth stops once the box is packed, the halt fires at the end of the first window that starts after it
+            window = self.growth_plateau[1]
+            packed = projection.step_reaching_cap(max_steps)
+            if packed is not None:
+                plateau_step = (-(-packed // window) + 1) * window
+                if plateau_step <= max_steps and (halt_step is None or plateau_step < halt_step):
+                    halt_step = plateau_step
+        steps = halt_step if halt_step is not None else max_steps
+        n_dumps = steps + 1
+        cell_steps = projection.cumulative_capped(n_dumps)
+
+        try:
+            grid = self.substrate_grid()
+            grid_size, grid_cells, diffusion_cost = grid.spacing, grid.cells, grid.updates_per_step
+        except ValueError:
+            grid_size, grid_cells, diffusion_cost = None, 0, 0
+        n_substrates = len(set(self.substrates) | self._inferred_substrate_names())
+        n_groups = len(self.active_taxa) + len(self.lysis_groups)
+
+        hdf5_bytes = 0
+        if self.write_hdf5:
+            hdf5_bytes = cell_steps * HDF5_BYTES_PER_CELL + n_dumps * HDF5_BYTES_PER_DUMP
+        vtk_bytes = 0
+        if self.write_vtk:
+            vtk_bytes = cell_steps * VTU_BYTES_PER_CELL + n_dumps * VTU_BYTES_PER_DUMP
+            # con and rea for each substrate, den and gro for each type
+            vti_fields = 2 * n_substrates + 2 * n_groups
+            vtk_bytes += (steps // VTI_INTERVAL + 1) * grid_cells * vti_fields * VTI_BYTES_PER_VALUE
+        csv_bytes = 0
+        if self.write_csv:
+            csv_columns = 1 + (1 + 2 * n_groups if self.track_abs else 0)
+            csv_bytes = (steps + 1) * csv_columns * TEXT_BYTES_PER_COLUMN
+        thermo_bytes = 0
+        if self.thermo_output:
+            thermo_columns = 3 + (2 * n_groups if self.track_abs else 0)
+            thermo_bytes = (steps // max(int(self.thermo_timestep), 1) + 1) * thermo_columns * TEXT_BYTES_PER_COLUMN
+
+        return CaseEstimate(initial_cells=round(initial_cells),
+                            peak_cells=round(projection.at(steps)),
+                            steps=steps,
+                            cell_steps=cell_steps,
+                            halted=halt_step is not None,
+                            grid_size=grid_size,
+                            grid_cells=grid_cells,
+                            n_substrates=n_substrates,
+                            diffusion_cost=diffusion_cost,
+                            hdf5_bytes=round(hdf5_bytes),
+                            vtk_bytes=round(vtk_bytes),
+                            csv_bytes=round(csv_bytes),
+                            thermo_bytes=round(thermo_bytes))
+
+    def _generate_inputscript(self, restart_file=None, continuation_tag=None):
         isb = InputScriptBuilder()
+        continuing = restart_file is not None
+        if continuing:
+            isb.read_restart(restart_file)
 
         self._infer_substrates()
-        isb.build_substrate_grid(self.substrates, self.sim_box, self.forced_substrate_grid_size)
+        isb.build_substrate_grid(self.substrates, self.sim_box, self.forced_substrate_grid_size,
+                                 self._reference_cell_diameter())
+        isb.build_processors(self.sim_box, self.mpi_ranks, self.mpi_zranks)
+        if self.load_balancing is not None:
+            dims = 'xy' if self.mpi_zranks == 1 else 'xyz'
+            isb.add_load_balancing(dims=dims, **self.load_balancing)
         isb.build_bug_groups(self.active_taxa,self.lysis_groups)
+        isb.build_neighbor(self.active_taxa, **self.neighbor_settings)
         isb.clear_growth_strategy()
         isb.build_growth_strategy(self.active_taxa)
         isb.clear_division()
@@ -452,28 +1083,43 @@ class NufebProject:
             isb.add_thermo_output(self.track_abs, self.thermo_timestep)
 
         if(self.write_hdf5):
-            isb.add_hdf5_output()
+            if continuing:
+                isb.add_hdf5_output(f'hdf5/dump_{continuation_tag}.h5')
+            else:
+                isb.add_hdf5_output()
 
         if (self.write_vtk):
             isb.add_vtk_output()
 
         if(self.write_csv):
-            isb.enable_csv_output(self.track_abs, self.stop_condition=="percent biomass")
+            isb.enable_csv_output(self.track_abs, self.stop_condition=="percent biomass", append=continuing)
+
+        if self.restart_every is not None:
+            isb.add_restart_output(self.restart_every, self.restart_keep_all)
 
         if self.stop_condition=="percent biomass":
-            isb.build_run(365*24*60*60)
+            isb.build_run(MAX_RUNTIME, upto=continuing)
             isb.track_percent_biomass(self.sim_box)
             isb.end_on_biomass(self.biomass_percent)
         elif self.stop_condition=="runtime":
-            isb.build_run(self.runtime)
+            isb.build_run(self.runtime, upto=continuing)
         else:
             raise ValueError(f'Unknown stop condition: {self.stop_condition}')
 
+        for taxon, (threshold, above) in self.stop_relative_abundance.items():
+            isb.end_on_relative_abundance(taxon, threshold, above)
+        if self.max_cells is not None:
+            isb.end_on_cell_count(self.max_cells)
+        if self.growth_plateau is not None:
+            isb.end_on_growth_plateau(*self.growth_plateau)
+
         if self.max_biofilm_height is not None:
             isb.limit_biofilm_height(self.max_biofilm_height)
 
         self.group_assignments = isb.group_assignments
-        return isb.generate()
+        self.grid_choice = isb.grid_choice
+        with self.profiler.stage('inputscript_render'):
+            return isb.generate()
 
 
     # def match_color(self, bgr_color, predefined_colors):
@@ -487,22 +1133,24 @@ class NufebProject:
     #     return closest_color
 
     def simple_image_layout(self, imagefile, mappings):
-        self.taxa_pre_assigned = True
-        image = cv2.imread(imagefile)
-        grey_image = cv2.imread(imagefile, cv2.IMREAD_GRAYSCALE)
-
-        # Count non-white (non-blank) pixels
-        nbugs = np.count_nonzero(grey_image != 255)
-
-        height,width,color_components = image.shape
-        bug_num = 0
-        for x in range(width):
-            for y in range(height):
-                if np.all(image[y][x] != [255,255,255]):
-                    b,g,r = image[y][x]
-                    color_code = f'FF{r:02X}{g:02X}{b:02X}'
-                    self.bug_locs.append(BugPos(x*1e-6,(height-y-1)*1e-6,mappings[color_code]))
-                    bug_num += 1
+        with self.profiler.stage('simple_image_layout') as stage:
+            self.taxa_pre_assigned = True
+            image = cv2.imread(imagefile)
+            grey_image = cv2.imread(imagefile, cv2.IMREAD_GRAYSCALE)
+
+            # Count non-white (non-blank) pixels
+            nbugs = np.count_nonzero(grey_image != 255)
+
+            height,width,color_components = image.shape
+            bug_num = 0
+            for x in range(width):
+                for y in range(height):
+                    if np.all(image[y][x] != [255,255,255]):
+                        b,g,r = image[y][x]
+                        color_code = f'FF{r:02X}{g:02X}{b:02X}'
+                        self.bug_locs.append(BugPos(x*1e-6,(height-y-1)*1e-6,mappings[color_code]))
+                        bug_num += 1
+            stage.items = bug_num
 
 
     # def layout_and_distribute_image(self, imagefile, mappings):
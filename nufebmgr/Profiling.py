@@ -0,0 +1,143 @@
+'''
+
+Timing (and optionally memory) of the stages of case generation.
+
+A NufebProject starts with NULL_PROFILER, which does nothing, so generation pays only for a method call per stage
+unless profiling is switched on with NufebProject.enable_profiling().
+
+'''
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class StageRecord:
+    name: str
+    seconds: float = 0.0
+    items: Optional[int] = None
+    peak_bytes: Optional[int] = None
+    depth: int = 0
+    parent: Optional[str] = None
+
+
+class StageProfiler:
+    """
+    Records wall time, item counts and (optionally) peak memory of named stages.
+
+    Stages may be nested. Each finished stage is passed to every hook, e.g. to forward it to a sweep's own logging.
+
+    Attributes:
+        track_memory (bool): Record the peak traced memory above the level at the start of each stage. Uses
+            tracemalloc, which slows allocation-heavy code noticeably
+        records (list): Finished stages in the order they finished
+        hooks (list): Callables receiving each StageRecord as its stage finishes
+    """
+
+    def __init__(self, track_memory: bool = False, hooks: Optional[List[Callable[[StageRecord], None]]] = None):
+        self.track_memory = track_memory
+        self.hooks = list(hooks) if hooks else []
+        self.records: List[StageRecord] = []
+        self._stack: List[StageRecord] = []
+        self._child_peaks: List[int] = []
+
+    def add_hook(self, hook: Callable[[StageRecord], None]):
+        self.hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name: str, items: Optional[int] = None):
+        """
+        Time the body of a with block. The yielded StageRecord's items can be set inside the block once known.
+        """
+        record = StageRecord(name=name, items=items, depth=len(self._stack),
+                             parent=self._stack[-1].name if self._stack else None)
+        started_tracing = False
+        baseline = 0
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._stack.append(record)
+        self._child_peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            self._stack.pop()
+            child_peak = self._child_peaks.pop()
+            if self.track_memory:
+                # nested stages reset the peak, so take the larger of the children's and this stage's since the last one
+                peak = max(tracemalloc.get_traced_memory()[1], child_peak)
+                record.peak_bytes = max(peak - baseline, 0)
+                if self._child_peaks:
+                    self._child_peaks[-1] = max(self._child_peaks[-1], peak)
+                if started_tracing:
+                    tracemalloc.stop()
+            self.records.append(record)
+            for hook in self.hooks:
+                hook(record)
+
+    def total_seconds(self) -> float:
+        return sum(record.seconds for record in self.records if record.depth == 0)
+
+    def report(self) -> dict:
+        return {'total_seconds': self.total_seconds(),
+                'stages': [asdict(record) for record in self.records]}
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.report(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def reset(self):
+        self.records = []
+
+
+class _NullProfiler:
+    """Stand-in used when profiling is off, every stage is the same reusable do-nothing context."""
+
+    _context = nullcontext(StageRecord(name='disabled'))
+    records: List[StageRecord] = []
+    hooks: List[Callable] = []
+
+    def stage(self, name: str, items: Optional[int] = None):
+        return self._context
+
+    def report(self) -> dict:
+        return {'total_seconds': 0.0, 'stages': []}
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+def aggregate(reports: List[dict]) -> Dict[str, dict]:
+    """
+    Combine reports from many cases into per-stage statistics.
+
+    :param reports: StageProfiler.report() dictionaries (e.g. loaded back from their JSON)
+    :return: For each stage name: count, total, mean and max seconds, total items and max peak bytes
+    """
+    stats: Dict[str, dict] = {}
+    for report in reports:
+        for stage in report['stages']:
+            s = stats.setdefault(stage['name'], {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                                                 'items': 0, 'max_peak_bytes': None})
+            s['count'] += 1
+            s['total_seconds'] += stage['seconds']
+            s['max_seconds'] = max(s['max_seconds'], stage['seconds'])
+            if stage.get('items') is not None:
+                s['items'] += stage['items']
+            if stage.get('peak_bytes') is not None:
+                s['max_peak_bytes'] = max(s['max_peak_bytes'] or 0, stage['peak_bytes'])
+    for s in stats.values():
+        s['mean_seconds'] = s['total_seconds'] / s['count']
+    return stats
@@ -0,0 +1,173 @@
+'''
+
+Launch NUFEB on a set of generated case directories and track them to completion.
+
+Cases are started in the order given whenever enough cores are free for their MPI ranks, so a node can be kept busy
+with a mix of serial and parallel cases. A case counts as complete when the executable exits cleanly and the run has
+written the done.tkn file InputScriptBuilder makes every input script create at its end.
+
+With a CaseCache, a case whose configuration has already been run to completion (per the config hash in its
+manifest.json) gets the cached outputs copied in instead of being run, and completed cases are added to the cache.
+
+'''
+
+import json
+import os
+import shlex
+import subprocess
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Union
+from .CaseCache import CaseCache
+from .Manifest import INPUT_SCRIPT
+
+DONE_TOKEN = 'done.tkn'
+RUN_OUTPUT = 'run.out'
+
+
+@dataclass
+class CaseRun:
+    case_dir: str
+    ranks: int = 1
+    status: str = 'pending'
+    attempts: int = 0
+    returncode: Optional[int] = None
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def is_done(self) -> bool:
+        return os.path.exists(os.path.join(self.case_dir, DONE_TOKEN))
+
+
+class RunOrchestrator:
+    """
+    A bounded pool of NUFEB runs over case directories.
+
+    Attributes:
+        executable (str or list): The NUFEB binary (e.g. lmp_mpi) or any stand-in command, such as a stub script
+        cores (int): Cores available, the sum of ranks of running cases never exceeds this
+        workers (int): Maximum number of cases running at once
+        retries (int): How many times a failed case is relaunched
+        launcher (str): Prefix used for cases with more than one rank, {ranks} is replaced by the rank count
+        ledger (str): Optional path of a JSON lines file receiving one record per attempt
+        cache (CaseCache): Optional cache of completed runs to reuse and add to
+    """
+
+    def __init__(self, executable: Union[str, List[str]], cores: Optional[int] = None, workers: Optional[int] = None,
+                 retries: int = 0, launcher: str = 'mpirun -np {ranks}', input_script: str = INPUT_SCRIPT,
+                 ledger: Optional[str] = None, skip_done: bool = True, poll_interval: float = 0.5,
+                 cache: Union[str, CaseCache, None] = None):
+        self.executable = shlex.split(executable) if isinstance(executable, str) else list(executable)
+        self.cores = cores if cores is not None else (os.cpu_count() or 1)
+        self.workers = workers if workers is not None else self.cores
+        self.retries = retries
+        self.launcher = launcher
+        self.input_script = input_script
+        self.ledger = ledger
+        self.skip_done = skip_done
+        self.poll_interval = poll_interval
+        self.cache = CaseCache(cache) if isinstance(cache, str) else cache
+        self.cases: List[CaseRun] = []
+
+    def add_case(self, case_dir: str, ranks: int = 1) -> CaseRun:
+        if ranks > self.cores:
+            raise ValueError(f'Case {case_dir} needs {ranks} ranks but only {self.cores} cores are available')
+        case = CaseRun(case_dir=case_dir, ranks=ranks)
+        self.cases.append(case)
+        return case
+
+    def command(self, case: CaseRun) -> List[str]:
+        cmd = self.executable + ['-in', self.input_script]
+        if case.ranks > 1:
+            cmd = shlex.split(self.launcher.format(ranks=case.ranks)) + cmd
+        return cmd
+
+    def _launch(self, case: CaseRun) -> subprocess.Popen:
+        token = os.path.join(case.case_dir, DONE_TOKEN)
+        if os.path.exists(token):
+            # stale token from an earlier run would make a failed run look complete
+            os.remove(token)
+        case.status = 'running'
+        case.attempts += 1
+        case.started = time.time()
+        case.finished = None
+        with open(os.path.join(case.case_dir, RUN_OUTPUT), 'w') as out:
+            return subprocess.Popen(self.command(case), cwd=case.case_dir, stdout=out, stderr=subprocess.STDOUT)
+
+    def _record(self, case: CaseRun):
+        if self.ledger is None:
+            return
+        record = asdict(case)
+        record['elapsed'] = case.elapsed
+        record['command'] = self.command(case)
+        with open(self.ledger, 'a') as ledger:
+            ledger.write(json.dumps(record) + '\n')
+
+    def _finish(self, case: CaseRun, returncode: int, pending: List[CaseRun]):
+        case.finished = time.time()
+        case.returncode = returncode
+        if returncode == 0 and case.is_done():
+            case.status = 'done'
+            key = self.cache.key_of(case.case_dir) if self.cache is not None else None
+            if key is not None:
+                self.cache.store_run(key, case.case_dir)
+        elif case.attempts <= self.retries:
+            case.status = 'retry'
+            pending.append(case)
+        else:
+            case.status = 'failed'
+        self._record(case)
+
+    def _fetch_cached(self, case: CaseRun) -> bool:
+        if self.cache is None:
+            return False
+        key = self.cache.key_of(case.case_dir)
+        return key is not None and self.cache.fetch_run(key, case.case_dir)
+
+    def run(self) -> List[CaseRun]:
+        """Run all cases, blocking until each has completed or exhausted its retries."""
+        pending = []
+        for case in self.cases:
+            if self.skip_done and case.is_done():
+                case.status = 'skipped'
+                self._record(case)
+            else:
+                pending.append(case)
+
+        running = {}
+        while pending or running:
+            free = self.cores - sum(case.ranks for case in running.values())
+            # start, in order, every pending case that fits, letting smaller cases backfill idle cores
+            for case in list(pending):
+                if len(running) >= self.workers:
+                    break
+                if case.ranks <= free:
+                    pending.remove(case)
+                    # checked only now, an identical case may have completed while this one waited. Reruns
+                    # (skip_done off) always run
+                    if self.skip_done and self._fetch_cached(case):
+                        case.status = 'cached'
+                        self._record(case)
+                        continue
+                    running[self._launch(case)] = case
+                    free -= case.ranks
+
+            time.sleep(self.poll_interval if running else 0)
+            for process, case in list(running.items()):
+                returncode = process.poll()
+                if returncode is not None:
+                    del running[process]
+                    self._finish(case, returncode, pending)
+        return self.cases
+
+    def summary(self) -> dict:
+        counts = {}
+        for case in self.cases:
+            counts[case.status] = counts.get(case.status, 0) + 1
+        return counts
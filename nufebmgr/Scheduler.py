@@ -0,0 +1,227 @@
+'''
+
+Ordering and packing the cases of a sweep onto a fixed number of cores.
+
+Cases in a sweep can differ in cost by orders of magnitude. Started first-in-first-out, a few expensive cases that
+happen to be near the end of the list keep running long after everything else has finished. Starting the longest
+cases first (LPT scheduling) and giving the largest ones more ranks keeps all cores busy until close to the end.
+
+'''
+
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+
+@dataclass
+class ScheduledCase:
+    name: str
+    work: float
+    ranks: int = 1
+    features: Optional[tuple] = None
+    case_dir: Optional[str] = None
+
+
+@dataclass
+class PlacedCase:
+    name: str
+    ranks: int
+    start: float
+    end: float
+
+
+class CostModel:
+    """
+    Predicted serial runtime (s) of a case, linear in features taken from its NufebProject.estimate().
+
+    Features are cell-steps (mechanics and biology scale with the number of cells each step), grid cell updates (the
+    diffusion solve each step) and steps. The default coefficients are only rough, fit() them to historical runtimes
+    for predictions in seconds; for ordering cases only the relative weights matter.
+    """
+
+    def __init__(self, seconds_per_cell_step=2e-5, seconds_per_grid_update=1e-9, seconds_per_step=0.01,
+                 parallel_efficiency=0.9):
+        self.coefficients = np.array([seconds_per_cell_step, seconds_per_grid_update, seconds_per_step])
+        self.parallel_efficiency = parallel_efficiency
+
+    @staticmethod
+    def features(project) -> tuple:
+        estimate = project.estimate()
+        return (estimate.cell_steps, float(estimate.diffusion_cost) * estimate.steps, float(estimate.steps))
+
+    def predict(self, features: Sequence[float]) -> float:
+        return float(np.dot(self.coefficients, features))
+
+    def fit(self, features: Sequence[Sequence[float]], seconds: Sequence[float]):
+        """Least squares fit of the coefficients to observed serial runtimes, clipped to be non-negative."""
+        x = np.asarray(features, dtype=float)
+        y = np.asarray(seconds, dtype=float)
+        # scale columns so the solve is well conditioned despite features differing by many orders of magnitude
+        scale = np.where(x.max(axis=0) > 0, x.max(axis=0), 1.0)
+        solution, *_ = np.linalg.lstsq(x / scale, y, rcond=None)
+        self.coefficients = np.clip(solution / scale, 0, None)
+        return self
+
+    def duration(self, work: float, ranks: int) -> float:
+        """Runtime of a case of the given serial work on several ranks, losing some efficiency per doubling."""
+        if ranks <= 1:
+            return work
+        return work / (ranks * self.parallel_efficiency ** math.log2(ranks))
+
+
+class SweepScheduler:
+    """
+    Predicts the cost of each case in a sweep and orders them to minimize the time until the last one finishes.
+
+    Attributes:
+        cores (int): Cores available to the sweep
+        workers (int): Maximum number of cases running at once, as for RunOrchestrator, defaults to cores
+        model (CostModel): Predicts serial runtimes, optionally fitted to history
+        history (dict): Observed serial runtimes by case name, used instead of predictions when present
+    """
+
+    def __init__(self, cores: int, model: Optional[CostModel] = None, history: Optional[Dict[str, float]] = None,
+                 workers: Optional[int] = None):
+        self.cores = cores
+        self.workers = workers if workers is not None else cores
+        self.model = model if model is not None else CostModel()
+        self.history = history if history is not None else {}
+        self.cases: List[ScheduledCase] = []
+
+    def add(self, name: str, project=None, work: Optional[float] = None, ranks: int = 1,
+            case_dir: Optional[str] = None) -> ScheduledCase:
+        """
+        Add a case of the sweep, its work taken from history, given explicitly or predicted from its project.
+
+        :param case_dir: Directory the case is generated in and run from, defaults to the name
+        """
+        if ranks > self.cores:
+            raise ValueError(f'Case {name} needs {ranks} ranks but only {self.cores} cores are available')
+        features = None
+        if project is not None:
+            features = CostModel.features(project)
+        if name in self.history:
+            work = self.history[name]
+        elif work is None:
+            if features is None:
+                raise ValueError(f'Case {name} needs a project, an explicit work estimate or a historical runtime')
+            work = self.model.predict(features)
+        case = ScheduledCase(name, work, ranks, features, case_dir if case_dir is not None else name)
+        self.cases.append(case)
+        return case
+
+    def fit_history(self):
+        """Refit the cost model on the cases that have both a project and a historical runtime."""
+        known = [case for case in self.cases if case.name in self.history and case.features is not None]
+        if known:
+            self.model.fit([case.features for case in known], [self.history[case.name] for case in known])
+            for case in self.cases:
+                if case.name not in self.history and case.features is not None:
+                    case.work = self.model.predict(case.features)
+        return self.model
+
+    def assign_ranks(self, options: Sequence[int] = (1, 2, 4, 8)):
+        """
+        Give each case the fewest ranks that bring it under the ideal makespan (total work spread over all cores).
+
+        Cases that cannot get under it get the most ranks allowed, since they would otherwise set the makespan.
+        """
+        options = sorted(r for r in options if r <= self.cores)
+        if not options:
+            raise ValueError(f'No rank option fits the {self.cores} cores available')
+        ideal = sum(case.work for case in self.cases) / self.cores
+        for case in self.cases:
+            case.ranks = options[-1]
+            for ranks in options:
+                if self.model.duration(case.work, ranks) <= ideal:
+                    case.ranks = ranks
+                    break
+        return self.cases
+
+    def order(self) -> List[ScheduledCase]:
+        """Longest (predicted) duration first."""
+        return sorted(self.cases, key=lambda case: self.model.duration(case.work, case.ranks), reverse=True)
+
+    def simulate(self, order: Optional[List[ScheduledCase]] = None,
+                 durations: Optional[Dict[str, float]] = None) -> List[PlacedCase]:
+        """
+        Replay the RunOrchestrator policy (start, in order, every waiting case that fits the free cores, while fewer
+        than workers cases run) in time.
+
+        :param order: Cases in launch order, defaults to order()
+        :param durations: Actual serial runtimes by name to replay instead of the predicted work
+        :return: When each case starts and ends
+        """
+        order = self.order() if order is None else order
+        for case in order:
+            if case.ranks > self.cores:
+                raise ValueError(f'Case {case.name} needs {case.ranks} ranks but only {self.cores} cores are available')
+        durations = {} if durations is None else durations
+        pending = list(order)
+        running = []
+        placed = []
+        now = 0.0
+        free = self.cores
+        while pending or running:
+            for case in list(pending):
+                if len(running) >= self.workers:
+                    break
+                if case.ranks <= free:
+                    pending.remove(case)
+                    work = durations.get(case.name, case.work)
+                    end = now + self.model.duration(work, case.ranks)
+                    running.append((end, case))
+                    placed.append(PlacedCase(case.name, case.ranks, now, end))
+                    free -= case.ranks
+            running.sort(key=lambda item: item[0])
+            end, case = running.pop(0)
+            now = end
+            free += case.ranks
+        return placed
+
+    def makespan(self, order: Optional[List[ScheduledCase]] = None,
+                 durations: Optional[Dict[str, float]] = None) -> float:
+        return max((p.end for p in self.simulate(order, durations)), default=0.0)
+
+    def submit(self, orchestrator):
+        """Queue all cases on a RunOrchestrator in scheduled order, with their assigned ranks."""
+        for case in self.order():
+            orchestrator.add_case(case.case_dir, ranks=case.ranks)
+        return orchestrator
+
+
+def benchmark_against_fifo(n_cases=200, cores=32, prediction_noise=0.5, seed=1701) -> dict:
+    """
+    Makespan of a synthetic sweep run first-in-first-out versus with predicted-cost scheduling.
+
+    The sweep varies box size, inoculum, growth rate and biomass stop condition. Cases are scheduled on predicted
+    costs, but makespans are measured on 'actual' costs that differ from the predictions by lognormal noise.
+    """
+    from .NufebProject import NufebProject
+
+    rng = np.random.default_rng(seed)
+    scheduler = SweepScheduler(cores)
+    actual = {}
+    for i in range(n_cases):
+        prj = NufebProject(seed=int(rng.integers(1, 10000)))
+        side = int(rng.choice([50, 100, 200, 400]))
+        prj.set_box(x=side, y=side, z=100)
+        template = str(rng.choice(['basic_heterotroph', 'slow_heterotroph', 'small_heterotroph']))
+        prj.add_taxon_by_template(name='taxon', template=template)
+        prj.layout_uniform(nbugs=int(rng.integers(10, 2000)))
+        prj.set_composition({'taxon': 1})
+        prj.distribute_spatially_even()
+        prj.set_runtime(int(rng.integers(24, 192)))
+        if rng.random() < 0.5:
+            prj.stop_at_biomass_percent(int(rng.integers(5, 50)))
+        case = scheduler.add(f'case_{i}', prj)
+        actual[case.name] = case.work * rng.lognormal(0, prediction_noise)
+
+    scheduler.assign_ranks()
+    fifo = scheduler.makespan(order=scheduler.cases, durations=actual)
+    scheduled = scheduler.makespan(durations=actual)
+    lower_bound = max(sum(scheduler.model.duration(actual[c.name], c.ranks) * c.ranks for c in scheduler.cases) / cores,
+                      max(scheduler.model.duration(actual[c.name], c.ranks) for c in scheduler.cases))
+    return {'n_cases': n_cases, 'cores': cores, 'fifo_makespan': fifo, 'scheduled_makespan': scheduled,
+            'lower_bound': lower_bound, 'speedup': fifo / scheduled}
@@ -0,0 +1,117 @@
+'''
+
+Choosing the spacing of the substrate reaction/diffusion grid.
+
+Each biological step NUFEB iterates the diffusion solver over every grid cell of every substrate, so the cost of a case
+is dominated by the number of grid cells once the population is modest. Coarser grids are cheaper, but a grid cell
+much larger than a bacterium blurs the gradients the cells respond to, and one smaller than a bacterium breaks the
+assumption that biomass is spread over grid cells. The explicit solver also becomes unstable for small spacings.
+
+'''
+
+import math
+from dataclasses import dataclass, asdict
+from typing import List
+from .SimulationBox import SimulationBox
+
+
+@dataclass
+class GridChoice:
+    spacing: float
+    nx: int
+    ny: int
+    nz: int
+    n_substrates: int
+    diffusion_iterations: int
+
+    @property
+    def cells(self) -> int:
+        return self.nx * self.ny * self.nz
+
+    @property
+    def cost(self) -> int:
+        """
+        Grid cell updates per diffusion solver iteration.
+
+        The iterations per biological step are left out: with a fixed diffdt, how many the solver needs depends on the
+        box, diffusivity and tolerance but not on the spacing, so they do not change which spacing is cheapest.
+        """
+        return self.cells * self.n_substrates
+
+    @property
+    def updates_per_step(self) -> int:
+        """Grid cell updates per biological step in the worst case (solver runs to diffmax)."""
+        return self.cost * self.diffusion_iterations
+
+    def as_dict(self) -> dict:
+        d = asdict(self)
+        d['cells'] = self.cells
+        d['cost'] = self.cost
+        d['updates_per_step'] = self.updates_per_step
+        return d
+
+
+class SubstrateGridPicker:
+    """
+    Evaluate the grid spacings that evenly divide a simulation box and pick the cheapest acceptable one, the one with
+    the fewest cells x substrates.
+
+    Spacings are in microns, like the box dimensions. NUFEB grids are cubic, so a spacing is acceptable when it divides
+    all three box lengths, lies between min_cell_ratio and max_cell_ratio times the reference cell diameter and keeps
+    the explicit diffusion step (diffusion_dt) within its stability limit of h^2 / (6 D). Candidates are multiples of
+    resolution so that the spacing written to the input script divides the box exactly.
+    """
+
+    def __init__(self, s: SimulationBox, n_substrates=1, cell_diameter=1e-6, min_cell_ratio=1.0, max_cell_ratio=2.5,
+                 diffusion_coeff=1.6e-9, diffusion_dt=1e-4, diffusion_iterations=5000, resolution=0.1):
+        self.sim_box = s
+        self.resolution = resolution
+        self.n_substrates = n_substrates
+        self.min_spacing = min_cell_ratio * cell_diameter * 1e6
+        self.max_spacing = max_cell_ratio * cell_diameter * 1e6
+        self.diffusion_coeff = diffusion_coeff
+        self.diffusion_dt = diffusion_dt
+        self.diffusion_iterations = diffusion_iterations
+
+    def _divisions(self, spacing):
+        divisions = []
+        for length in [self.sim_box.xlen, self.sim_box.ylen, self.sim_box.zlen]:
+            n = length / spacing
+            if abs(n - round(n)) > 1e-9 * max(n, 1) or round(n) < 1:
+                return None
+            divisions.append(round(n))
+        return divisions
+
+    def choice_for(self, spacing) -> GridChoice:
+        divisions = self._divisions(spacing)
+        if divisions is None:
+            raise ValueError(f'Grid size of {spacing} does not fit a simulation of dimensions {self.sim_box.dim_string()}')
+        return GridChoice(spacing, *divisions, n_substrates=self.n_substrates,
+                          diffusion_iterations=self.diffusion_iterations)
+
+    def is_stable(self, spacing) -> bool:
+        return self.diffusion_dt <= (spacing * 1e-6) ** 2 / (6 * self.diffusion_coeff)
+
+    def is_accurate(self, spacing) -> bool:
+        tol = 1e-9
+        return self.min_spacing - tol <= spacing <= self.max_spacing + tol
+
+    def candidates(self) -> List[GridChoice]:
+        """All acceptable spacings, cheapest first."""
+        k_min = max(math.ceil(self.min_spacing / self.resolution - 1e-9), 1)
+        k_max = math.floor(self.max_spacing / self.resolution + 1e-9)
+        choices = []
+        for k in range(k_min, k_max + 1):
+            spacing = round(k * self.resolution, 9)
+            if not (self.is_accurate(spacing) and self.is_stable(spacing)):
+                continue
+            if self._divisions(spacing) is not None:
+                choices.append(self.choice_for(spacing))
+        return sorted(choices, key=lambda c: (c.cost, c.cells))
+
+    def pick(self) -> GridChoice:
+        choices = self.candidates()
+        if not choices:
+            raise ValueError(f'No valid grid size between {self.min_spacing:g} and {self.max_spacing:g} microns for '
+                             f'a simulation of dimensions {self.sim_box.dim_string()}')
+        return choices[0]
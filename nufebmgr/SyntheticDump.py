@@ -0,0 +1,190 @@
+'''
+
+Synthetic HDF5 dumps in the layout written by NUFEB's nufeb/hdf5 dump style, for testing and capacity planning.
+
+Every timestep t has one dataset per field: /id/t (int64), /type/t (int32) and /x/t, /y/t, /z/t, /radius/t (float64).
+The population follows simple growth and death dynamics so that births, deaths and abundances are non-trivial, and
+each timestep is generated and written as whole arrays, so writing is limited by disk rather than Python.
+
+The same snapshots can be written as the vtk/dump*.vtu particle files of NUFEB's vtk dump style, to exercise the
+readers of runs without HDF5 output.
+
+'''
+
+import base64
+import math
+import os
+import h5py
+import numpy as np
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+FIELDS = ('id', 'type', 'x', 'y', 'z', 'radius')
+FIELD_DTYPES = {'id': np.int64, 'type': np.int32, 'x': np.float64, 'y': np.float64, 'z': np.float64,
+                'radius': np.float64}
+VTU_DTYPES = {'Int64': '<i8', 'Int32': '<i4', 'Float64': '<f8'}
+
+
+@dataclass
+class SyntheticDumpStats:
+    timesteps: int
+    cell_steps: int
+    final_cells: int
+    births: int
+    deaths: int
+    bytes_written: int
+
+
+class SyntheticDump:
+    """
+    A population of spherical cells that grow, divide and die, snapshot every step.
+
+    Cells grow in volume by growth_rate per step and divide into two equal daughters once they reach twice the newborn
+    volume, so the population roughly doubles every log(2)/log(1 + growth_rate) steps. Each cell dies with probability
+    death_rate per step. Growth stops once the population reaches max_cells. Lengths are in meters, the box in microns
+    like SimulationBox.
+
+    Attributes:
+        n_initial (int): Cells at timestep 0
+        n_timesteps (int): Number of snapshots
+        n_types (int): Types are assigned uniformly at random at the start and inherited by daughters
+    """
+
+    def __init__(self, n_initial=100, n_timesteps=20, n_types=1, growth_rate=0.05, death_rate=0.0,
+                 diameter=1e-6, box=(100, 100, 100), max_cells: Optional[int] = None, seed=1701):
+        if n_initial < 0 or n_timesteps < 1:
+            raise ValueError('Need a non-negative number of cells and at least one timestep')
+        if not 0 <= death_rate <= 1:
+            raise ValueError(f'Death rate must be a probability, got {death_rate}')
+        self.n_initial = n_initial
+        self.n_timesteps = n_timesteps
+        self.n_types = n_types
+        self.growth_factor = (1 + growth_rate) ** (1 / 3)
+        self.death_rate = death_rate
+        self.newborn_radius = diameter / 2
+        self.division_radius = self.newborn_radius * 2 ** (1 / 3)
+        self.box = np.array(box, dtype=float) * 1e-6
+        self.max_cells = max_cells
+        self.seed = seed
+
+    def snapshots(self) -> Iterator[Tuple[int, dict]]:
+        """Yield (timestep, {field: array}) for each timestep in order."""
+        rng = np.random.default_rng(self.seed)
+        n = self.n_initial
+        ids = np.arange(1, n + 1, dtype=np.int64)
+        types = rng.integers(1, self.n_types + 1, n).astype(np.int32)
+        # start at random points of the cell cycle so divisions don't happen in lockstep
+        radius = self.newborn_radius * (1 + rng.random(n)) ** (1 / 3)
+        xyz = np.column_stack([rng.random(n) * self.box[0], rng.random(n) * self.box[1], radius])
+        next_id = n + 1
+
+        for t in range(self.n_timesteps):
+            yield t, {'id': ids, 'type': types, 'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2], 'radius': radius}
+
+            alive = rng.random(len(ids)) >= self.death_rate
+            ids, types, radius, xyz = ids[alive], types[alive], radius[alive], xyz[alive]
+            if self.max_cells is None or len(ids) < self.max_cells:
+                radius = radius * self.growth_factor
+            dividing = np.nonzero(radius >= self.division_radius)[0]
+            if self.max_cells is not None:
+                dividing = dividing[:max(self.max_cells - len(ids), 0)]
+            if len(dividing):
+                radius[dividing] /= 2 ** (1 / 3)
+                # daughters sit one diameter away from their sibling, in a random upward-facing direction
+                direction = rng.normal(size=(len(dividing), 3))
+                direction[:, 2] = np.abs(direction[:, 2])
+                direction /= np.linalg.norm(direction, axis=1, keepdims=True)
+                child_xyz = xyz[dividing] + direction * (radius[dividing] * 2)[:, None]
+                child_xyz[:, :2] %= self.box[:2]
+                child_xyz[:, 2] = np.clip(child_xyz[:, 2], radius[dividing], self.box[2] - radius[dividing])
+                ids = np.concatenate([ids, np.arange(next_id, next_id + len(dividing), dtype=np.int64)])
+                types = np.concatenate([types, types[dividing]])
+                radius = np.concatenate([radius, radius[dividing]])
+                xyz = np.concatenate([xyz, child_xyz])
+                next_id += len(dividing)
+
+    def write(self, path: str, chunks: Optional[int] = None, compression: Optional[str] = None,
+              compression_opts=None) -> SyntheticDumpStats:
+        """
+        Write the dump to path, replacing any existing file.
+
+        :param chunks: Rows per chunk, None for contiguous datasets (fastest to write). Compression needs chunks, so
+            they default to 65536 rows when compression is set
+        :param compression: h5py compression filter, e.g. 'gzip' or 'lzf'
+        :param compression_opts: Options of the filter, e.g. the gzip level
+        """
+        if compression is not None and chunks is None:
+            chunks = 65536
+        cell_steps = births = deaths = 0
+        previous = None
+        n_final = 0
+        with h5py.File(path, 'w') as dump:
+            for t, snapshot in self.snapshots():
+                n = len(snapshot['id'])
+                for field in FIELDS:
+                    data = np.ascontiguousarray(snapshot[field], dtype=FIELD_DTYPES[field])
+                    kwargs = {}
+                    if chunks is not None and n > 0:
+                        kwargs = {'chunks': (min(chunks, n),), 'compression': compression,
+                                  'compression_opts': compression_opts}
+                    dump.create_dataset(f'{field}/{t}', data=data, **kwargs)
+                if previous is not None:
+                    # survivors keep their order and daughters get new, larger ids, so ids stay sorted and every id
+                    # above the previous maximum is a birth
+                    born = n - np.searchsorted(snapshot['id'], previous[1], side='right')
+                    births += int(born)
+                    deaths += int(previous[0] - (n - born))
+                previous = (n, snapshot['id'][-1] if n else 0)
+                cell_steps += n
+                n_final = n
+        return SyntheticDumpStats(timesteps=self.n_timesteps, cell_steps=cell_steps, final_cells=n_final,
+                                  births=births, deaths=deaths,
+                                  bytes_written=cell_steps * sum(np.dtype(d).itemsize for d in FIELD_DTYPES.values()))
+
+    def write_vtu(self, directory: str, encoding: str = 'raw'):
+        """
+        Write one dump<step>.vtu per timestep into directory, with id, type and diameter point data like
+        add_vtk_output() asks for.
+
+        :param encoding: 'raw' or 'base64' appended data, as VTK's XML writers produce
+        """
+        if encoding not in ('raw', 'base64'):
+            raise ValueError(f'Unknown encoding: {encoding}. Must be raw or base64.')
+        os.makedirs(directory, exist_ok=True)
+        for t, snapshot in self.snapshots():
+            points = np.column_stack([snapshot['x'], snapshot['y'], snapshot['z']])
+            arrays = [('Int64', 'id', 1, snapshot['id']),
+                      ('Int32', 'type', 1, snapshot['type']),
+                      ('Float64', 'diameter', 1, snapshot['radius'] * 2),
+                      ('Float64', None, 3, points)]
+            appended = b''
+            tags = {}
+            for vtk_type, name, components, values in arrays:
+                data = np.ascontiguousarray(values, dtype=VTU_DTYPES[vtk_type]).tobytes()
+                block = np.array([len(data)], dtype='<u4').tobytes() + data
+                name_attribute = f' Name="{name}"' if name else ''
+                tags[name] = (f'<DataArray type="{vtk_type}"{name_attribute} NumberOfComponents="{components}" '
+                              f'format="appended" offset="{len(appended)}"/>')
+                appended += block if encoding == 'raw' else base64.b64encode(block)
+            n = len(snapshot['id'])
+            head = ('<?xml version="1.0"?>\n'
+                    '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt32">\n'
+                    f'<UnstructuredGrid>\n<Piece NumberOfPoints="{n}" NumberOfCells="0">\n'
+                    f'<PointData>\n{tags["id"]}\n{tags["type"]}\n{tags["diameter"]}\n</PointData>\n'
+                    f'<Points>\n{tags[None]}\n</Points>\n'
+                    '<Cells>\n</Cells>\n</Piece>\n</UnstructuredGrid>\n'
+                    f'<AppendedData encoding="{encoding}">\n_')
+            with open(os.path.join(directory, f'dump{t}.vtu'), 'wb') as f:
+                f.write(head.encode() + appended + b'\n</AppendedData>\n</VTKFile>\n')
+
+    def expected_cell_steps(self) -> float:
+        """Approximate total rows written, to size a dump before writing it (e.g. for capacity planning)."""
+        rate = math.log(self.growth_factor ** 3) + math.log(1 - self.death_rate) if self.death_rate < 1 else -math.inf
+        total = 0.0
+        n = float(self.n_initial)
+        for _ in range(self.n_timesteps):
+            total += n
+            n = n * math.exp(rate)
+            if self.max_cells is not None:
+                n = min(n, self.max_cells)
+        return total
@@ -0,0 +1,383 @@
+'''
+
+Reading the VTK image data (.vti) grid dumps NUFEB writes with add_vtk_output(), without depending on VTK.
+
+``dump du2 all grid/vtk 10 vtk/dump_%_*.vti con rea den gro`` writes one file per field and dump step, with % replaced
+by the field and * by the step, e.g. vtk/dump_con_100.vti. A file holds one data array per substrate (con, rea) or per
+group (den, gro). Arrays may be written as ASCII, as base64 binary inside the XML, or appended after it as raw or
+base64 data, optionally zlib compressed. Uncompressed raw appended arrays are memory-mapped rather than read.
+
+The particle dump (``dump du1 all vtk 1 vtk/dump*.vtu id type diameter``) writes one VTK unstructured grid (.vtu) per
+step, with the same encodings, read by VtuFile. DumpTools.VtuDumpFile builds the DumpFile API on top of these.
+
+'''
+
+import base64
+import glob
+import os
+import re
+import zlib
+import xml.etree.ElementTree as ET
+import numpy as np
+import polars as pl
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+VTK_TYPES = {'Int8': 'i1', 'UInt8': 'u1', 'Int16': 'i2', 'UInt16': 'u2', 'Int32': 'i4', 'UInt32': 'u4',
+             'Int64': 'i8', 'UInt64': 'u8', 'Float32': 'f4', 'Float64': 'f8'}
+
+GRID_FILE_PATTERN = re.compile(r'(?P<prefix>.*)_(?P<field>[A-Za-z0-9]+)_(?P<step>\d+)\.vti$')
+PARTICLE_FILE_PATTERN = re.compile(r'(?P<prefix>.*?)(?P<step>\d+)\.vtu$')
+
+
+@dataclass
+class VtiArrayInfo:
+    name: str
+    dtype: np.dtype
+    components: int
+    format: str
+    offset: Optional[int] = None
+    text: Optional[str] = None
+    cell_data: bool = True
+
+
+class _VtkXmlFile:
+    """
+    The header and data array decoding shared by VTK's XML file types. The XML is parsed on construction, arrays are
+    only decoded when asked for. Subclasses read their dataset element from self._root.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        content = self._read_head(path)
+        appended_at = content.find(b'<AppendedData')
+        if appended_at >= 0:
+            head = content[:appended_at] + b'</VTKFile>'
+            tag_end = content.index(b'>', appended_at)
+            self._appended_start = content.index(b'_', tag_end) + 1
+            tag = content[appended_at:tag_end].decode()
+            self._appended_encoding = re.search(r'encoding="(\w+)"', tag).group(1)
+        else:
+            head = content
+            self._appended_start = None
+            self._appended_encoding = None
+        self._appended = None
+        root = ET.fromstring(head)
+        self.byte_order = '<' if root.get('byte_order', 'LittleEndian') == 'LittleEndian' else '>'
+        self.header_dtype = np.dtype(self.byte_order + VTK_TYPES[root.get('header_type', 'UInt32')])
+        self.compressed = root.get('compressor') is not None
+        if self.compressed and root.get('compressor') != 'vtkZLibDataCompressor':
+            raise ValueError(f'Unsupported compressor {root.get("compressor")} in {path}')
+        self._root = root
+
+    def _array_info(self, array: ET.Element, cell_data: bool = True) -> VtiArrayInfo:
+        fmt = array.get('format', 'ascii')
+        return VtiArrayInfo(name=array.get('Name'),
+                            dtype=np.dtype(self.byte_order + VTK_TYPES[array.get('type')]),
+                            components=int(array.get('NumberOfComponents', 1)),
+                            format=fmt,
+                            offset=int(array.get('offset')) if fmt == 'appended' else None,
+                            text=array.text if fmt != 'appended' else None,
+                            cell_data=cell_data)
+
+    def _infos(self) -> List[VtiArrayInfo]:
+        raise NotImplementedError
+
+    def _decode(self, info: VtiArrayInfo, mmap: bool) -> np.ndarray:
+        """The flat values of an array, possibly followed by padding."""
+        if info.format == 'ascii':
+            return np.array(info.text.split(), dtype=info.dtype)
+        if info.format == 'binary':
+            return self._decode_base64(info.text.strip(), info.dtype)
+        if self._appended_encoding == 'raw':
+            return self._read_raw(info, mmap)
+        return self._decode_base64(self._appended_text(info.offset), info.dtype)
+
+    @staticmethod
+    def _read_head(path: str, chunk_size: int = 1 << 16) -> bytes:
+        """The file up to the start of any appended data, or all of it, without reading the appended payload."""
+        content = bytearray()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                search_from = max(len(content) - 16, 0)
+                content += chunk
+                appended_at = content.find(b'<AppendedData', search_from)
+                if appended_at >= 0 and content.find(b'_', appended_at) >= 0:
+                    return bytes(content)
+                if not chunk:
+                    return bytes(content)
+
+    def _header_size(self, n_values: int) -> int:
+        return n_values * self.header_dtype.itemsize
+
+    def _read_raw(self, info: VtiArrayInfo, mmap: bool) -> np.ndarray:
+        start = self._appended_start + info.offset
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            if not self.compressed:
+                n_bytes = int(np.frombuffer(f.read(self.header_dtype.itemsize), self.header_dtype)[0])
+                data_start = start + self.header_dtype.itemsize
+                if mmap and n_bytes > 0:
+                    return np.memmap(self.path, dtype=info.dtype, mode='r', offset=data_start,
+                                     shape=(n_bytes // info.dtype.itemsize,))
+                return np.frombuffer(f.read(n_bytes), info.dtype)
+            header = np.frombuffer(f.read(self._header_size(3)), self.header_dtype)
+            n_blocks = int(header[0])
+            sizes = np.frombuffer(f.read(self._header_size(n_blocks)), self.header_dtype)
+            blocks = f.read(int(sizes.sum()))
+        return np.frombuffer(self._inflate(blocks, sizes), info.dtype)
+
+    @staticmethod
+    def _inflate(blocks: bytes, sizes) -> bytes:
+        out = []
+        position = 0
+        for size in sizes:
+            out.append(zlib.decompress(blocks[position:position + int(size)]))
+            position += int(size)
+        return b''.join(out)
+
+    def _appended_text(self, offset: int) -> str:
+        if self._appended is None:
+            with open(self.path, 'rb') as f:
+                self._appended = f.read()
+        start = self._appended_start + offset
+        content = self._appended
+        later = [info.offset for info in self._infos() if info.offset is not None and info.offset > offset]
+        if later:
+            end = self._appended_start + min(later)
+        else:
+            # the last array runs until whitespace or the closing tag
+            end = start
+            while end < len(content) and content[end:end + 1] not in (b'<', b'\n', b' ', b'\r', b'\t'):
+                end += 1
+        return content[start:end].decode()
+
+    def _b64_chunk(self, text: str, n_bytes: int):
+        """Decode n_bytes from the start of text, whether it was encoded on its own or together with what follows."""
+        n_chars = 4 * -(-n_bytes // 3)
+        chunk = text[:n_chars]
+        # either encoded separately (padded), or aligned so that the rest is a base64 stream of its own
+        if n_bytes % 3 == 0 or chunk.endswith('='):
+            return base64.b64decode(chunk), text[n_chars:], True
+        joint = base64.b64decode(text)
+        return joint[:n_bytes], joint[n_bytes:], False
+
+    def _decode_base64(self, text: str, dtype: np.dtype) -> np.ndarray:
+        size = self.header_dtype.itemsize
+        if not self.compressed:
+            header, rest, separate = self._b64_chunk(text, size)
+            n_bytes = int(np.frombuffer(header, self.header_dtype)[0])
+            data = base64.b64decode(rest) if separate else rest
+            return np.frombuffer(data[:n_bytes], dtype)
+        first, _, _ = self._b64_chunk(text, 3 * size)
+        n_blocks = int(np.frombuffer(first, self.header_dtype)[0])
+        header, rest, separate = self._b64_chunk(text, (3 + n_blocks) * size)
+        sizes = np.frombuffer(header, self.header_dtype)[3:]
+        blocks = base64.b64decode(rest) if separate else rest
+        return np.frombuffer(self._inflate(blocks, sizes), dtype)
+
+
+class VtiFile(_VtkXmlFile):
+    """
+    A single .vti file.
+
+    Attributes:
+        path (str): The file
+        extent (tuple): WholeExtent, x0 x1 y0 y1 z0 z1
+        origin (tuple): Origin of the grid (m)
+        spacing (tuple): Grid spacing (m)
+        arrays (dict): VtiArrayInfo by array name, in file order
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        image = self._root.find('ImageData')
+        if image is None:
+            raise ValueError(f'{path} is not VTK image data')
+        self.extent = tuple(int(v) for v in image.get('WholeExtent').split())
+        self.origin = tuple(float(v) for v in image.get('Origin', '0 0 0').split())
+        self.spacing = tuple(float(v) for v in image.get('Spacing', '1 1 1').split())
+
+        self.arrays: Dict[str, VtiArrayInfo] = {}
+        for section in ('CellData', 'PointData'):
+            for data in image.iter(section):
+                for array in data.findall('DataArray'):
+                    self.arrays[array.get('Name')] = self._array_info(array, section == 'CellData')
+
+    def _infos(self) -> List[VtiArrayInfo]:
+        return list(self.arrays.values())
+
+    def shape(self, cell_data: bool = True) -> tuple:
+        """(nz, ny, nx) of cell or point data."""
+        x0, x1, y0, y1, z0, z1 = self.extent
+        if cell_data:
+            return max(z1 - z0, 1), max(y1 - y0, 1), max(x1 - x0, 1)
+        return z1 - z0 + 1, y1 - y0 + 1, x1 - x0 + 1
+
+    def names(self) -> List[str]:
+        return list(self.arrays)
+
+    def array(self, name: str, mmap: bool = True) -> np.ndarray:
+        """
+        One array, shaped (z, y, x) or (z, y, x, components). x varies fastest in the file, as in all VTK image data.
+
+        :param mmap: Memory-map uncompressed raw appended data instead of reading it
+        """
+        info = self.arrays[name]
+        count = int(np.prod(self.shape(info.cell_data))) * info.components
+        flat = self._decode(info, mmap)[:count]
+        shape = self.shape(info.cell_data) + ((info.components,) if info.components > 1 else ())
+        return flat.reshape(shape)
+
+    def read_all(self, mmap: bool = True) -> Dict[str, np.ndarray]:
+        return {name: self.array(name, mmap) for name in self.arrays}
+
+
+class VtuFile(_VtkXmlFile):
+    """
+    A single .vtu particle file as written by NUFEB's vtk dump style: one point per atom, positions in Points and one
+    PointData array per dumped property (e.g. id, type, diameter). Pieces are concatenated in file order.
+
+    Attributes:
+        path (str): The file
+        n_points (int): Number of atoms
+        pieces (list): (number of points, {name: VtiArrayInfo}) per piece, the positions named 'Points'
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        grid = self._root.find('UnstructuredGrid')
+        if grid is None:
+            raise ValueError(f'{path} is not a VTK unstructured grid')
+        self.pieces = []
+        for piece in grid.findall('Piece'):
+            arrays: Dict[str, VtiArrayInfo] = {}
+            points = piece.find('Points/DataArray')
+            if points is not None:
+                arrays['Points'] = self._array_info(points, cell_data=False)
+            for array in piece.findall('PointData/DataArray'):
+                arrays[array.get('Name')] = self._array_info(array, cell_data=False)
+            self.pieces.append((int(piece.get('NumberOfPoints')), arrays))
+        self.n_points = sum(n for n, _ in self.pieces)
+
+    def _infos(self) -> List[VtiArrayInfo]:
+        return [info for _, arrays in self.pieces for info in arrays.values()]
+
+    def names(self) -> List[str]:
+        return list(self.pieces[0][1]) if self.pieces else []
+
+    def array(self, name: str, mmap: bool = True) -> np.ndarray:
+        """
+        One property of every atom, shaped (n_points,) or (n_points, components), e.g. array('Points') for positions.
+
+        :param mmap: Memory-map uncompressed raw appended data instead of reading it
+        """
+        parts = []
+        for n, arrays in self.pieces:
+            info = arrays[name]
+            flat = self._decode(info, mmap)[:n * info.components]
+            parts.append(flat.reshape((n, info.components)) if info.components > 1 else flat)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def read_all(self, mmap: bool = True) -> Dict[str, np.ndarray]:
+        return {name: self.array(name, mmap) for name in self.names()}
+
+
+def read_vti(path: str, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """All arrays of a .vti file by name, each shaped (z, y, x)."""
+    return VtiFile(path).read_all(mmap)
+
+
+def read_vtu(path: str, mmap: bool = False) -> Dict[str, np.ndarray]:
+    """All point arrays of a .vtu file by name, with the positions split into x, y and z."""
+    arrays = VtuFile(path).read_all(mmap)
+    points = arrays.pop('Points', None)
+    if points is not None:
+        points = points.reshape(-1, 3)
+        arrays.update(x=points[:, 0], y=points[:, 1], z=points[:, 2])
+    return arrays
+
+
+def particle_files(directory: str = 'vtk') -> Dict[int, str]:
+    """The .vtu particle dumps in directory by step, e.g. vtk/dump100.vtu for step 100."""
+    files = {}
+    for path in glob.glob(os.path.join(directory, '*.vtu')):
+        match = PARTICLE_FILE_PATTERN.match(os.path.basename(path))
+        if match:
+            files[int(match.group('step'))] = path
+    return dict(sorted(files.items()))
+
+
+class GridSeries:
+    """
+    The grid dumps of one field (e.g. 'con') over time, as a lazily loaded (time, name, z, y, x) collection.
+
+    Files are found by name, nothing is read until a timestep is accessed. Indexing with series[i] gives the
+    (name, z, y, x) array of the i-th dump step.
+
+    Attributes:
+        field (str): con, rea, den or gro
+        steps (list): Dump steps found, in order
+        names (list): Array names (substrates or groups), in file order
+    """
+
+    def __init__(self, directory: str = 'vtk', field: str = 'con', mmap: bool = True):
+        self.directory = directory
+        self.field = field
+        self.mmap = mmap
+        self.files: Dict[int, str] = {}
+        for path in glob.glob(os.path.join(directory, '*.vti')):
+            match = GRID_FILE_PATTERN.match(os.path.basename(path))
+            if match and match.group('field') == field:
+                self.files[int(match.group('step'))] = path
+        self.steps = sorted(self.files)
+        self._cache: Dict[int, VtiFile] = {}
+        self.names = self.file(self.steps[0]).names() if self.steps else []
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def file(self, step: int) -> VtiFile:
+        if step not in self._cache:
+            self._cache[step] = VtiFile(self.files[step])
+        return self._cache[step]
+
+    def at(self, step: int) -> np.ndarray:
+        """(name, z, y, x) values at a dump step."""
+        vti = self.file(step)
+        return np.stack([vti.array(name, self.mmap) for name in self.names])
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.at(self.steps[index])
+
+    def to_array(self) -> np.ndarray:
+        """Everything as one (time, name, z, y, x) array. Loads all files, prefer indexing for long runs."""
+        return np.stack([self.at(step) for step in self.steps])
+
+    @staticmethod
+    def _step_statistics(args) -> List[dict]:
+        step, path, names, mmap = args
+        vti = VtiFile(path)
+        rows = []
+        for name in names:
+            values = np.asarray(vti.array(name, mmap), dtype=float)
+            rows.append({'step': step, 'name': name, 'min': float(values.min()), 'max': float(values.max()),
+                         'mean': float(values.mean()), 'std': float(values.std()), 'sum': float(values.sum())})
+        return rows
+
+    def statistics(self, workers: Optional[int] = None) -> pl.DataFrame:
+        """
+        Min, max, mean, standard deviation and sum of every array at every step, files processed in parallel.
+
+        :param workers: Threads to use, defaults to the ThreadPoolExecutor default
+        """
+        jobs = [(step, self.files[step], self.names, self.mmap) for step in self.steps]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            rows = [row for result in pool.map(self._step_statistics, jobs) for row in result]
+        return pl.DataFrame(rows, schema={'step': pl.Int64, 'name': pl.String, 'min': pl.Float64,
+                                          'max': pl.Float64, 'mean': pl.Float64, 'std': pl.Float64,
+                                          'sum': pl.Float64})
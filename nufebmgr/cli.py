@@ -0,0 +1,51 @@
+'''
+
+Command line entry point, e.g.
+
+    nufebmgr run cases/* --exe lmp_mpi --cores 32 --ranks 4 --retries 1 --ledger ledger.jsonl
+
+'''
+
+import argparse
+import sys
+from .RunManager import RunOrchestrator, INPUT_SCRIPT
+
+
+def _run(args) -> int:
+    orchestrator = RunOrchestrator(args.exe, cores=args.cores, workers=args.workers, retries=args.retries,
+                                   launcher=args.launcher, input_script=args.input, ledger=args.ledger,
+                                   skip_done=not args.rerun, poll_interval=args.poll, cache=args.cache)
+    for case_dir in args.case_dirs:
+        orchestrator.add_case(case_dir, ranks=args.ranks)
+    orchestrator.run()
+    summary = orchestrator.summary()
+    print(', '.join(f'{status}: {count}' for status, count in sorted(summary.items())))
+    return 1 if summary.get('failed') else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='nufebmgr', description='Tools for managing NUFEB cases')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='Run NUFEB on generated case directories')
+    run.add_argument('case_dirs', nargs='+', help='Case directories containing an input script and atom.in')
+    run.add_argument('--exe', required=True, help='NUFEB executable, or any command standing in for it')
+    run.add_argument('--cores', type=int, default=None, help='Cores to use in total (default: all)')
+    run.add_argument('--workers', type=int, default=None, help='Maximum cases running at once (default: cores)')
+    run.add_argument('--ranks', type=int, default=1, help='MPI ranks per case')
+    run.add_argument('--launcher', default='mpirun -np {ranks}', help='MPI launcher for cases with several ranks')
+    run.add_argument('--retries', type=int, default=0, help='Times to relaunch a failed case')
+    run.add_argument('--input', default=INPUT_SCRIPT, help='Name of the input script within each case directory')
+    run.add_argument('--ledger', default=None, help='JSON lines file to record every attempt in')
+    run.add_argument('--rerun', action='store_true', help='Also run cases that already have a done.tkn')
+    run.add_argument('--cache', default=None,
+                     help='Case cache directory, completed runs found there are reused and new ones added')
+    run.add_argument('--poll', type=float, default=0.5, help='Seconds between checks on running cases')
+    run.set_defaults(func=_run)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+'''
+
+Clustered and inhomogeneous random point layouts, generated with whole-array NumPy operations.
+
+Positions and lengths are in meters, the box is the x and y lengths of the simulation box. Random numbers come from rng,
+NumPy's global generator by default as for the other layouts, so project seeds and layout caching apply.
+
+'''
+
+import numpy as np
+
+
+def _wrap_or_crop(xy, box, periodic):
+    if periodic:
+        return np.mod(xy, box)
+    inside = np.all((xy >= 0) & (xy < box), axis=1)
+    return xy[inside]
+
+
+def _parents(box, n_parents, margin, periodic, rng):
+    # without periodic boundaries, parents just outside the box contribute offspring too (no edge thinning)
+    lo = np.zeros(2) if periodic else -np.full(2, margin)
+    hi = box if periodic else box + margin
+    area_scale = np.prod(hi - lo) / np.prod(box)
+    count = rng.poisson(n_parents * area_scale)
+    return lo + rng.uniform(0, 1, (count, 2)) * (hi - lo)
+
+
+def _offspring(parents, mean_offspring, rng):
+    counts = rng.poisson(mean_offspring, len(parents))
+    return np.repeat(parents, counts, axis=0)
+
+
+def thomas(box, n_parents, mean_offspring, sigma, periodic=True, rng=None):
+    """
+    Thomas cluster process: Poisson parents, each with a Poisson number of offspring displaced by an isotropic normal
+    distribution. Only the offspring are returned.
+
+    :param n_parents: Expected number of clusters in the box
+    :param mean_offspring: Expected cells per cluster
+    :param sigma: Standard deviation of offspring displacement along each axis
+    """
+    rng = np.random if rng is None else rng
+    box = np.asarray(box, dtype=float)
+    centres = _offspring(_parents(box, n_parents, 4 * sigma, periodic, rng), mean_offspring, rng)
+    xy = centres + rng.normal(0, sigma, centres.shape)
+    return _wrap_or_crop(xy, box, periodic)
+
+
+def matern(box, n_parents, mean_offspring, radius, periodic=True, rng=None):
+    """
+    Matérn cluster process: Poisson parents, each with a Poisson number of offspring uniform in a disc around it.
+
+    :param radius: Cluster radius
+    """
+    rng = np.random if rng is None else rng
+    box = np.asarray(box, dtype=float)
+    centres = _offspring(_parents(box, n_parents, radius, periodic, rng), mean_offspring, rng)
+    r = radius * np.sqrt(rng.uniform(0, 1, len(centres)))
+    angle = rng.uniform(0, 2 * np.pi, len(centres))
+    xy = centres + np.column_stack([r * np.cos(angle), r * np.sin(angle)])
+    return _wrap_or_crop(xy, box, periodic)
+
+
+def inhomogeneous(box, density, n_expected, rng=None):
+    """
+    Inhomogeneous Poisson process following a density raster, by thinning a homogeneous process.
+
+    :param density: 2D array of non-negative relative densities stretched over the box, row 0 at the top (high y) as in
+        image layouts
+    :param n_expected: Expected number of points in the box
+    """
+    rng = np.random if rng is None else rng
+    box = np.asarray(box, dtype=float)
+    density = np.asarray(density, dtype=float)
+    if density.ndim != 2 or (density < 0).any():
+        raise ValueError('Density must be a 2D array of non-negative values')
+    peak = density.max()
+    if peak <= 0:
+        return np.empty((0, 2))
+    # the homogeneous process runs at the peak density, keeping points in proportion to the local density
+    count = rng.poisson(n_expected * peak / density.mean())
+    xy = rng.uniform(0, 1, (count, 2)) * box
+    height, width = density.shape
+    col = np.minimum((xy[:, 0] / box[0] * width).astype(int), width - 1)
+    row = height - 1 - np.minimum((xy[:, 1] / box[1] * height).astype(int), height - 1)
+    keep = rng.uniform(0, peak, count) < density[row, col]
+    return xy[keep]
@@ -0,0 +1,221 @@
+'''
+
+Uniform grid (spatial hash) neighbor search and overlap removal for initial cell layouts.
+
+Cells are spheres resting on the substratum: x and y are free, z is fixed at the cell diameter, as in the atom.in files
+NufebProject writes. All lengths are in meters.
+
+'''
+
+import numpy as np
+from dataclasses import dataclass
+
+# the (0, 0) cell and half of its neighbors, so each pair of cells is visited once
+HALF_STENCIL = [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]
+
+
+class SpatialHash:
+    """
+    Bin points into square cells at least as large as the largest interaction distance.
+
+    Candidate pairs only come from the same or adjacent cells, so finding overlaps costs O(n) instead of O(n^2).
+    """
+
+    def __init__(self, xy, cell_size, box, periodic=True):
+        self.xy = np.asarray(xy, dtype=float)
+        self.box = np.asarray(box, dtype=float)
+        self.periodic = periodic
+        self.n_cells = np.maximum((self.box // cell_size).astype(int), 1)
+        self.cell_size = self.box / self.n_cells
+        coords = np.floor(self.xy / self.cell_size).astype(int)
+        self.coords = np.clip(coords, 0, self.n_cells - 1)
+        keys = self.coords[:, 0] * self.n_cells[1] + self.coords[:, 1]
+        self.order = np.argsort(keys, kind='stable')
+        n_keys = self.n_cells[0] * self.n_cells[1]
+        self.counts = np.bincount(keys, minlength=n_keys)
+        self.starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+
+    def candidate_pairs(self):
+        """Index pairs (i, j), i != j, of points in the same or adjacent cells, each pair once."""
+        n = len(self.xy)
+        all_i, all_j = [np.empty(0, dtype=int)], [np.empty(0, dtype=int)]
+        for dx, dy in HALF_STENCIL:
+            cx = self.coords[:, 0] + dx
+            cy = self.coords[:, 1] + dy
+            if self.periodic:
+                cx %= self.n_cells[0]
+                cy %= self.n_cells[1]
+                valid = np.ones(n, dtype=bool)
+            else:
+                valid = (cx >= 0) & (cx < self.n_cells[0]) & (cy >= 0) & (cy < self.n_cells[1])
+            points = np.nonzero(valid)[0]
+            keys = cx[valid] * self.n_cells[1] + cy[valid]
+            counts = self.counts[keys]
+            i = np.repeat(points, counts)
+            # position within each neighboring cell's run of sorted points
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            j = self.order[np.repeat(self.starts[keys], counts) + offsets]
+            if (dx, dy) == (0, 0):
+                # both orders of every pair within a cell turn up, keep one
+                keep = i < j
+                i, j = i[keep], j[keep]
+            all_i.append(i)
+            all_j.append(j)
+        i = np.concatenate(all_i)
+        j = np.concatenate(all_j)
+        keep = i != j
+        i, j = np.minimum(i[keep], j[keep]), np.maximum(i[keep], j[keep])
+        if self.periodic and (self.n_cells < 3).any():
+            # small periodic grids make some neighbor cells coincide, visit their pairs once
+            pairs = np.unique(i.astype(np.int64) * n + j)
+            return pairs // n, pairs % n
+        return i, j
+
+
+def separation(xy, box, i, j, periodic=True):
+    delta = xy[j] - xy[i]
+    if periodic:
+        delta -= box * np.round(delta / box)
+    return delta
+
+
+def overlapping_pairs(xy, diameters, box, periodic=True, tolerance=0.0):
+    """
+    Pairs of cells closer than the sum of their radii.
+
+    :param xy: (n, 2) positions
+    :param diameters: (n,) diameters, cells sit at z = diameter
+    :param box: x and y lengths of the simulation box
+    :param periodic: Whether x and y wrap around
+    :param tolerance: Overlaps up to this distance are ignored
+    :return: i, j, overlap distance and the (n_pairs, 2) xy separation vector from i to j
+    """
+    xy = np.asarray(xy, dtype=float)
+    diameters = np.asarray(diameters, dtype=float)
+    box = np.asarray(box, dtype=float)
+    if len(xy) < 2:
+        empty = np.empty(0, dtype=int)
+        return empty, empty, np.empty(0), np.empty((0, 2))
+    grid = SpatialHash(xy, diameters.max(), box, periodic)
+    i, j = grid.candidate_pairs()
+    delta = separation(xy, box, i, j, periodic)
+    dz = diameters[j] - diameters[i]
+    distance = np.sqrt((delta ** 2).sum(axis=1) + dz ** 2)
+    overlap = (diameters[i] + diameters[j]) / 2 - distance
+    hit = overlap > tolerance
+    return i[hit], j[hit], overlap[hit], delta[hit]
+
+
+def thin(xy, min_distance, box, periodic=True, groups=None):
+    """
+    Drop points closer than min_distance to an earlier point that is kept, as if points were accepted one at a time in
+    order.
+
+    :param xy: (n, 2) positions, earlier points have priority
+    :param groups: Optional (n,) labels, points with the same label are never in conflict with each other
+    :return: (n,) boolean mask of the points kept
+    """
+    xy = np.asarray(xy, dtype=float)
+    box = np.asarray(box, dtype=float)
+    n = len(xy)
+    alive = np.ones(n, dtype=bool)
+    if n < 2 or min_distance <= 0:
+        return alive
+    grid = SpatialHash(xy, min_distance, box, periodic)
+    i, j = grid.candidate_pairs()
+    delta = separation(xy, box, i, j, periodic)
+    close = (delta ** 2).sum(axis=1) < min_distance ** 2
+    if groups is not None:
+        groups = np.asarray(groups)
+        close &= groups[i] != groups[j]
+    i, j = i[close], j[close]
+    if not len(i):
+        return alive
+    # conflicts grouped by their later point (i < j), swept in index order: by the time a point is reached, all of its
+    # earlier conflicts are settled, so one pass gives the sequential result however long the chains of conflicts are
+    order = np.argsort(j, kind='stable')
+    earlier = i[order].tolist()
+    later, starts = np.unique(j[order], return_index=True)
+    ends = np.append(starts[1:], len(earlier))
+    kept = bytearray(b'\x01') * n
+    for point, start, end in zip(later.tolist(), starts.tolist(), ends.tolist()):
+        for other in earlier[start:end]:
+            if kept[other]:
+                kept[point] = 0
+                break
+    return np.frombuffer(bytes(kept), dtype=bool).copy()
+
+
+@dataclass
+class RelaxationReport:
+    method: str
+    iterations: int
+    initial_overlaps: int
+    residual_overlaps: int
+    max_residual_overlap: float
+    resampled: int
+    mean_displacement: float
+
+
+def _wrap(xy, box, periodic):
+    if periodic:
+        return np.mod(xy, box)
+    return np.clip(xy, 0, np.nextafter(box, 0))
+
+
+def relax(xy, diameters, box, periodic=True, method='push', tolerance=0.01, max_iterations=200, rng=None):
+    """
+    Move cells apart until no pair overlaps by more than tolerance times the smaller diameter.
+
+    'push' moves both cells of every overlapping pair apart along the line between them, half the overlap each, and
+    repeats. 'resample' redraws one cell of every overlapping pair uniformly in the box until none overlap.
+
+    :return: Relaxed positions and a RelaxationReport
+    """
+    if method not in ('push', 'resample'):
+        raise ValueError(f'Unknown relaxation method: {method}. Must be push or resample.')
+    rng = np.random if rng is None else rng
+    start = _wrap(np.array(xy, dtype=float), np.asarray(box, dtype=float), periodic)
+    xy = start.copy()
+    diameters = np.asarray(diameters, dtype=float)
+    box = np.asarray(box, dtype=float)
+    # judged against the smallest cell, a looser check could leave small cells buried in large ones
+    allowed = tolerance * (diameters.min() if len(diameters) else 0)
+
+    i, j, overlap, delta = overlapping_pairs(xy, diameters, box, periodic, allowed)
+    initial = len(i)
+    resampled = 0
+    iterations = 0
+    while len(i) and iterations < max_iterations:
+        iterations += 1
+        if method == 'push':
+            planar = np.sqrt((delta ** 2).sum(axis=1))
+            coincident = planar < 1e-12
+            if coincident.any():
+                angle = rng.uniform(0, 2 * np.pi, coincident.sum())
+                delta[coincident] = np.stack([np.cos(angle), np.sin(angle)], axis=1)
+                planar[coincident] = 1.0
+            # slightly more than half the overlap each, so pairs don't creep towards the tolerance
+            shift = delta / planar[:, None] * (overlap[:, None] / 2 * 1.05)
+            moves = np.zeros_like(xy)
+            np.add.at(moves, i, -shift)
+            np.add.at(moves, j, shift)
+            xy = _wrap(xy + moves, box, periodic)
+        else:
+            redraw = np.unique(j)
+            xy[redraw] = rng.uniform(0, 1, (len(redraw), 2)) * box
+            resampled += len(redraw)
+        i, j, overlap, delta = overlapping_pairs(xy, diameters, box, periodic, allowed)
+
+    displacement = xy - start
+    if periodic:
+        displacement -= box * np.round(displacement / box)
+    report = RelaxationReport(method=method,
+                              iterations=iterations,
+                              initial_overlaps=initial,
+                              residual_overlaps=len(i),
+                              max_residual_overlap=float(overlap.max()) if len(i) else 0.0,
+                              resampled=resampled,
+                              mean_displacement=float(np.sqrt((displacement ** 2).sum(axis=1)).mean())
+                              if len(xy) else 0.0)
+    return xy, report
@@ -0,0 +1,113 @@
+import os
+import sys
+from nufebmgr.NufebProject import NufebProject
+from nufebmgr.CaseCache import CaseCache
+from nufebmgr.RunManager import RunOrchestrator, DONE_TOKEN
+
+STUB = '''
+import os
+open('attempts', 'a').write('x')
+os.makedirs('hdf5', exist_ok=True)
+open('hdf5/dump.h5', 'w').write('output')
+open('done.tkn', 'w').close()
+'''
+
+
+def _project(seed=1701, noise=0):
+    prj = NufebProject(seed=seed)
+    prj.set_box(x=50, y=50, z=50)
+    prj.add_taxon_by_template(name="fast", template="basic_heterotroph")
+    prj.add_taxon_by_template(name="slow", template="slow_heterotroph")
+    prj.layout_uniform(nbugs=30)
+    prj.set_composition({'fast': '50', 'slow': '50'})
+    prj.distribute_even_strips("horizontal", noise=noise)
+    return prj
+
+
+def test_config_hash():
+    assert _project().config_hash() == _project().config_hash()
+    assert _project().config_hash() != _project(seed=2).config_hash()
+    prj = _project()
+    before = prj.config_hash()
+    prj.set_runtime(10)
+    assert prj.config_hash() != before
+
+
+def test_write_case_uses_cache(tmp_path):
+    cache = CaseCache(str(tmp_path / 'cache'))
+    first = _project().write_case(str(tmp_path / 'a'), cache=cache)
+    assert cache.has_case(first.config_hash)
+
+    prj = _project()
+    second = prj.write_case(str(tmp_path / 'b'), cache=str(tmp_path / 'cache'))
+    assert second == first
+    # linked, not regenerated
+    assert os.path.samefile(tmp_path / 'a' / 'atom.in', tmp_path / 'b' / 'atom.in')
+    assert all(bug.taxon_name == 'Unassigned' for bug in prj.bug_locs)
+
+
+def test_completed_runs_are_reused(tmp_path):
+    stub = tmp_path / 'stub.py'
+    stub.write_text(STUB)
+    cache = CaseCache(str(tmp_path / 'cache'))
+    for name in ('a', 'b'):
+        _project().write_case(str(tmp_path / name), cache=cache)
+
+    orchestrator = RunOrchestrator([sys.executable, str(stub)], cores=1, poll_interval=0.01, cache=cache)
+    orchestrator.add_case(str(tmp_path / 'a'))
+    orchestrator.add_case(str(tmp_path / 'b'))
+    orchestrator.run()
+    assert [case.status for case in orchestrator.cases] == ['done', 'cached']
+    assert (tmp_path / 'b' / DONE_TOKEN).exists()
+    assert (tmp_path / 'b' / 'hdf5' / 'dump.h5').read_text() == 'output'
+    assert (tmp_path / 'b' / 'attempts').read_text() == 'x'
+
+    manifest = _project().write_case(str(tmp_path / 'c'), cache=cache, reuse_runs=True)
+    assert cache.has_run(manifest.config_hash)
+    assert (tmp_path / 'c' / DONE_TOKEN).exists()
+
+
+def test_cached_runs_are_isolated_from_case_directories(tmp_path):
+    stub = tmp_path / 'stub.py'
+    stub.write_text(STUB)
+    broken = tmp_path / 'broken.py'
+    broken.write_text(STUB.replace("'output'", "'BROKEN'"))
+    cache = CaseCache(str(tmp_path / 'cache'))
+    manifest = _project().write_case(str(tmp_path / 'a'), cache=cache)
+    orchestrator = RunOrchestrator([sys.executable, str(stub)], cores=1, poll_interval=0.01, cache=cache)
+    orchestrator.add_case(str(tmp_path / 'a'))
+    orchestrator.run()
+
+    # rerunning the case directory without the cache rewrites its outputs, not the cached ones
+    rerun = RunOrchestrator([sys.executable, str(broken)], cores=1, poll_interval=0.01, skip_done=False)
+    rerun.add_case(str(tmp_path / 'a'))
+    rerun.run()
+    assert (tmp_path / 'a' / 'hdf5' / 'dump.h5').read_text() == 'BROKEN'
+    cached = os.path.join(cache.run_path(manifest.config_hash), 'hdf5', 'dump.h5')
+    assert open(cached).read() == 'output'
+
+    # regenerating a fetched case replaces the shared inputs instead of writing through to the cache
+    _project().write_case(str(tmp_path / 'b'), cache=cache, reuse_runs=True)
+    assert (tmp_path / 'b' / 'hdf5' / 'dump.h5').read_text() == 'output'
+    assert not os.path.samefile(tmp_path / 'b' / 'hdf5' / 'dump.h5', cached)
+    cached_atom_in = os.path.join(cache.case_path(manifest.config_hash), 'atom.in')
+    before = open(cached_atom_in).read()
+    _project(seed=2).write_case(str(tmp_path / 'b'))
+    assert open(cached_atom_in).read() == before
+
+
+def test_rerun_ignores_cached_runs(tmp_path):
+    stub = tmp_path / 'stub.py'
+    stub.write_text(STUB)
+    cache = CaseCache(str(tmp_path / 'cache'))
+    for name in ('a', 'b'):
+        _project().write_case(str(tmp_path / name), cache=cache)
+    first = RunOrchestrator([sys.executable, str(stub)], cores=1, poll_interval=0.01, cache=cache)
+    first.add_case(str(tmp_path / 'a'))
+    first.run()
+
+    rerun = RunOrchestrator([sys.executable, str(stub)], cores=1, poll_interval=0.01, cache=cache, skip_done=False)
+    rerun.add_case(str(tmp_path / 'b'))
+    rerun.run()
+    assert [case.status for case in rerun.cases] == ['done']
+    assert (tmp_path / 'b' / 'attempts').read_text() == 'x'
@@ -1,6 +1,9 @@
+import h5py
 import pytest
 import polars as pl
-from nufebmgr.DumpTools import DumpFile
+from nufebmgr.DumpTools import DumpFile, VtuDumpFile
+from nufebmgr.Manifest import CaseManifest
+from nufebmgr.SyntheticDump import SyntheticDump
 import pyarrow.parquet as pq
 from pyarrow import fs
 import numpy as np
@@ -111,3 +114,149 @@ def test_deaths_at_time():
 
 
 
+
+@pytest.fixture
+def synthetic_dump(tmp_path):
+    path = tmp_path / 'dump.h5'
+    SyntheticDump(n_initial=100, n_timesteps=10, n_types=3, growth_rate=0.1, death_rate=0.05).write(str(path))
+    return str(path)
+
+def test_array_accessors(synthetic_dump):
+    with h5py.File(synthetic_dump, 'r') as f:
+        expected_x = f['x/5'][()]
+        expected_type = f['type/5'][()]
+    with DumpFile(synthetic_dump) as dump:
+        n = dump.rows_at_time(5)
+        assert n == len(expected_x)
+        npt.assert_equal(dump.array_at_time('x', 5), expected_x)
+        npt.assert_equal(dump.types_at_time(5), expected_type)
+
+        fields = dump.arrays_at_time(['x', 'type'], 5, rows=(10, 20))
+        npt.assert_equal(fields['x'], expected_x[10:20])
+        npt.assert_equal(fields['type'], expected_type[10:20])
+
+        buffer = np.zeros(1000)
+        result = dump.array_at_time('x', 5, out=buffer)
+        assert np.shares_memory(result, buffer)
+        npt.assert_equal(result, expected_x)
+
+        with pytest.raises(ValueError):
+            dump.array_at_time('x', 5, out=np.zeros(3))
+        with pytest.raises(KeyError):
+            dump.array_at_time('x', 99)
+
+def test_births_deaths_at_time_synthetic(synthetic_dump):
+    with DumpFile(synthetic_dump) as dump:
+        births = dump.births(as_df=True)
+        deaths = dump.deaths(as_df=True)
+        for t in range(1, 10):
+            npt.assert_equal(np.sort(dump.births_at_time(t)),
+                             np.sort(births.filter(pl.col('timestep') == t)['id'].to_numpy()))
+            npt.assert_equal(np.sort(dump.deaths_at_time(t)),
+                             np.sort(deaths.filter(pl.col('timestep') == t)['id'].to_numpy()))
+        first = dump.df['timestep'].min()
+        with pytest.raises(KeyError, match='previous timestep'):
+            dump.births_at_time(first)
+        with pytest.raises(KeyError, match='previous timestep'):
+            dump.deaths_at_time(first)
+
+
+@pytest.fixture(params=['raw', 'base64'])
+def vtu_and_h5(tmp_path, request):
+    synthetic = SyntheticDump(n_initial=40, n_timesteps=6, n_types=3, growth_rate=0.2, death_rate=0.05, seed=11)
+    synthetic.write(str(tmp_path / 'dump.h5'))
+    synthetic.write_vtu(str(tmp_path / 'vtk'), encoding=request.param)
+    return str(tmp_path / 'dump.h5'), str(tmp_path / 'vtk')
+
+
+def test_vtu_dump_matches_hdf5(vtu_and_h5):
+    h5_path, vtk_dir = vtu_and_h5
+    with DumpFile(h5_path) as h5, VtuDumpFile(vtk_dir, workers=1) as vtu:
+        assert vtu.timesteps() == h5.timesteps() == list(range(6))
+        assert vtu.population_abs().equals(h5.population_abs())
+        assert vtu.births(as_df=True).equals(h5.births(as_df=True))
+        assert vtu.deaths(as_df=True).equals(h5.deaths(as_df=True))
+        npt.assert_equal(vtu.births_at_time(3), h5.births_at_time(3))
+        npt.assert_allclose(vtu.array_at_time('radius', 5), h5.array_at_time('radius', 5))
+        npt.assert_allclose(vtu.array_at_time('x', 2, rows=(3, 9)), h5.array_at_time('x', 2, rows=(3, 9)))
+        with pytest.raises(KeyError):
+            vtu.array_at_time('id', 6)
+
+
+def test_vtu_dump_process_pool_and_consolidate(vtu_and_h5, tmp_path):
+    _, vtk_dir = vtu_and_h5
+    with VtuDumpFile(vtk_dir, workers=2) as vtu:
+        parsed = vtu.table
+        path = vtu.consolidate(str(tmp_path / 'particles.parquet'))
+    with VtuDumpFile(path) as consolidated:
+        assert consolidated.table.equals(parsed)
+        assert consolidated.rows_at_time(0) == 40
+
+
+def test_manifest_taxa(tmp_path):
+    (tmp_path / 'hdf5').mkdir()
+    dump_path = str(tmp_path / 'hdf5' / 'dump.h5')
+    SyntheticDump(n_initial=60, n_timesteps=5, n_types=3, growth_rate=0.2, death_rate=0.05).write(dump_path)
+    CaseManifest(types={'fast': 1, 'slow': 2, 'dead': 3}, taxa=['fast', 'slow']).write(str(tmp_path))
+
+    with DumpFile(dump_path) as dump:
+        assert dump.manifest.types['slow'] == 2
+        births = dump.births(by_taxon=True)
+        grouped = dump.births(groups={'fast': [1], 'slow': [2], 'dead': [3]})
+        for taxon, frame in grouped.items():
+            assert births.filter(pl.col('taxon') == taxon).drop('taxon').equals(frame)
+        population = dump.population_by_taxon()
+        assert population.filter(pl.col('timestep') == 0)['count'].sum() == 60
+        assert set(population['taxon']) == {'fast', 'slow', 'dead'}
+
+    with DumpFile(dump_path, manifest=CaseManifest(types={'a': 1}, taxa=['a'])) as dump:
+        assert dump.with_taxa(dump.df)['taxon'].null_count() > 0
+
+    other = tmp_path / 'elsewhere.h5'
+    SyntheticDump(n_initial=5, n_timesteps=2).write(str(other))
+    (tmp_path / 'manifest.json').unlink()
+    with DumpFile(str(other)) as dump:
+        assert dump.manifest is None
+        with pytest.raises(ValueError):
+            dump.births(by_taxon=True)
+
+
+def test_biomass(tmp_path):
+    synthetic = SyntheticDump(n_initial=80, n_timesteps=8, n_types=3, growth_rate=0.2, death_rate=0.05, seed=3)
+    (tmp_path / 'hdf5').mkdir()
+    dump_path = str(tmp_path / 'hdf5' / 'dump.h5')
+    synthetic.write(dump_path)
+    synthetic.write_vtu(str(tmp_path / 'vtk'))
+
+    with DumpFile(dump_path) as dump:
+        # without a manifest densities are by type, a template name takes the template's density
+        biomass = dump.biomass(densities={1: 100, 2: 'basic_heterotroph'}, chunk_rows=150)
+        assert biomass.columns == ['timestep', 'type', 'count', 'volume', 'mass']
+        for t in dump.timesteps():
+            types, radius = dump.array_at_time('type', t), dump.array_at_time('radius', t)
+            rows = biomass.filter(pl.col('timestep') == t).sort('type')
+            assert rows['type'].to_list() == sorted(set(types.tolist()))
+            npt.assert_allclose(rows['volume'], [(4 / 3 * np.pi * radius[types == k] ** 3).sum() for k in rows['type']])
+            assert rows['count'].sum() == len(types)
+        mass = biomass.filter(pl.col('type') < 3)
+        npt.assert_allclose(mass['mass'], mass['volume'] * np.where(mass['type'] == 1, 100, 150))
+        assert biomass.filter(pl.col('type') == 3)['mass'].null_count() == biomass.filter(pl.col('type') == 3).height
+
+        streamed = list(dump.biomass(timesteps=[2, 3], stream=True, chunk_rows=1))
+        assert len(streamed) == 2
+        assert pl.concat(streamed).drop('mass').equals(biomass.filter(pl.col('timestep').is_in([2, 3])).drop('mass'))
+        with pytest.raises(ValueError):
+            dump.biomass(densities={'fast': 150})
+
+    CaseManifest(types={'fast': 1, 'slow': 2, 'dead': 3}, taxa=['fast', 'slow'],
+                 properties={'fast': {'density': 150}, 'slow': {'density': 200}}).write(str(tmp_path))
+    with DumpFile(dump_path) as h5, VtuDumpFile(str(tmp_path / 'vtk'), workers=1) as vtu:
+        biomass = h5.biomass(densities={'slow': 100})
+        assert biomass.columns == ['timestep', 'type', 'count', 'volume', 'mass', 'taxon']
+        slow = biomass.filter(pl.col('taxon') == 'slow')
+        npt.assert_allclose(slow['mass'], slow['volume'] * 100)
+        from_vtu = vtu.biomass(densities={'slow': 100}, chunk_rows=200)
+        assert from_vtu.drop('volume', 'mass').equals(biomass.drop('volume', 'mass'))
+        npt.assert_allclose(from_vtu['mass'].fill_null(-1), biomass['mass'].fill_null(-1))
+        npt.assert_allclose(vtu.biomass(timesteps=[5, 1])['volume'], pl.concat([
+            biomass.filter(pl.col('timestep') == 5), biomass.filter(pl.col('timestep') == 1)])['volume'])
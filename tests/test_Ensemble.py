@@ -0,0 +1,107 @@
+import numpy as np
+import numpy.testing as npt
+import polars as pl
+import pytest
+from nufebmgr.Ensemble import EnsembleAggregator, TDigest, run_series
+from nufebmgr.DumpTools import DumpFile
+from nufebmgr.Manifest import CaseManifest
+from nufebmgr.SyntheticDump import SyntheticDump
+
+
+def _runs(n_runs, n_timesteps=30, seed=0):
+    rng = np.random.default_rng(seed)
+    runs = rng.poisson(50, (n_runs, n_timesteps, 2)).astype(float)
+    frames = [pl.DataFrame({'timestep': np.repeat(np.arange(n_timesteps), 2),
+                            'taxon': ['a', 'b'] * n_timesteps,
+                            'population': run.ravel()}) for run in runs]
+    return runs, frames
+
+
+def _stat(summary, taxon, column):
+    return summary.filter(pl.col('taxon') == taxon).sort('timestep')[column].to_numpy()
+
+
+@pytest.mark.parametrize('n_runs,compression', [(20, 100), (250, 25)])
+def test_matches_all_at_once(n_runs, compression):
+    runs, frames = _runs(n_runs)
+    ensemble = EnsembleAggregator(values=['population'], compression=compression)
+    # runs may list their rows in any order
+    ensemble.add_runs(frame.reverse() if k % 2 else frame for k, frame in enumerate(frames))
+    summary = ensemble.summary()
+    assert summary.height == 60
+    assert (summary['n'] == n_runs).all()
+    for k, taxon in enumerate('ab'):
+        npt.assert_allclose(_stat(summary, taxon, 'mean'), runs[:, :, k].mean(axis=0))
+        npt.assert_allclose(_stat(summary, taxon, 'var'), runs[:, :, k].var(axis=0, ddof=1))
+        median = np.median(runs[:, :, k], axis=0)
+        if n_runs <= compression:
+            npt.assert_allclose(_stat(summary, taxon, 'p50'), median)
+        else:
+            # digest estimates, within a couple of counts of the exact median
+            assert np.abs(_stat(summary, taxon, 'p50') - median).max() <= 2
+
+
+def test_ragged_runs():
+    ensemble = EnsembleAggregator(values=['population'])
+    ensemble.add(pl.DataFrame({'timestep': [0, 1, 2], 'population': [1, 2, 3]}))
+    ensemble.add(pl.DataFrame({'timestep': [0, 1], 'population': [3, 4]}))
+    summary = ensemble.summary()
+    assert summary['n'].to_list() == [2, 2, 1]
+    assert summary['mean'].to_list() == [2, 3, 3]
+    assert summary['var'][2] is None
+    with pytest.raises(ValueError):
+        ensemble.add(pl.DataFrame({'timestep': [0, 0], 'population': [1, 2]}))
+    with pytest.raises(ValueError):
+        ensemble.add(pl.DataFrame({'step': [0], 'population': [1]}))
+
+
+def test_null_keys():
+    # types without a taxon in the manifest have a null taxon, they are still one key across runs
+    ensemble = EnsembleAggregator(values=['population'])
+    for population in (2, 4):
+        ensemble.add(pl.DataFrame({'timestep': [0, 0], 'taxon': ['a', None], 'population': [1, population]}))
+    summary = ensemble.summary()
+    assert summary.schema['timestep'] == pl.Int64
+    assert summary['taxon'].to_list() == [None, 'a']
+    assert summary['mean'].to_list() == [3, 1]
+
+
+def test_tdigest():
+    rng = np.random.default_rng(4)
+    values = rng.lognormal(size=20000)
+    digest = TDigest(100)
+    for batch in np.array_split(values, 50):
+        digest.update(batch)
+    assert len(digest.means) < 200
+    assert digest.count == 20000
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        assert digest.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.02)
+    assert digest.quantile(0) == values.min()
+    assert digest.quantile(1) == values.max()
+
+
+def test_dump_replicates(tmp_path):
+    CaseManifest(types={'fast': 1, 'slow': 2, 'dead': 3}, taxa=['fast', 'slow']).write(str(tmp_path))
+    paths = []
+    for seed in range(4):
+        path = str(tmp_path / f'dump{seed}.h5')
+        SyntheticDump(n_initial=40, n_timesteps=5, n_types=3, growth_rate=0.2, death_rate=0.05, seed=seed).write(path)
+        paths.append(path)
+
+    series = []
+    for path in paths:
+        with DumpFile(path) as dump:
+            series.append(run_series(dump))
+            population = dump.population_by_taxon()
+        joined = series[-1].join(population, on=['timestep', 'taxon'])
+        assert (joined['population'] == joined['count']).all()
+    assert series[0].filter(pl.col('timestep') == 0)['births'].sum() == 0
+
+    ensemble = EnsembleAggregator()
+    ensemble.add_dumps(paths, workers=2)
+    summary = ensemble.summary()
+    assert summary.columns == ['timestep', 'taxon', 'value', 'n', 'mean', 'var', 'std', 'p5', 'p50', 'p95']
+    assert summary.height == 5 * 3 * 3
+    expected = pl.concat(series).group_by('timestep', 'taxon').agg(pl.col('deaths').mean())
+    deaths = summary.filter(pl.col('value') == 'deaths').join(expected, on=['timestep', 'taxon'])
+    npt.assert_allclose(deaths['mean'], deaths['deaths'])
@@ -3,32 +3,152 @@ from nufebmgr.InputScriptBuilder import InputScriptBuilder
 from nufebmgr.SimulationBox import SimulationBox
 
 def test_grid_cell_size_picker():
+    # the cheapest (coarsest) spacing within 1-2.5x the cell diameter that divides the box, in microns
     isb = InputScriptBuilder()
     s = SimulationBox() # 100 x 100 x 100 default
     grid_size = isb._pick_grid_size(s)
-    assert grid_size == pytest.approx(2e-6)
+    assert grid_size == pytest.approx(2.5)
 
     s = SimulationBox(xlen=90,ylen=90,zlen=60)
     grid_size = isb._pick_grid_size(s)
-    assert grid_size == pytest.approx(1.5e-6)
+    assert grid_size == pytest.approx(2.5)
 
     s = SimulationBox(xlen=140,ylen=126,zlen=56)
     grid_size = isb._pick_grid_size(s)
-    assert grid_size == pytest.approx(2e-6)
+    assert grid_size == pytest.approx(2)
 
     for expected in [1.5,2.0,2.5]:
         _test_a_grid(expected)
 
-    # with pytest.raises(ValueError):
-    #     s = SimulationBox(xlen=141,ylen=126,zlen=56)
-    #     grid_size = isb._pick_grid_size(s)
-
     s = SimulationBox(xlen=141,ylen=126,zlen=56)
     grid_size = isb._pick_grid_size(s)
-    assert grid_size == pytest.approx(1e-6)
+    assert grid_size == pytest.approx(1)
+
+    # smaller cells allow (and need) a finer grid
+    s = SimulationBox(xlen=100,ylen=100,zlen=100)
+    assert isb._pick_grid_size(s, cell_diameter=0.8e-6) == pytest.approx(2)
+
+    with pytest.raises(ValueError):
+        isb._pick_grid_size(SimulationBox(xlen=100.5,ylen=100,zlen=100))
 
 def _test_a_grid(expected):
     isb = InputScriptBuilder()
     s = SimulationBox(xlen=expected*10, ylen=expected*9, zlen=expected*4)
     grid_size = isb._pick_grid_size(s)
-    assert grid_size == pytest.approx(expected*1e-6)
+    assert grid_size == pytest.approx(expected)
+
+def test_grid_choice_cost():
+    isb = InputScriptBuilder()
+    picker = isb._grid_picker(SimulationBox(xlen=500, ylen=500, zlen=100), n_substrates=4)
+    choice = picker.pick()
+    assert (choice.nx, choice.ny, choice.nz) == (200, 200, 40)
+    assert choice.cost == 200 * 200 * 40 * 4
+    assert choice.updates_per_step == choice.cost * 5000
+
+    candidates = picker.candidates()
+    assert candidates[0] == choice
+    assert [c.cost for c in candidates] == sorted(c.cost for c in candidates)
+
+    # below about a micron the explicit diffusion step is unstable at diffdt 1e-4
+    assert picker.is_stable(1.0)
+    assert not picker.is_stable(0.5)
+
+def test_substrate_grid_written():
+    isb = InputScriptBuilder()
+    isb.build_substrate_grid({}, SimulationBox(xlen=90, ylen=90, zlen=60))
+    assert isb.grid_choice.spacing == pytest.approx(2.5)
+    assert 'grid_style nufeb/chemostat 0 2.5e-6' in isb.generate()
+
+    isb = InputScriptBuilder()
+    isb.build_substrate_grid({}, SimulationBox(xlen=90, ylen=90, zlen=60), forced_size=5)
+    assert 'grid_style nufeb/chemostat 0 5e-6' in isb.generate()
+    with pytest.raises(ValueError):
+        isb.build_substrate_grid({}, SimulationBox(xlen=90, ylen=90, zlen=60), forced_size=7)
+
+def test_processor_grid_follows_aspect_ratio():
+    isb = InputScriptBuilder()
+    assert isb._pick_processor_grid(SimulationBox(), 4) == (2, 2, 1)
+    assert isb._pick_processor_grid(SimulationBox(xlen=400, ylen=100, zlen=100), 8) == (4, 2, 1)
+    assert isb._pick_processor_grid(SimulationBox(xlen=100, ylen=400, zlen=100), 4) == (1, 4, 1)
+    assert isb._pick_processor_grid(SimulationBox(), 8, zranks=2) == (2, 2, 2)
+
+    with pytest.raises(ValueError):
+        isb._pick_processor_grid(SimulationBox(), 6, zranks=4)
+
+def test_processors_and_balance_emitted():
+    isb = InputScriptBuilder()
+    isb.build_processors(SimulationBox(xlen=400, ylen=100, zlen=100), 8)
+    isb.add_load_balancing(threshold=1.2, every=500, style='shift')
+    script = isb.generate()
+    assert 'processors\t\t4 2 1' in script
+    assert 'balance\t\t1.2 shift xy 10 1.05' in script
+    assert 'fix\t\tbalance all balance 500 1.2 shift xy 10 1.05' in script
+    assert script.index('read_data') < script.index('balance')
+
+    # builders no longer share the default configuration
+    assert 'balance' not in InputScriptBuilder().generate()
+
+def test_rcb_balance_uses_tiled_comm():
+    isb = InputScriptBuilder()
+    isb.add_load_balancing(style='rcb')
+    script = isb.generate()
+    assert 'comm_style\t\ttiled' in script
+    assert 'balance\t\t1.1 rcb' in script
+    assert 'fix\t\tbalance' not in script
+    assert script.index('comm_style') < script.index('read_data')
+
+def test_neighbor_derived_from_taxa():
+    taxa = {'big': {'diameter': 1e-6, 'division_strategy': {'name': 'divide_coccus', 'diameter': '1.36e-6'}},
+            'small': {'diameter': 0.8e-6, 'division_strategy': {'name': 'divide_coccus', 'diameter': '1.0e-6'}}}
+    isb = InputScriptBuilder()
+    isb.build_neighbor(taxa)
+    script = isb.generate()
+    # growth from 0.8 to 1.36 microns plus twice the 1e-7 nve/limit displacement
+    assert 'neighbor 7.6e-07 bin' in script
+    assert 'neigh_modify every 1 delay 0 check no' in script
+    assert 'atom_modify\t\tmap array sort 10 1.06e-06' in script
+
+def test_neighbor_skin_matches_rebuild_policy():
+    taxa = {'big': {'diameter': 1e-6, 'division_strategy': {'name': 'divide_coccus', 'diameter': '1.36e-6'}}}
+    isb = InputScriptBuilder()
+    isb.build_neighbor(taxa, every=5)
+    script = isb.generate()
+    # the derived skin budgets growth plus movement over every steps, so lists must be rebuilt on that schedule
+    skin = float(script.split('\nneighbor ')[1].split()[0])
+    assert skin == pytest.approx(0.36e-6 + 2 * 1e-7 * 5, rel=1e-2)
+    assert 'neigh_modify every 5 delay 0 check no' in script
+    # movement-triggered rebuilds only with an explicit skin
+    with pytest.raises(ValueError):
+        InputScriptBuilder().build_neighbor(taxa, check='yes')
+    isb = InputScriptBuilder()
+    isb.build_neighbor(taxa, skin=3e-6, check='yes')
+    assert 'neigh_modify every 1 delay 0 check yes' in isb.generate()
+
+def test_neighbor_overrides():
+    isb = InputScriptBuilder()
+    isb.build_neighbor({}, skin=1e-6, every=2, delay=4, check='no', sort_every=100, sort_binsize=2e-6)
+    script = isb.generate()
+    assert 'neighbor 1e-06 bin' in script
+    assert 'neigh_modify every 2 delay 4 check no' in script
+    assert 'atom_modify\t\tmap array sort 100 2e-06' in script
+
+def test_restart_output():
+    isb = InputScriptBuilder()
+    isb.add_restart_output(100)
+    script = isb.generate()
+    assert 'shell mkdir restart' in script
+    assert 'restart 100 restart/restart.a restart/restart.b' in script
+
+    isb = InputScriptBuilder()
+    isb.add_restart_output(100, keep_all=True)
+    assert 'restart 100 restart/restart.*' in isb.generate()
+
+def test_read_restart():
+    isb = InputScriptBuilder()
+    isb.read_restart('restart/restart.b')
+    isb.build_run(500, upto=True)
+    script = isb.generate()
+    assert 'read_data' not in script
+    assert 'atom_style' not in script
+    assert 'read_restart\t\trestart/restart.b' in script
+    assert 'run\t\t500 upto' in script
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from nufebmgr.NufebProject import NufebProject
+from nufebmgr.LayoutCache import LayoutCache, layout_key
+
+
+def _case(cache=None, seed=1701):
+    prj = NufebProject(seed=seed)
+    prj.set_box(x=60, y=60, z=60)
+    if cache is not None:
+        prj.use_layout_cache(cache)
+    prj.layout_poisson(radius=3)
+    prj.add_taxon_by_template(name="fast", template="basic_heterotroph")
+    prj.add_taxon_by_template(name="slow", template="slow_heterotroph")
+    prj.set_composition({'fast': '30', 'slow': '70'})
+    prj.distribute_even_strips("vertical", noise=0.2)
+    atom_in, _ = prj.generate_case()
+    return atom_in
+
+
+def test_cached_layout_generates_identical_case():
+    cache = LayoutCache()
+    uncached = _case()
+    assert _case(cache) == uncached
+    assert (cache.hits, cache.misses) == (0, 1)
+    # the random state after the layout is restored on a hit, so taxa assignment and noise match too
+    assert _case(cache) == uncached
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert _case(cache, seed=7) != uncached
+    assert cache.misses == 2
+
+
+def test_lru_eviction():
+    cache = LayoutCache(max_entries=2)
+    state = np.random.RandomState(0).get_state()
+    keys = [layout_key((100, 100, 100), 'uniform', {'nbugs': n}, state) for n in range(3)]
+    for n, key in enumerate(keys):
+        cache.put(key, np.full((n + 1, 2), n), state)
+        cache.get(keys[0])
+    assert len(cache) == 2
+    assert keys[0] in cache and keys[1] not in cache
+    with pytest.raises(ValueError):
+        LayoutCache(max_entries=0)
+
+
+def test_disk_backed(tmp_path):
+    atom_in = _case(str(tmp_path))
+    fresh = LayoutCache(directory=str(tmp_path))
+    assert _case(fresh) == atom_in
+    assert fresh.hits == 1
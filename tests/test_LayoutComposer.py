@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+import numpy.testing as npt
+import pytest
+from nufebmgr.NufebProject import NufebProject
+from nufebmgr.LayoutComposer import LayoutComposer, rectangle, circle, from_mask, image_points
+from nufebmgr.spatialhash import thin
+
+
+def _greedy(xy, min_distance, box):
+    kept = []
+    for k, point in enumerate(xy):
+        delta = np.abs(point - xy[kept]) if kept else np.empty((0, 2))
+        delta = np.minimum(delta, box - delta)
+        if not kept or (np.sqrt((delta ** 2).sum(axis=1)) >= min_distance).all():
+            kept.append(k)
+    return kept
+
+
+def test_thin_matches_sequential_greedy():
+    rng = np.random.default_rng(3)
+    box = np.array([20e-6, 20e-6])
+    xy = rng.random((400, 2)) * box
+    keep = thin(xy, 1.5e-6, box)
+    npt.assert_equal(np.nonzero(keep)[0], _greedy(xy, 1.5e-6, box))
+
+
+def test_thin_dense_grid():
+    # every point conflicts with its grid neighbors, long chains of conflicts must still resolve as a sequential pass
+    side = 30
+    box = np.array([side * 1e-6, side * 1e-6])
+    xy = np.stack(np.meshgrid(np.arange(side), np.arange(side), indexing='ij'), axis=-1).reshape(-1, 2) * 1e-6
+    keep = thin(xy, 1.2e-6, box)
+    npt.assert_equal(np.nonzero(keep)[0], _greedy(xy, 1.2e-6, box))
+    assert keep.sum() == side * side // 2
+
+
+def test_regions():
+    xy = np.array([[1e-6, 1e-6], [5e-6, 5e-6], [9e-6, 2e-6]])
+    npt.assert_equal(rectangle(0, 0, 6, 6)(xy), [True, True, False])
+    npt.assert_equal(circle(9, 2, 1)(xy), [False, False, True])
+    mask = np.zeros((10, 10), dtype=bool)
+    mask[-2:, :2] = True  # bottom left corner of the box
+    npt.assert_equal(from_mask(mask)(xy), [True, False, False])
+
+
+def _image(tmp_path):
+    image = np.full((20, 20, 3), 255, dtype=np.uint8)
+    image[8:12, 8:12] = (0, 0, 255)     # red colony in the middle
+    image[0, 0] = (255, 0, 0)           # a blue cell top left
+    path = str(tmp_path / 'colony.png')
+    cv2.imwrite(path, image)
+    return path, {'FFFF0000': 'fast', 'FF0000FF': 'slow'}
+
+
+def test_image_points(tmp_path):
+    path, mappings = _image(tmp_path)
+    xy, taxa = image_points(path, mappings)
+    assert len(xy) == 17
+    assert list(taxa).count('fast') == 16
+    npt.assert_allclose(xy[0], [0, 19e-6])
+    with pytest.raises(ValueError):
+        image_points(path, {'FFFF0000': 'fast'})
+
+
+def test_compose_image_over_background(tmp_path):
+    path, mappings = _image(tmp_path)
+    prj = NufebProject()
+    prj.set_box(x=20, y=20, z=20)
+    prj.add_taxon_by_template(name="fast", template="basic_heterotroph")
+    prj.add_taxon_by_template(name="slow", template="slow_heterotroph")
+    composer = prj.layout_composer()
+    composer.add_image(path, mappings).add_uniform(150, region=rectangle(0, 0, 20, 15))
+    prj.compose_layout(composer)
+    assert composer.summary[0].kept == 17
+    assert 0 < composer.summary[1].kept < 150
+    assert prj.n_pre_assigned == 17
+
+    xy = np.array([[bug.x, bug.y] for bug in prj.bug_locs])
+    assert (xy[17:, 1] < 15e-6).all()
+    # no background cell within a diameter of a colony cell
+    colony, background = xy[:17], xy[17:]
+    distances = np.sqrt(((colony[:, None, :] - background[None, :, :]) ** 2).sum(axis=2))
+    assert distances.min() >= 1e-6
+
+    prj.set_composition({'fast': '1', 'slow': '1'})
+    prj.distribute_spatially_even()
+    prj.generate_case()
+    assert [bug.taxon_name for bug in prj.bug_locs[:17]].count('fast') == 16
+    assert all(bug.taxon_name in ('fast', 'slow') for bug in prj.bug_locs)
+
+
+def test_within_layers():
+    composer = LayoutComposer(box=(10, 10), min_distance=1, within_layers=True)
+    composer.add_points([[1e-6, 1e-6], [1.5e-6, 1e-6], [5e-6, 5e-6]])
+    xy, taxa = composer.compose()
+    assert len(xy) == 2
+    assert list(taxa) == ['Unassigned'] * 2
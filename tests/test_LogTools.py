@@ -0,0 +1,65 @@
+import pytest
+import numpy as np
+from nufebmgr.LogTools import ThermoParser, read_thermo, read_output_csv, abundances, performance, scaling_exponent
+
+LOG = """LAMMPS (29 Oct 2020)
+Reading data file ...
+Step CPU Atoms v_n_het v_ra_het
+       0            0       10       10            1
+       1          0.1       20       20            1
+WARNING: something to skip
+       2          0.5       40       40            1
+Loop time of 0.5 on 1 procs for 2 steps with 40 atoms
+
+Step CPU Atoms v_n_het v_ra_het
+       2            0       40       40            1
+       3          1.6       80       80            1
+Loop time of 1.6 on 1 procs for 1 steps with 80 atoms
+"""
+
+
+def test_read_thermo(tmp_path):
+    log = tmp_path / 'log.lammps'
+    log.write_text(LOG)
+    thermo = read_thermo(str(log))
+    assert thermo.columns == ['run', 'step', 'cpu', 'atoms', 'v_n_het', 'v_ra_het']
+    assert thermo['step'].to_list() == [0, 1, 2, 2, 3]
+    assert thermo['run'].to_list() == [0, 0, 0, 1, 1]
+    assert thermo['atoms'].to_list() == [10, 20, 40, 40, 80]
+
+
+def test_streaming_matches_whole_file():
+    parser = ThermoParser()
+    lines = LOG.splitlines()
+    parser.feed_lines(lines[:6])
+    first = parser.take_rows()
+    parser.feed_lines(lines[6:])
+    second = parser.take_rows()
+    assert first.height + second.height == 5
+    assert second['step'].to_list() == [2, 2, 3]
+
+
+def test_performance_and_scaling():
+    parser = ThermoParser().feed_lines(LOG.splitlines())
+    perf = performance(parser.frame())
+    assert perf['step_cpu'][0] is None
+    assert perf['step_cpu'][2] == pytest.approx(0.4)
+    # cpu restarts with each run, so the first row of a continued run has no step cost either
+    assert perf['step_cpu'][3] is None
+    assert perf['step_cpu'][4] == pytest.approx(1.6)
+    assert perf['sec_per_atom_step'][4] == pytest.approx(1.6 / 80)
+    # cost per step quadruples each time the population doubles
+    assert scaling_exponent(parser.frame()) == pytest.approx(2)
+
+
+def test_read_output_csv_with_appended_headers(tmp_path):
+    csv = tmp_path / 'output.csv'
+    csv.write_text('step,het_abundance,het_relative_abundance\n'
+                   '0,10,1\n1,20,1\n'
+                   'step,het_abundance,het_relative_abundance\n'
+                   '2,40,1\n')
+    table = read_output_csv(str(csv))
+    assert table['step'].to_list() == [0, 1, 2]
+    long = abundances(table)
+    assert long['taxon'].unique().to_list() == ['het']
+    assert long['abundance'].to_list() == [10, 20, 40]
@@ -0,0 +1,70 @@
+import math
+import h5py
+import numpy as np
+import pytest
+from nufebmgr.Monitor import RunMonitor, MonitorPool
+
+
+def _write_timestep(path, timestep, types, radius=1e-6):
+    with h5py.File(path, 'a') as f:
+        n = len(types)
+        f[f'id/{timestep}'] = np.arange(n)
+        f[f'type/{timestep}'] = np.asarray(types, dtype=np.int32)
+        for field in ('x', 'y', 'z'):
+            f[f'{field}/{timestep}'] = np.zeros(n)
+        f[f'radius/{timestep}'] = np.full(n, radius)
+
+
+def test_monitor_reads_only_new_timesteps(tmp_path):
+    (tmp_path / 'hdf5').mkdir()
+    dump = tmp_path / 'hdf5' / 'dump.h5'
+    _write_timestep(dump, 0, [1, 1, 2])
+    monitor = RunMonitor(str(tmp_path))
+    assert monitor.refresh()
+    assert monitor.population['count'].to_list() == [2, 1]
+    assert not monitor.refresh()
+
+    _write_timestep(dump, 1, [1, 1, 2, 2])
+    assert monitor.refresh()
+    assert monitor.population.height == 4
+    latest = monitor.latest()
+    assert latest['timestep'] == 1
+    assert latest['cells'] == 4
+    assert latest['volume'] == pytest.approx(4 * 4 / 3 * math.pi * 1e-18)
+
+
+def test_monitor_tails_csv_and_log(tmp_path):
+    csv = tmp_path / 'output.csv'
+    log = tmp_path / 'log.lammps'
+    csv.write_text('step,het_abundance\n0,10\n1,2')
+    log.write_text('Step CPU Atoms\n       0            0       10\n')
+    monitor = RunMonitor(str(tmp_path))
+    monitor.refresh()
+    # the last csv line is incomplete until its newline is written
+    assert monitor.csv['step'].to_list() == [0]
+    assert monitor.thermo['atoms'].to_list() == [10]
+
+    with open(csv, 'a') as f:
+        f.write('0\nstep,het_abundance\n2,40\n')
+    with open(log, 'a') as f:
+        f.write('       1          0.5       20\nLoop time of 0.5 on 1 procs for 1 steps with 20 atoms\n')
+    assert monitor.refresh()
+    assert monitor.csv['step'].to_list() == [0, 1, 2]
+    assert monitor.csv['het_abundance'].to_list() == [10, 20, 40]
+    assert monitor.thermo['atoms'].to_list() == [10, 20]
+
+
+def test_pool_summary(tmp_path):
+    cases = []
+    for i in range(3):
+        case = tmp_path / f'case_{i}'
+        (case / 'hdf5').mkdir(parents=True)
+        _write_timestep(case / 'hdf5' / 'dump.h5', 0, [1] * (i + 1))
+        cases.append(str(case))
+    (tmp_path / 'case_0' / 'done.tkn').touch()
+    pool = MonitorPool(cases)
+    assert sorted(pool.refresh()) == cases
+    assert pool.refresh() == []
+    summary = pool.summary()
+    assert summary['cells'].to_list() == [1, 2, 3]
+    assert summary['done'].to_list() == [True, False, False]
@@ -1,7 +1,267 @@
+import os
+import subprocess
+import sys
+import pytest
 from nufebmgr.NufebProject import NufebProject
+from nufebmgr.Manifest import CaseManifest, content_hash
 
 def test_initialization():
     project = NufebProject()
     assert project is not None
 
 
+def _two_taxa_project():
+    prj = NufebProject()
+    prj.set_box(x=100, y=100, z=100)
+    prj.add_taxon_by_template(name="fast", template="basic_heterotroph")
+    prj.add_taxon_by_template(name="slow", template="slow_heterotroph")
+    prj.layout_uniform(nbugs=100)
+    prj.set_composition({'fast': '50', 'slow': '50'})
+    prj.distribute_spatially_even()
+    return prj
+
+def test_estimate_runtime():
+    prj = _two_taxa_project()
+    est = prj.estimate()
+    assert est.initial_cells == 100
+    assert est.steps == prj.runtime
+    assert not est.halted
+    assert est.peak_cells > est.initial_cells
+    assert est.grid_cells == 40**3
+    assert est.n_substrates == 4
+    assert est.total_bytes == est.hdf5_bytes + est.vtk_bytes + est.csv_bytes + est.thermo_bytes
+
+    # estimating must not assign taxa or otherwise touch the project
+    assert all(bug.taxon_name == "Unassigned" for bug in prj.bug_locs)
+    assert prj.substrates == {}
+
+def test_estimate_outputs():
+    prj = _two_taxa_project()
+    full = prj.estimate()
+    prj.disable_hdf5_output()
+    prj.disable_vtk_output()
+    reduced = prj.estimate()
+    assert reduced.hdf5_bytes == 0
+    assert reduced.vtk_bytes == 0
+    assert reduced.cell_steps == pytest.approx(full.cell_steps)
+
+def test_estimate_biomass_stop():
+    prj = _two_taxa_project()
+    prj.set_runtime(10000)
+    uncapped = prj.estimate()
+    prj.stop_at_biomass_percent(5)
+    est = prj.estimate()
+    assert est.halted
+    assert est.steps < uncapped.steps
+    assert est.peak_cells < uncapped.peak_cells
+
+def test_processors_and_load_balancing():
+    prj = _two_taxa_project()
+    _, script = prj.generate_case()
+    assert 'processors\t\t* * 1' in script
+    assert 'balance' not in script
+
+    prj = _two_taxa_project()
+    prj.use_processors(4)
+    prj.enable_load_balancing(threshold=1.1, every=100)
+    _, script = prj.generate_case()
+    assert 'processors\t\t2 2 1' in script
+    assert 'balance\t\t1.1 shift xy 10 1.05' in script
+    assert 'fix\t\tbalance all balance 100 1.1 shift xy 10 1.05' in script
+
+    with pytest.raises(ValueError):
+        prj.enable_load_balancing(style="bogus")
+
+def test_tune_neighbor_list():
+    prj = _two_taxa_project()
+    _, script = prj.generate_case()
+    assert 'neighbor 5.6e-07 bin' in script
+
+    prj = _two_taxa_project()
+    prj.tune_neighbor_list(skin=1.5e-6, delay=5)
+    _, script = prj.generate_case()
+    assert 'neighbor 1.5e-06 bin' in script
+    assert 'neigh_modify every 1 delay 5 check no' in script
+
+def test_substrate_grid_report():
+    prj = _two_taxa_project()
+    grid = prj.substrate_grid()
+    assert grid.spacing == pytest.approx(2.5)
+    assert grid.n_substrates == 4
+    assert prj.estimate().diffusion_cost == grid.updates_per_step
+
+    prj.force_substrate_grid_size(5)
+    assert prj.substrate_grid().cells == 20**3
+    _, script = prj.generate_case()
+    assert '5e-6' in script
+
+def test_restart_and_continuation(tmp_path):
+    prj = _two_taxa_project()
+    prj.enable_csv()
+    prj.enable_restart(every=10)
+    _, script = prj.generate_case()
+    assert 'restart 10 restart/restart.a restart/restart.b' in script
+
+    continued = prj.generate_continuation('restart/restart.a')
+    assert 'read_restart\t\trestart/restart.a' in continued
+    assert 'read_data' not in continued
+    assert f'run\t\t{prj.runtime} upto' in continued
+    assert 'hdf5/dump_continued.h5' in continued
+    assert ' append output.csv ' in continued
+    # the same groups, fixes and outputs as the original
+    for line in script.splitlines():
+        if line.startswith(('group', 'fix growth', 'fix division', 'thermo_style', 'restart')):
+            assert line in continued
+
+    # multi-rank runs with load balancing continue too, balancing the restored atoms
+    prj.use_processors(4)
+    prj.enable_load_balancing(every=100)
+    continued = prj.generate_continuation('restart/restart.a')
+    lines = continued.splitlines()
+    restart_line = next(k for k, line in enumerate(lines) if line.startswith('read_restart'))
+    assert lines[restart_line + 1].startswith('balance')
+    assert any(line.startswith('fix') and 'balance 100' in line for line in lines)
+    assert continued.index('processors') < continued.index('read_restart')
+
+    assert NufebProject.latest_restart(tmp_path) is None
+    (tmp_path / 'restart').mkdir()
+    (tmp_path / 'restart' / 'restart.a').write_text('older')
+    (tmp_path / 'restart' / 'restart.b').write_text('newer')
+    os.utime(tmp_path / 'restart' / 'restart.a', (0, 0))
+    assert NufebProject.latest_restart(tmp_path) == os.path.join('restart', 'restart.b')
+
+def test_stop_conditions():
+    prj = _two_taxa_project()
+    prj.stop_at_relative_abundance('fast', 0.95)
+    prj.stop_at_cell_count(5000)
+    prj.stop_on_growth_plateau(epsilon=0.001, window=10)
+    _, script = prj.generate_case()
+    assert 'halt_ra_fast all halt 1 v_ra_fast > 0.95 error soft' in script
+    assert 'halt_cells all halt 1 v_n_all > 5000 error soft' in script
+    assert 'halt_plateau all halt 10 v_mass_growth < 0.001 error soft' in script
+    assert 'mass_window all ave/time 1 1 10 v_mass' in script
+    assert 'variable n_all equal "count(all)"' in script
+    # the plateau halt has to see the previous biomass sample before fix ave/time overwrites it
+    assert script.index('halt_plateau') < script.index('mass_window all')
+    assert script.index('mass_window all') < script.index('\nrun\t')
+
+    with pytest.raises(ValueError):
+        prj.stop_at_relative_abundance('missing', 0.5)
+    with pytest.raises(ValueError):
+        prj.stop_at_relative_abundance('fast', 2)
+
+def test_estimate_cell_count_and_plateau_stops():
+    prj = _two_taxa_project()
+    prj.set_runtime(10000)
+    uncapped = prj.estimate()
+    prj.stop_at_cell_count(1000)
+    est = prj.estimate()
+    assert est.halted
+    assert est.peak_cells == 1000
+    assert est.steps < uncapped.steps
+
+    prj = _two_taxa_project()
+    prj.set_runtime(10000)
+    prj.stop_on_growth_plateau(window=10)
+    est = prj.estimate()
+    assert est.halted
+    assert est.steps % 10 == 0
+    assert est.steps < uncapped.steps
+
+def test_relax_layout():
+    prj = _two_taxa_project()
+    prj.set_box(x=20, y=20, z=20)
+    prj.layout_uniform(nbugs=200)
+    prj.relax_layout()
+    atom_in, _ = prj.generate_case()
+    report = prj.relaxation_report
+    assert report.initial_overlaps > 0
+    assert report.residual_overlaps == 0
+    assert atom_in.count('\n \t') == 200
+
+    with pytest.raises(ValueError):
+        prj.relax_layout(method="shake")
+
+def test_profiling_stages():
+    prj = NufebProject()
+    profiler = prj.enable_profiling()
+    prj.set_box(x=100, y=100, z=100)
+    prj.add_taxon_by_template(name="het", template="basic_heterotroph")
+    prj.layout_uniform(nbugs=50)
+    prj.set_composition({'het': 1})
+    prj.distribute_spatially_even()
+    prj.generate_case()
+    names = [record.name for record in profiler.records]
+    assert names == ['layout_uniform', 'inputscript_render', 'inputscript', 'assign_taxa', 'atom_in',
+                     'generate_case']
+    assert profiler.records[-1].items == 50
+
+    prj.disable_profiling()
+    prj.generate_case()
+    assert len(profiler.records) == 6
+
+
+def test_write_case_manifest(tmp_path):
+    prj = _two_taxa_project()
+    prj.stop_at_cell_count(5000)
+    atom_in, script, manifest = prj.generate_case(manifest=True)
+    assert manifest.types == {'fast': 1, 'slow': 2}
+    assert manifest.taxa == ['fast', 'slow']
+    assert manifest.properties['fast']['density'] == 150
+    assert manifest.stop['max_cells'] == 5000
+    assert manifest.hash == content_hash(atom_in, script)
+
+    prj = _two_taxa_project()
+    prj.disable_hdf5_output()
+    written = prj.write_case(str(tmp_path / 'case'))
+    assert sorted(os.listdir(tmp_path / 'case')) == ['atom.in', 'inputscript.nufeb', 'manifest.json']
+    loaded = CaseManifest.load(str(tmp_path / 'case'))
+    assert loaded == written
+    assert loaded.outputs['hdf5'] is None
+    assert loaded.grid['nx'] == 40
+    assert loaded.box['periodic'] == 'plane'
+
+
+def test_save_and_load(tmp_path):
+    prj = _two_taxa_project()
+    prj.set_substrate('sub', 1e-4, 1e-4)
+    prj.stop_at_relative_abundance('fast', 0.9)
+    prj.stop_on_growth_plateau()
+    prj.save(str(tmp_path / 'saved'))
+    key = prj.config_hash()
+    expected = prj.generate_case()
+
+    loaded = NufebProject.load(str(tmp_path / 'saved'))
+    assert loaded._bug_locs is None
+    assert loaded._n_members() == 100
+    assert loaded.config_hash() == key
+    # still lazy, hashing works on the arrays
+    assert loaded._bug_locs is None
+    assert loaded.generate_case() == expected
+
+    tweaked = NufebProject.load(str(tmp_path / 'saved'), mmap=False)
+    tweaked.set_runtime(10)
+    atom_in, script = tweaked.generate_case()
+    assert atom_in == expected[0]
+    assert script != expected[1]
+
+
+def test_core_import_without_analysis_dependencies(tmp_path):
+    # polars and h5py are analysis extras, generating a case must not need them
+    script = f"""
+import sys, importlib.abc
+class Block(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        if name.split('.')[0] in ('polars', 'h5py'):
+            raise ModuleNotFoundError(name)
+sys.meta_path.insert(0, Block())
+from nufebmgr.NufebProject import NufebProject
+prj = NufebProject()
+prj.add_taxon_by_template(name='fast', template='basic_heterotroph')
+prj.layout_uniform(nbugs=10)
+prj.set_composition({{'fast': '1'}})
+prj.distribute_spatially_even()
+prj.write_case({str(tmp_path)!r})
+"""
+    subprocess.run([sys.executable, '-c', script], check=True)
+    assert os.path.exists(tmp_path / 'manifest.json')
@@ -0,0 +1,41 @@
+import json
+from nufebmgr.Profiling import StageProfiler, NULL_PROFILER, aggregate
+
+
+def test_nested_stages_and_hooks():
+    seen = []
+    profiler = StageProfiler(track_memory=True, hooks=[lambda record: seen.append(record.name)])
+    with profiler.stage('outer', 3):
+        with profiler.stage('inner') as stage:
+            data = bytearray(1_000_000)
+            stage.items = len(data)
+            del data
+    assert seen == ['inner', 'outer']
+    inner, outer = profiler.records
+    assert inner.parent == 'outer' and inner.depth == 1
+    assert inner.items == 1_000_000
+    assert outer.items == 3
+    assert inner.peak_bytes >= 1_000_000
+    assert outer.peak_bytes >= inner.peak_bytes
+    assert outer.seconds >= inner.seconds
+    assert profiler.total_seconds() == outer.seconds
+    assert json.loads(profiler.to_json())['stages'][0]['name'] == 'inner'
+
+
+def test_null_profiler_records_nothing():
+    with NULL_PROFILER.stage('anything') as stage:
+        stage.items = 10
+    assert NULL_PROFILER.report() == {'total_seconds': 0.0, 'stages': []}
+
+
+def test_aggregate():
+    reports = []
+    for n in (1, 2):
+        profiler = StageProfiler()
+        with profiler.stage('layout', n):
+            pass
+        reports.append(profiler.report())
+    stats = aggregate(reports)
+    assert stats['layout']['count'] == 2
+    assert stats['layout']['items'] == 3
+    assert stats['layout']['max_peak_bytes'] is None
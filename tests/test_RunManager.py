@@ -0,0 +1,89 @@
+import json
+import sys
+import pytest
+from nufebmgr.RunManager import RunOrchestrator, CaseRun, DONE_TOKEN
+from nufebmgr.cli import main
+
+# Stands in for a NUFEB binary: checks it was given the input script, fails the first FAIL_TIMES attempts of a case,
+# then touches done.tkn as the generated input scripts do at the end of a run
+STUB = '''
+import os, sys
+assert sys.argv[1:] == ['-in', 'inputscript.nufeb']
+fail_times = int(open('FAIL_TIMES').read()) if os.path.exists('FAIL_TIMES') else 0
+attempts = int(open('attempts').read()) + 1 if os.path.exists('attempts') else 1
+open('attempts', 'w').write(str(attempts))
+if attempts <= fail_times:
+    sys.exit(3)
+open('done.tkn', 'w').close()
+'''
+
+
+def _make_cases(tmp_path, n, fail_times=0):
+    stub = tmp_path / 'stub.py'
+    stub.write_text(STUB)
+    cases = []
+    for i in range(n):
+        case = tmp_path / f'case_{i}'
+        case.mkdir()
+        (case / 'inputscript.nufeb').write_text('# stub')
+        if fail_times:
+            (case / 'FAIL_TIMES').write_text(str(fail_times))
+        cases.append(case)
+    return [sys.executable, str(stub)], cases
+
+def test_runs_all_cases(tmp_path):
+    exe, cases = _make_cases(tmp_path, 5)
+    ledger = tmp_path / 'ledger.jsonl'
+    orchestrator = RunOrchestrator(exe, cores=2, ledger=str(ledger), poll_interval=0.01)
+    for case in cases:
+        orchestrator.add_case(str(case))
+    results = orchestrator.run()
+    assert [r.status for r in results] == ['done'] * 5
+    assert all((case / DONE_TOKEN).exists() for case in cases)
+    records = [json.loads(line) for line in ledger.read_text().splitlines()]
+    assert len(records) == 5
+    assert all(record['returncode'] == 0 for record in records)
+
+def test_retries_and_failures(tmp_path):
+    exe, cases = _make_cases(tmp_path, 2, fail_times=1)
+    orchestrator = RunOrchestrator(exe, cores=2, retries=1, poll_interval=0.01)
+    for case in cases:
+        orchestrator.add_case(str(case))
+    orchestrator.run()
+    assert orchestrator.summary() == {'done': 2}
+    assert all(case.attempts == 2 for case in orchestrator.cases)
+
+    (tmp_path / 'always_fails').mkdir()
+    exe, cases = _make_cases(tmp_path / 'always_fails', 1, fail_times=5)
+    orchestrator = RunOrchestrator(exe, cores=1, retries=1, poll_interval=0.01)
+    orchestrator.add_case(str(cases[0]))
+    orchestrator.run()
+    assert orchestrator.cases[0].status == 'failed'
+    assert orchestrator.cases[0].returncode == 3
+
+def test_skips_completed_and_respects_cores(tmp_path):
+    exe, cases = _make_cases(tmp_path, 2)
+    (cases[0] / DONE_TOKEN).touch()
+    orchestrator = RunOrchestrator(exe, cores=4, poll_interval=0.01)
+    orchestrator.add_case(str(cases[0]))
+    orchestrator.add_case(str(cases[1]))
+    orchestrator.run()
+    assert [c.status for c in orchestrator.cases] == ['skipped', 'done']
+    assert not (cases[0] / 'attempts').exists()
+
+    with pytest.raises(ValueError):
+        orchestrator.add_case(str(cases[1]), ranks=8)
+
+def test_mpi_command():
+    orchestrator = RunOrchestrator('lmp_mpi', cores=8, launcher='mpirun -np {ranks}')
+    assert orchestrator.command(CaseRun('a', ranks=1)) == ['lmp_mpi', '-in', 'inputscript.nufeb']
+    assert orchestrator.command(CaseRun('a', ranks=4)) == ['mpirun', '-np', '4', 'lmp_mpi', '-in', 'inputscript.nufeb']
+
+def test_cli(tmp_path, capsys):
+    exe, cases = _make_cases(tmp_path, 3)
+    ledger = tmp_path / 'ledger.jsonl'
+    status = main(['run', *map(str, cases), '--exe', ' '.join(exe), '--cores', '2', '--poll', '0.01',
+                   '--ledger', str(ledger)])
+    assert status == 0
+    assert 'done: 3' in capsys.readouterr().out
+    assert len(ledger.read_text().splitlines()) == 3
@@ -0,0 +1,102 @@
+import pytest
+import numpy as np
+from nufebmgr.NufebProject import NufebProject
+from nufebmgr.Scheduler import SweepScheduler, CostModel, benchmark_against_fifo
+from nufebmgr.RunManager import RunOrchestrator
+
+
+def _project(side, nbugs):
+    prj = NufebProject()
+    prj.set_box(x=side, y=side, z=100)
+    prj.add_taxon_by_template(name="het", template="basic_heterotroph")
+    prj.layout_uniform(nbugs=nbugs)
+    prj.set_composition({'het': 1})
+    prj.distribute_spatially_even()
+    return prj
+
+def test_longest_first_beats_fifo():
+    scheduler = SweepScheduler(cores=2)
+    for i, work in enumerate([2, 2, 2, 3, 3]):
+        scheduler.add(f'case_{i}', work=work)
+    assert [case.work for case in scheduler.order()] == [3, 3, 2, 2, 2]
+    assert scheduler.makespan(order=scheduler.cases) == pytest.approx(7)
+    assert scheduler.makespan() == pytest.approx(7)
+
+    scheduler = SweepScheduler(cores=2)
+    for i, work in enumerate([1, 1, 1, 1, 4]):
+        scheduler.add(f'case_{i}', work=work)
+    assert scheduler.makespan(order=scheduler.cases) == pytest.approx(6)
+    assert scheduler.makespan() == pytest.approx(4)
+
+def test_ranks_share_cores():
+    scheduler = SweepScheduler(cores=4, model=CostModel(parallel_efficiency=1.0))
+    scheduler.add('big', work=8, ranks=4)
+    scheduler.add('small', work=1)
+    placed = {p.name: p for p in scheduler.simulate()}
+    assert placed['big'].end == pytest.approx(2)
+    assert placed['small'].start == pytest.approx(2)
+
+    with pytest.raises(ValueError):
+        scheduler.add('too_big', work=1, ranks=8)
+    # cases whose ranks were changed after adding them are checked before simulating
+    scheduler.cases[0].ranks = 8
+    with pytest.raises(ValueError):
+        scheduler.simulate(order=scheduler.cases)
+
+    single = SweepScheduler(cores=1)
+    single.add('case', work=1)
+    with pytest.raises(ValueError):
+        single.assign_ranks(options=(2, 4))
+
+def test_assign_ranks():
+    scheduler = SweepScheduler(cores=8, model=CostModel(parallel_efficiency=1.0))
+    scheduler.add('huge', work=64)
+    for i in range(8):
+        scheduler.add(f'small_{i}', work=1)
+    scheduler.assign_ranks(options=(1, 2, 4, 8))
+    ranks = {case.name: case.ranks for case in scheduler.cases}
+    assert ranks['huge'] == 8
+    assert ranks['small_0'] == 1
+
+def test_prediction_from_projects_and_history():
+    scheduler = SweepScheduler(cores=4)
+    small = scheduler.add('small', _project(50, 10))
+    large = scheduler.add('large', _project(200, 1000))
+    assert large.work > small.work
+    assert scheduler.order()[0].name == 'large'
+
+    scheduler = SweepScheduler(cores=4, history={'small': 1e6})
+    assert scheduler.add('small', _project(50, 10)).work == 1e6
+
+def test_fit_recovers_coefficients():
+    truth = np.array([3e-5, 2e-9, 0.5])
+    rng = np.random.default_rng(1)
+    features = rng.uniform(1, 10, size=(20, 3)) * np.array([1e6, 1e10, 100])
+    model = CostModel().fit(features, features @ truth)
+    np.testing.assert_allclose(model.coefficients, truth, rtol=1e-6)
+
+def test_submit_in_scheduled_order():
+    scheduler = SweepScheduler(cores=4)
+    scheduler.add('a', work=1)
+    scheduler.add('b', work=5, ranks=2)
+    orchestrator = scheduler.submit(RunOrchestrator('lmp_mpi', cores=4))
+    assert [(c.case_dir, c.ranks) for c in orchestrator.cases] == [('b', 2), ('a', 1)]
+
+    scheduler = SweepScheduler(cores=4)
+    scheduler.add('a', work=1, case_dir='sweep/a_seed_1')
+    orchestrator = scheduler.submit(RunOrchestrator('lmp_mpi', cores=4))
+    assert orchestrator.cases[0].case_dir == 'sweep/a_seed_1'
+
+def test_workers_cap():
+    scheduler = SweepScheduler(cores=4, workers=2)
+    for i in range(4):
+        scheduler.add(f'case_{i}', work=1)
+    placed = scheduler.simulate()
+    assert sorted(p.start for p in placed) == pytest.approx([0, 0, 1, 1])
+    assert scheduler.makespan() == pytest.approx(2)
+    assert SweepScheduler(cores=4).workers == 4
+
+def test_benchmark_against_fifo():
+    result = benchmark_against_fifo(n_cases=40, cores=8)
+    assert result['scheduled_makespan'] <= result['fifo_makespan']
+    assert result['scheduled_makespan'] >= result['lower_bound'] * (1 - 1e-9)
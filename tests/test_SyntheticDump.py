@@ -0,0 +1,44 @@
+import h5py
+import numpy as np
+import pytest
+from nufebmgr.SyntheticDump import SyntheticDump
+from nufebmgr.DumpTools import DumpFile
+
+
+def test_layout_matches_nufeb(tmp_path):
+    path = tmp_path / 'dump.h5'
+    SyntheticDump(n_initial=50, n_timesteps=5, n_types=2).write(str(path))
+    with h5py.File(path, 'r') as f:
+        assert set(f.keys()) == {'id', 'type', 'x', 'y', 'z', 'radius'}
+        assert sorted(map(int, f['id'])) == list(range(5))
+        assert f['id/0'].dtype == np.int64
+        assert f['type/0'].dtype == np.int32
+        assert set(np.unique(f['type/4'][()])) <= {1, 2}
+        assert (f['z/4'][()] > 0).all()
+
+
+def test_growth_and_death_are_readable(tmp_path):
+    path = tmp_path / 'dump.h5'
+    stats = SyntheticDump(n_initial=200, n_timesteps=15, growth_rate=0.1, death_rate=0.05).write(str(path))
+    assert stats.births > 0 and stats.deaths > 0
+    assert stats.final_cells == 200 + stats.births - stats.deaths
+    with DumpFile(str(path)) as dump:
+        assert dump.num_timesteps() == 15
+        assert len(dump.births(as_df=True)) == stats.births
+        assert len(dump.deaths(as_df=True)) == stats.deaths
+
+
+def test_cap_and_compression(tmp_path):
+    path = tmp_path / 'dump.h5'
+    stats = SyntheticDump(n_initial=100, n_timesteps=30, growth_rate=0.3, max_cells=300).write(
+        str(path), compression='gzip', compression_opts=1)
+    assert stats.final_cells == 300
+    with h5py.File(path, 'r') as f:
+        assert f['x/29'].compression == 'gzip'
+        assert f['x/29'].chunks is not None
+
+
+def test_expected_cell_steps():
+    dump = SyntheticDump(n_initial=1000, n_timesteps=20, growth_rate=0.05, death_rate=0.01)
+    actual = sum(len(snapshot['id']) for _, snapshot in dump.snapshots())
+    assert dump.expected_cell_steps() == pytest.approx(actual, rel=0.1)
@@ -0,0 +1,104 @@
+import base64
+import zlib
+import numpy as np
+import numpy.testing as npt
+import pytest
+from nufebmgr.VtkTools import VtiFile, VtuFile, GridSeries, particle_files, read_vti, read_vtu
+from nufebmgr.SyntheticDump import SyntheticDump
+
+SHAPE = (3, 4, 5)  # z, y, x cells
+
+
+def _payload(values, compressed):
+    raw = values.astype('<f8').tobytes()
+    if not compressed:
+        return np.array([len(raw)], '<u4').tobytes(), raw
+    block = zlib.compress(raw)
+    return np.array([1, len(raw), len(raw), len(block)], '<u4').tobytes(), block
+
+
+def write_vti(path, arrays, encoding, compressed=False):
+    """Minimal .vti writer covering the encodings VTK (and so NUFEB) can produce."""
+    nz, ny, nx = SHAPE
+    compressor = ' compressor="vtkZLibDataCompressor"' if compressed else ''
+    head = (f'<?xml version="1.0"?>\n<VTKFile type="ImageData" version="1.0" byte_order="LittleEndian" '
+            f'header_type="UInt32"{compressor}>\n'
+            f'<ImageData WholeExtent="0 {nx} 0 {ny} 0 {nz}" Origin="0 0 0" Spacing="1e-6 1e-6 1e-6">\n'
+            f'<Piece Extent="0 {nx} 0 {ny} 0 {nz}">\n<CellData>\n')
+    appended = b''
+    for name, values in arrays.items():
+        header, data = _payload(values, compressed)
+        if encoding == 'ascii':
+            text = ' '.join(repr(float(v)) for v in values.ravel())
+            head += f'<DataArray type="Float64" Name="{name}" format="ascii">{text}</DataArray>\n'
+        elif encoding == 'binary':
+            text = (base64.b64encode(header) + base64.b64encode(data)).decode()
+            head += f'<DataArray type="Float64" Name="{name}" format="binary">\n{text}\n</DataArray>\n'
+        else:
+            offset = len(appended)
+            if encoding == 'raw':
+                appended += header + data
+            else:
+                appended += base64.b64encode(header + data)
+            head += f'<DataArray type="Float64" Name="{name}" format="appended" offset="{offset}"/>\n'
+    body = head.encode() + b'</CellData>\n</Piece>\n</ImageData>\n'
+    if encoding in ('raw', 'base64'):
+        body += f'<AppendedData encoding="{encoding}">\n_'.encode() + appended + b'\n</AppendedData>\n'
+    body += b'</VTKFile>\n'
+    with open(path, 'wb') as f:
+        f.write(body)
+
+
+def _arrays(step=0):
+    rng = np.random.default_rng(step)
+    return {'sub': rng.random(SHAPE), 'o2': rng.random(SHAPE) + step}
+
+
+@pytest.mark.parametrize('encoding,compressed', [('ascii', False), ('binary', False), ('binary', True),
+                                                 ('raw', False), ('raw', True), ('base64', False)])
+def test_read_encodings(tmp_path, encoding, compressed):
+    path = tmp_path / 'dump_con_0.vti'
+    arrays = _arrays()
+    write_vti(path, arrays, encoding, compressed)
+    vti = VtiFile(str(path))
+    assert vti.names() == ['sub', 'o2']
+    assert vti.spacing == (1e-6, 1e-6, 1e-6)
+    result = read_vti(str(path))
+    for name, values in arrays.items():
+        assert result[name].shape == SHAPE
+        npt.assert_allclose(result[name], values)
+
+
+def test_raw_appended_is_memory_mapped(tmp_path):
+    path = tmp_path / 'dump_con_0.vti'
+    write_vti(path, _arrays(), 'raw')
+    assert isinstance(VtiFile(str(path)).array('sub').base, np.memmap)
+
+
+def test_grid_series(tmp_path):
+    for step in (0, 10, 20):
+        write_vti(tmp_path / f'dump_con_{step}.vti', _arrays(step), 'raw')
+        write_vti(tmp_path / f'dump_den_{step}.vti', {'het': np.ones(SHAPE)}, 'raw')
+    series = GridSeries(str(tmp_path), 'con')
+    assert series.steps == [0, 10, 20]
+    assert series.names == ['sub', 'o2']
+    assert series[1].shape == (2,) + SHAPE
+    assert series.to_array().shape == (3, 2) + SHAPE
+
+    stats = series.statistics(workers=2)
+    assert stats.height == 6
+    o2 = stats.filter(stats['name'] == 'o2')
+    npt.assert_allclose(o2['mean'].to_numpy(), [_arrays(s)['o2'].mean() for s in (0, 10, 20)])
+
+
+def test_read_vtu(tmp_path):
+    synthetic = SyntheticDump(n_initial=20, n_timesteps=12, seed=3)
+    synthetic.write_vtu(str(tmp_path))
+    files = particle_files(str(tmp_path))
+    assert list(files) == list(range(12))
+    assert VtuFile(files[0]).names() == ['Points', 'id', 'type', 'diameter']
+    _, first = next(synthetic.snapshots())
+    result = read_vtu(files[0])
+    npt.assert_equal(result['id'], first['id'])
+    npt.assert_allclose(result['z'], first['z'])
+    npt.assert_allclose(result['diameter'], first['radius'] * 2)
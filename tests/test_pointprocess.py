@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+import pytest
+from nufebmgr import pointprocess
+from nufebmgr.NufebProject import NufebProject
+from nufebmgr.spatialhash import SpatialHash, separation
+
+BOX = np.array([200e-6, 200e-6])
+
+
+def _close_pairs(xy, distance):
+    grid = SpatialHash(xy, distance, BOX)
+    i, j = grid.candidate_pairs()
+    return int(((separation(xy, BOX, i, j) ** 2).sum(axis=1) < distance ** 2).sum())
+
+
+@pytest.mark.parametrize('process,scale', [(pointprocess.thomas, 2e-6), (pointprocess.matern, 4e-6)])
+def test_cluster_processes(process, scale):
+    rng = np.random.default_rng(5)
+    xy = process(BOX, 50, 200, scale, rng=rng)
+    assert abs(len(xy) - 50 * 200) < 0.5 * 50 * 200
+    assert ((xy >= 0) & (xy < BOX)).all()
+    uniform = rng.uniform(0, 1, xy.shape) * BOX
+    assert _close_pairs(xy, 2e-6) > 5 * _close_pairs(uniform, 2e-6)
+
+    cropped = process(BOX, 50, 200, scale, periodic=False, rng=rng)
+    assert ((cropped >= 0) & (cropped < BOX)).all()
+
+
+def test_inhomogeneous():
+    rng = np.random.default_rng(2)
+    density = np.array([[1.0, 3.0]])
+    xy = pointprocess.inhomogeneous(BOX, density, 40000, rng=rng)
+    assert abs(len(xy) - 40000) < 1000
+    right = (xy[:, 0] >= BOX[0] / 2).mean()
+    assert right == pytest.approx(0.75, abs=0.02)
+
+    # row 0 is the top of the box
+    top_only = pointprocess.inhomogeneous(BOX, [[1.0], [0.0]], 1000, rng=rng)
+    assert (top_only[:, 1] >= BOX[1] / 2).all()
+    assert len(pointprocess.inhomogeneous(BOX, np.zeros((3, 3)), 1000, rng=rng)) == 0
+    with pytest.raises(ValueError):
+        pointprocess.inhomogeneous(BOX, [[-1.0]], 10)
+
+
+def test_project_layouts(tmp_path):
+    prj = NufebProject()
+    prj.set_box(x=100, y=100, z=50)
+    prj.use_layout_cache()
+    prj.layout_thomas(n_clusters=10, cells_per_cluster=30, sigma=3)
+    assert 100 < len(prj.bug_locs) < 600
+    prj.layout_matern(n_clusters=10, cells_per_cluster=30, radius=5)
+    assert 100 < len(prj.bug_locs) < 600
+
+    image = np.full((10, 10), 255, dtype=np.uint8)
+    image[:, :5] = 0  # left half dense, right half empty
+    path = str(tmp_path / 'density.png')
+    cv2.imwrite(path, image)
+    prj.layout_density(path, 500)
+    assert all(bug.x < 50e-6 for bug in prj.bug_locs)
+    assert prj.layout_cache.misses == 3
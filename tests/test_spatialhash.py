@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from nufebmgr.spatialhash import overlapping_pairs, relax
+
+
+def _brute_force_pairs(xy, diameter, box, periodic):
+    delta = xy[:, None] - xy[None]
+    if periodic:
+        delta -= box * np.round(delta / box)
+    close = np.sqrt((delta ** 2).sum(axis=-1)) < diameter
+    return set(zip(*np.nonzero(np.triu(close, 1))))
+
+
+@pytest.mark.parametrize("periodic", [True, False])
+def test_overlapping_pairs_matches_brute_force(periodic):
+    rng = np.random.default_rng(3)
+    box = np.array([20e-6, 30e-6])
+    xy = rng.uniform(0, 1, (400, 2)) * box
+    i, j, overlap, _ = overlapping_pairs(xy, np.full(400, 1e-6), box, periodic)
+    assert set(zip(i, j)) == _brute_force_pairs(xy, 1e-6, box, periodic)
+    assert (overlap > 0).all()
+
+
+@pytest.mark.parametrize("method", ["push", "resample"])
+def test_relax_removes_overlaps(method):
+    rng = np.random.default_rng(5)
+    box = np.array([50e-6, 50e-6])
+    xy = rng.uniform(0, 1, (500, 2)) * box
+    diameters = rng.choice([1e-6, 1.5e-6], 500)
+    relaxed, report = relax(xy, diameters, box, method=method, rng=rng)
+    assert report.initial_overlaps > 0
+    assert report.residual_overlaps == 0
+    assert len(overlapping_pairs(relaxed, diameters, box, tolerance=0.01e-6)[0]) == 0
+    assert ((relaxed >= 0) & (relaxed < box)).all()